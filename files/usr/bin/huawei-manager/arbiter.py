@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Per-modem operation arbiter for Huawei Manager.
+A flock-based lease shared by the daemon, modem_api.py and reconnect_dialup.py
+so that reconnects and other mutating operations never overlap.
+"""
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+
+LOCK_DIR = "/tmp/huawei-manager-locks"
+
+# Operations after which a previously read WAN IP or status is stale.
+# Daemon polls are suspended while one of these is in flight.
+DISRUPTIVE = ("reconnect", "reboot", "toggle_data", "bands", "apn_default")
+
+
+class ModemBusyError(Exception):
+    """Raised when the lease could not be taken in time."""
+
+    def __init__(self, holder):
+        self.holder = holder or {}
+        operation = self.holder.get("operation", "another operation")
+        source = self.holder.get("source", "unknown")
+        super().__init__(f"Modem busy: {operation} in progress ({source}), try again shortly")
+
+
+class ModemLease:
+    """
+    Exclusive lease per modem. The flock is the source of truth and is
+    released by the kernel if the holder dies; the lease file only describes
+    the holder. Waiters retry until their timeout, which queues them.
+    """
+
+    def __init__(self, key, lock_dir=LOCK_DIR):
+        self.lock_dir = lock_dir
+        self.lock_path = os.path.join(lock_dir, f"{key}.lock")
+        self.lease_path = os.path.join(lock_dir, f"{key}.lease.json")
+        self.outcome_path = os.path.join(lock_dir, f"{key}.last.json")
+        self._fd = None
+
+    def _open(self):
+        os.makedirs(self.lock_dir, mode=0o700, exist_ok=True)
+        return os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _write(self, path, payload):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def acquire(self, operation, source="luci", timeout=30):
+        """Wait up to timeout seconds for the lease. Raises ModemBusyError."""
+        fd = self._open()
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    holder = self.current()
+                    os.close(fd)
+                    raise ModemBusyError(holder)
+                time.sleep(0.25)
+        self._fd = fd
+        try:
+            self._write(self.lease_path, {
+                "operation": operation,
+                "source": source,
+                "pid": os.getpid(),
+                "started_at": time.time()
+            })
+        except OSError:
+            pass
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            os.remove(self.lease_path)
+        except OSError:
+            pass
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    @contextmanager
+    def hold(self, operation, source="luci", timeout=30):
+        self.acquire(operation, source, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def current(self):
+        """Describe the operation in flight, or None if the lease is free."""
+        try:
+            fd = self._open()
+        except OSError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return None
+        except BlockingIOError:
+            return self._read(self.lease_path) or {"operation": "unknown"}
+        finally:
+            os.close(fd)
+
+    def wait_idle(self, timeout, poll=1.0):
+        """Wait until no operation holds the lease. Returns True if idle."""
+        deadline = time.time() + timeout
+        while self.current():
+            if time.time() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def record_outcome(self, operation, source, ok, started_at, **extra):
+        """Remember how an operation ended, for other processes to pick up."""
+        entry = dict(extra, operation=operation, source=source, ok=ok,
+                     started_at=started_at, finished_at=time.time())
+        outcomes = self._read(self.outcome_path) or {}
+        outcomes.setdefault("operations", {})[operation] = entry
+        outcomes["last"] = entry
+        try:
+            self._write(self.outcome_path, outcomes)
+        except OSError:
+            pass
+
+    def last_outcome(self, operation=None):
+        """Latest finished operation, or the latest one of the given kind."""
+        outcomes = self._read(self.outcome_path) or {}
+        if operation:
+            return outcomes.get("operations", {}).get(operation)
+        return outcomes.get("last")
+
+    def disrupted_since(self, since):
+        """Most recent disruptive operation that finished after `since`, or None."""
+        outcomes = (self._read(self.outcome_path) or {}).get("operations", {})
+        recent = [o for op, o in outcomes.items()
+                  if op in DISRUPTIVE and o.get("finished_at", 0) > since]
+        return max(recent, key=lambda o: o["finished_at"]) if recent else None
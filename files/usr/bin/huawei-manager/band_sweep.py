@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Band sweep for Huawei Manager.
+Applies each LTE band mask the modem supports, waits for attach, samples
+signal and throughput, then applies the best mask or restores the original.
+Results are stored per serving cell so a site keeps its measurements.
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import signal
+import itertools
+import statistics
+from argparse import ArgumentParser
+from huawei_lte_api.Client import Client
+from huawei_lte_api.AuthorizedConnection import AuthorizedConnection
+import urllib3
+from response_cache import ResponseCache, device_key
+from scheduler import RequestBudget
+from arbiter import ModemLease, ModemBusyError
+from openmetrics import parse_number
+from utils import parse_modem_url
+from transport import new_session
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+RESULTS_FILE = "/etc/huawei-manager/band_sweep.json"
+PROGRESS_DIR = "/tmp/huawei-manager-sweep"
+ALL_BANDS = 0x7FFFFFFFFFFFFFFF
+LTE_ONLY = "03"
+LEASE_WAIT = 60
+SAMPLE_INTERVAL = 5
+# Overshoot of one measurement past attach timeout + window (sample and budget waits)
+STEP_SLACK = 2 * SAMPLE_INTERVAL
+# Tries at re-applying the original bands after an error; the modem may be re-attaching
+RESTORE_ATTEMPTS = 3
+
+
+class SweepStopped(Exception):
+    """Raised by the SIGTERM handler; the sweep restores the original mask."""
+
+
+def json_response(success, **fields):
+    """Output JSON response and exit."""
+    print(json.dumps(dict(fields, success=success)))
+    sys.exit(0 if success else 1)
+
+
+def mask_hex(mask):
+    return format(mask, "X")
+
+
+def band_numbers(mask):
+    """LTE band numbers of a mask (bit n is band n+1)."""
+    return [bit + 1 for bit in range(64) if mask >> bit & 1]
+
+
+def supported_mask(band_list):
+    """Union of the LTE band values reported by net_mode_list, or 0."""
+    bands = ((band_list or {}).get("LTEBandList") or {}).get("Band") or []
+    if isinstance(bands, dict):
+        bands = [bands]
+    mask = 0
+    for band in bands:
+        try:
+            value = int(band.get("Value", "0"), 16)
+        except (TypeError, ValueError):
+            continue
+        if value != ALL_BANDS:
+            mask |= value
+    return mask
+
+
+def candidate_masks(supported, pairs=False):
+    """Single-band masks, optionally every two-band combination."""
+    singles = [1 << (band - 1) for band in band_numbers(supported)]
+    candidates = list(singles)
+    if pairs:
+        candidates += [a | b for a, b in itertools.combinations(singles, 2)]
+    return candidates
+
+
+def score(result, rank="signal"):
+    """
+    Higher is better. Signal ranking weighs SINR over RSRP; throughput is only
+    meaningful while traffic is flowing, so it must be asked for.
+    """
+    if not result.get("attached") or result.get("sinr") is None:
+        return None
+    if rank == "throughput":
+        return result["rate_down"] + result["rate_up"]
+    return result["sinr"] + 0.25 * ((result["rsrp"] or -140) + 120)
+
+
+class Progress:
+    """Sweep state on tmpfs, readable by LuCI while the sweep runs."""
+
+    def __init__(self, key):
+        self.path = os.path.join(PROGRESS_DIR, f"{key}.json")
+        self.state = {}
+
+    def update(self, **fields):
+        self.state.update(fields, updated_at=time.time())
+        os.makedirs(PROGRESS_DIR, mode=0o700, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def load_results(path=RESULTS_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_results(key, cell, sweep, path=RESULTS_FILE):
+    """Store a sweep under the device and the cell it started on."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        results = load_results(path)
+        results.setdefault(key, {})[cell] = sweep
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(results, f)
+        os.replace(tmp_path, path)
+
+
+class BandSweep:
+    def __init__(self, client, budget, progress, window=30, attach_timeout=90, rank="signal"):
+        self.client = client
+        self.budget = budget
+        self.progress = progress
+        self.window = window
+        self.attach_timeout = attach_timeout
+        self.rank = rank
+
+    def _call(self, fetch):
+        # The daemon is paused by the lease; the budget still caps our own rate
+        self.budget.acquire(max_wait=SAMPLE_INTERVAL * 2)
+        return fetch()
+
+    def apply(self, lte_band, network_band, network_mode):
+        self._call(lambda: self.client.net.set_net_mode(lte_band, network_band, network_mode))
+
+    def wait_attach(self):
+        """Wait until the modem is connected with a measurable signal."""
+        deadline = time.time() + self.attach_timeout
+        while time.time() < deadline:
+            time.sleep(SAMPLE_INTERVAL)
+            try:
+                status = self._call(self.client.monitoring.status)
+                signal = self._call(self.client.device.signal)
+            except Exception:
+                continue  # Modem is often unreachable while re-attaching
+            if str(status.get("ConnectionStatus")) == "901" and parse_number(signal.get("rsrp")) is not None:
+                return True
+        return False
+
+    def sample(self):
+        """Median signal and average throughput over the window."""
+        rsrp, sinr, cells = [], [], []
+        first = last = None
+        deadline = time.time() + self.window
+        while True:
+            try:
+                signal = self._call(self.client.device.signal)
+                traffic = self._call(self.client.monitoring.traffic_statistics)
+            except Exception:
+                signal, traffic = {}, {}
+            now = time.time()
+            for values, name in ((rsrp, "rsrp"), (sinr, "sinr")):
+                value = parse_number(signal.get(name))
+                if value is not None:
+                    values.append(value)
+            if signal.get("cell_id"):
+                cells.append(str(signal["cell_id"]))
+            down = parse_number(traffic.get("TotalDownload"))
+            up = parse_number(traffic.get("TotalUpload"))
+            if down is not None and up is not None:
+                first = first or (now, down, up)
+                last = (now, down, up)
+            if now >= deadline:
+                break
+            time.sleep(SAMPLE_INTERVAL)
+
+        elapsed = last[0] - first[0] if first and last else 0
+        return {
+            "rsrp": statistics.median(rsrp) if rsrp else None,
+            "sinr": statistics.median(sinr) if sinr else None,
+            "cell_id": max(set(cells), key=cells.count) if cells else None,
+            "samples": len(sinr),
+            # Counter resets on re-attach show up as negative deltas
+            "rate_down": round(max(0.0, (last[1] - first[1]) / elapsed), 1) if elapsed else 0.0,
+            "rate_up": round(max(0.0, (last[2] - first[2]) / elapsed), 1) if elapsed else 0.0
+        }
+
+    def measure(self, label, lte_band, network_band, network_mode, index, total):
+        self.progress.update(step=index, steps=total, current=label)
+        started = time.time()
+        self.apply(lte_band, network_band, network_mode)
+        attached = self.wait_attach()
+        result = {"label": label, "lte_band": lte_band, "network_mode": network_mode,
+                  "attached": attached, "attach_seconds": round(time.time() - started, 1)}
+        if attached:
+            result.update(self.sample())
+        result["score"] = score(result, self.rank)
+        return result
+
+
+def step_seconds(attach_timeout, window):
+    """Longest one measurement is expected to take."""
+    return attach_timeout + window + STEP_SLACK
+
+
+def run_sweep(client, key, progress, args, deadline=None):
+    """
+    Measure the baseline and every candidate mask, then apply the best or
+    restore. Candidates that would run past `deadline` are skipped. On any
+    error, SweepStopped included, the original mask is re-applied before
+    re-raising.
+    """
+    progress.update(state="running", started_at=time.time(), results=[], best=None)
+
+    original = client.net.net_mode()
+    original_mask = int(original.get("LTEBand") or mask_hex(ALL_BANDS), 16)
+    network_band = original.get("NetworkBand") or "3FFFFFFF"
+
+    if args.bands:
+        supported = 0
+        for band in args.bands.split(","):
+            supported |= 1 << (int(band) - 1)
+    else:
+        supported = supported_mask(client.net.net_mode_list())
+    if not supported:
+        raise ValueError("Modem does not report its LTE bands, pass --bands")
+
+    sweep = BandSweep(client, RequestBudget(key), progress, args.window, args.attach_timeout, args.rank)
+    masks = candidate_masks(supported, args.pairs)
+    total = len(masks) + 1
+    start_cell = str(client.device.signal().get("cell_id") or "unknown")
+
+    step = step_seconds(args.attach_timeout, args.window)
+    skipped = 0
+    try:
+        # The current configuration is the baseline every candidate has to beat
+        baseline = sweep.measure("current", mask_hex(original_mask), network_band,
+                                 original.get("NetworkMode") or "00", 1, total)
+        results = [baseline]
+        progress.update(results=results)
+        for index, mask in enumerate(masks, start=2):
+            if deadline and time.time() + step > deadline:
+                # Out of time: stop here and still restore or apply below
+                skipped = len(masks) - index + 2
+                break
+            label = "+".join(f"B{n}" for n in band_numbers(mask))
+            results.append(sweep.measure(label, mask_hex(mask), network_band, LTE_ONLY, index, total))
+            progress.update(results=results)
+
+        ranked = [r for r in results if r["score"] is not None]
+        best = max(ranked, key=lambda r: r["score"]) if ranked else None
+        improved = (best is not None and best is not baseline and
+                    (baseline["score"] is None or best["score"] >= baseline["score"] + args.margin))
+        if args.apply == "best" and improved:
+            chosen = best
+        else:
+            chosen = baseline
+        progress.update(current=f"applying {chosen['label']}")
+        sweep.apply(chosen["lte_band"], network_band, chosen["network_mode"])
+    except Exception as e:
+        # Never leave the modem locked to a candidate band in LTE-only mode
+        progress.update(current="restoring original bands")
+        restore_error = None
+        for attempt in range(RESTORE_ATTEMPTS):
+            try:
+                sweep.apply(mask_hex(original_mask), network_band, original.get("NetworkMode") or "00")
+                restore_error = None
+                break
+            except Exception as restore_e:
+                restore_error = restore_e
+                time.sleep(SAMPLE_INTERVAL * 2)
+        if restore_error:
+            print(f"Restoring original bands {mask_hex(original_mask)} failed: {restore_error}", file=sys.stderr)
+            progress.update(restore_error=str(restore_error))
+        raise e
+
+    summary = {
+        "finished_at": time.time(),
+        "rank": args.rank,
+        "window": args.window,
+        "results": results,
+        "best": best["label"] if best else None,
+        "applied": chosen["label"],
+        "restored": chosen is baseline,
+        "complete": not skipped,
+        "skipped": skipped
+    }
+    save_results(key, start_cell, summary, args.results_file)
+    progress.update(state="done", current=None, best=summary["best"], applied=chosen["label"])
+    return summary
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark LTE band combinations")
+    parser.add_argument("url", type=str, help="Modem URL")
+    parser.add_argument("--username", type=str, default="admin")
+    parser.add_argument("--password", type=str, default="admin")
+    parser.add_argument("--window", type=int, default=30, help="Seconds to sample each band mask")
+    parser.add_argument("--attach-timeout", type=int, default=90, help="Seconds to wait for attach")
+    parser.add_argument("--bands", type=str, default="", help="Comma-separated LTE bands (default: from modem)")
+    parser.add_argument("--pairs", action="store_true", help="Also try every two-band combination")
+    parser.add_argument("--rank", choices=["signal", "throughput"], default="signal",
+                        help="Rank by signal quality, or by throughput while a load is running")
+    parser.add_argument("--margin", type=float, default=2.0,
+                        help="Score a mask must gain over the current setting to be applied")
+    parser.add_argument("--apply", choices=["best", "restore"], default="best")
+    parser.add_argument("--max-seconds", type=int, default=0,
+                        help="Stop measuring in time to apply a result within this many seconds (0: no limit)")
+    parser.add_argument("--results-file", type=str, default=RESULTS_FILE)
+    parser.add_argument("--show", action="store_true", help="Print progress and stored results only")
+    parser.add_argument("--source", type=str, default="luci")
+    args = parser.parse_args()
+
+    clean_url, username, password = parse_modem_url(args.url, args.username, args.password)
+    key = device_key(clean_url, username)
+
+    if args.show:
+        json_response(True, progress=Progress(key).read(),
+                      results=load_results(args.results_file).get(key, {}))
+
+    lease = ModemLease(key)
+    progress = Progress(key)
+    started_at = time.time()
+    deadline = started_at + args.max_seconds if args.max_seconds else None
+
+    def stop(signum, frame):
+        # Once only: the restore itself must not be interrupted
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise SweepStopped("Sweep terminated")
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        # Held for the whole sweep so the daemon does not reconnect meanwhile
+        lease.acquire("bands", source=f"{args.source} sweep", timeout=LEASE_WAIT)
+    except ModemBusyError as e:
+        json_response(False, error=str(e))
+
+    session = new_session()
+    ok = False
+    try:
+        with AuthorizedConnection(clean_url, username=username, password=password,
+                                  requests_session=session) as connection:
+            summary = run_sweep(Client(connection), key, progress, args, deadline)
+        ok = True
+    except Exception as e:
+        progress.update(state="failed", error=str(e))
+        json_response(False, error=str(e))
+    finally:
+        ResponseCache(clean_url, username).invalidate("bands")
+        lease.record_outcome("bands", args.source, ok, started_at, sweep=True)
+        lease.release()
+    json_response(True, data=summary)
+
+
+if __name__ == "__main__":
+    main()
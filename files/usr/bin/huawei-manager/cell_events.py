@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cell change tracking for Huawei Manager.
+Diffs each poll's radio state (serving cell, band, CA set, network mode,
+PLMN) and WAN IP against the previous one and keeps a bounded history of
+the changes with how long the previous value lasted. Reconnects are noted
+in the same history so handovers can be lined up with IP changes.
+"""
+import time
+from collections import deque
+
+HISTORY_SIZE = 200
+# Radio state first, so an IP change in the same poll is listed after its cause
+TRACKED = ("plmn", "mode", "cell", "band", "ca", "ip")
+RADIO_KINDS = ("plmn", "mode", "cell", "band", "ca")
+# Seconds around an IP change or reconnect in which radio changes are related to it
+CORRELATE_WINDOW = 120
+
+SCELL_FIELDS = ("lte_ca_scell_band", "ScellBand", "scell_band", "lte_scc_band", "lte_ca_scell2_band")
+
+
+def _text(value):
+    value = str(value).strip() if value is not None else ""
+    return value or None
+
+
+def radio_state(data):
+    """Tracked values of a dashboard snapshot; sections it lacks are left out."""
+    state = {}
+    signal = data.get("signal")
+    if signal:
+        state["cell"] = _text(signal.get("cell_id"))
+        state["band"] = _text(signal.get("band") or signal.get("Band") or signal.get("lte_ca_pcell_band"))
+        scells = sorted({str(signal[f]).strip() for f in SCELL_FIELDS if _text(signal.get(f))})
+        # No secondary carrier is a state too, otherwise CA drops would go unseen
+        state["ca"] = "+".join(scells) or "none"
+    status = data.get("status")
+    if status:
+        state["mode"] = _text(status.get("CurrentNetworkTypeEx") or status.get("CurrentNetworkType"))
+    plmn = data.get("plmn")
+    if plmn:
+        state["plmn"] = _text(plmn.get("Numeric") or plmn.get("FullName"))
+    return {k: v for k, v in state.items() if v is not None}
+
+
+class CellTracker:
+    """Per-device radio state and change history."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.current = {}
+        self.since = {}
+        self.events = deque(maxlen=size)
+
+    @classmethod
+    def from_dict(cls, state, size=HISTORY_SIZE):
+        tracker = cls(size)
+        tracker.current = dict((state or {}).get("current") or {})
+        tracker.since = dict((state or {}).get("since") or {})
+        tracker.events.extend((state or {}).get("events") or [])
+        return tracker
+
+    def to_dict(self):
+        return {"current": self.current, "since": self.since, "events": list(self.events)}
+
+    def observe(self, data, ip=None, now=None):
+        """Record what changed since the last poll and return the new events."""
+        now = time.time() if now is None else now
+        values = radio_state(data)
+        if ip:
+            values["ip"] = ip
+        signal = data.get("signal") or {}
+
+        new = []
+        for kind in TRACKED:
+            value = values.get(kind)
+            old = self.current.get(kind)
+            if value is None or value == old:
+                continue
+            if old is not None:
+                event = {"t": round(now, 1), "kind": kind, "from": old, "to": value,
+                         "dwell": round(now - self.since.get(kind, now))}
+                if kind == "cell":
+                    event.update((k, signal[k]) for k in ("pci", "enodeb_id") if signal.get(k))
+                new.append(event)
+            self.current[kind] = value
+            self.since[kind] = now
+        self.events.extend(new)
+        return new
+
+    def note(self, kind, now=None, **fields):
+        """Record an action (e.g. a reconnect) in the history."""
+        event = dict(fields, t=round(time.time() if now is None else now, 1), kind=kind)
+        self.events.append(event)
+        return event
+
+    def query(self, since=None, kinds=None, limit=HISTORY_SIZE):
+        """Events newer than `since`, oldest first, at most `limit` (the newest)."""
+        events = [e for e in self.events
+                  if (since is None or e["t"] > since) and (not kinds or e["kind"] in kinds)]
+        return events[-limit:] if limit else []
+
+    def correlate(self, window=CORRELATE_WINDOW, since=None):
+        """Each IP change and reconnect with the radio changes within `window` seconds of it."""
+        radio = [e for e in self.events if e["kind"] in RADIO_KINDS]
+        related = []
+        for event in self.events:
+            if event["kind"] not in ("ip", "reconnect") or since is not None and event["t"] <= since:
+                continue
+            related.append(dict(event, radio=[
+                dict(r, offset=round(r["t"] - event["t"], 1))
+                for r in radio if abs(r["t"] - event["t"]) <= window
+            ]))
+        return related
+
+    def snapshot(self, now=None):
+        """Current values with their dwell so far."""
+        now = time.time() if now is None else now
+        return {kind: {"value": value, "dwell": round(now - self.since.get(kind, now))}
+                for kind, value in self.current.items()}
@@ -15,6 +15,11 @@ from urllib.parse import urlparse
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+try:
+    from transport import new_session
+except ImportError:
+    new_session = None
+
 def get_wan_ip(url, username=None, password=None):
     """
     Get WAN IP from Huawei modem using multiple fallback methods.
@@ -30,8 +35,11 @@ def get_wan_ip(url, username=None, password=None):
         connection_url = f"{url.rstrip('/')}"
         
         # Create a custom session with SSL verification disabled
-        session = requests.Session()
-        session.verify = False
+        if new_session:
+            session = new_session()
+        else:
+            session = requests.Session()
+            session.verify = False
         
         with AuthorizedConnection(connection_url, username=username, password=password, requests_session=session) as connection:
             print("DEBUG: AuthorizedConnection initialized. Creating Client...", file=sys.stderr)
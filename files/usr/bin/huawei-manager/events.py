@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Event stream for Huawei Manager.
+Typed daemon events (status transitions, reconnects, IP changes,
+notification outcomes) appended to a bounded NDJSON file on tmpfs. Every
+event carries a sequence number that keeps increasing across restarts, so
+consumers can follow the stream with 'since=<last seq>'. The file starts
+with a header naming the stream; a new id means tmpfs was cleared (reboot)
+and numbering started over.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+
+EVENTS_FILE = "/tmp/huawei-manager.events"
+# Events kept in memory and on disk; the file is compacted to this many
+# once it holds twice as many
+MAX_EVENTS = 1000
+EVENT_TYPES = ("status", "reconnect_start", "reconnect_end", "ip_change", "notification")
+
+
+def _line(record):
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+class EventLog:
+    def __init__(self, path=EVENTS_FILE, size=MAX_EVENTS):
+        self.path = path
+        self.size = size
+        self.events = deque(maxlen=size)
+        self.seq = 0
+        self.lines = 0
+        self.stream = uuid.uuid4().hex[:12]
+        # False until the file on disk starts with our header
+        self._header = False
+        self._cond = threading.Condition()
+
+    def load(self):
+        """Resume from the file a previous daemon run left behind."""
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Cut off by a crash mid-write
+                    if "seq" not in record:
+                        if record.get("stream"):
+                            self.stream = record["stream"]
+                            self._header = True
+                        continue
+                    self.events.append(record)
+                    self.seq = max(self.seq, record["seq"])
+                    self.lines += 1
+        except OSError:
+            pass
+        return self
+
+    def emit(self, event_type, device=None, **fields):
+        """Append an event and wake waiting readers. Returns the event."""
+        with self._cond:
+            self.seq += 1
+            event = {"seq": self.seq, "t": round(time.time(), 3), "type": event_type}
+            if device is not None:
+                event["device"] = device
+            event.update(fields)
+            self.events.append(event)
+            self._append(event)
+            self._cond.notify_all()
+        return event
+
+    def _append(self, event):
+        try:
+            if not self._header or self.lines >= 2 * self.size:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(_line({"stream": self.stream, "created": round(time.time(), 3)}))
+                    f.writelines(_line(e) for e in self.events)
+                os.replace(tmp_path, self.path)
+                self.lines = len(self.events)
+                self._header = True
+            else:
+                with open(self.path, "a") as f:
+                    f.write(_line(event))
+                self.lines += 1
+        except OSError:
+            pass  # Memory still serves the API
+
+    def since(self, seq=0, limit=100, types=None, device=None, wait=0, stream=None):
+        """
+        Events after `seq`, oldest first, at most `limit`. With `wait`, blocks
+        up to that many seconds for a newer matching event (long-poll).
+        'gap' tells a consumer that events after its `seq` were dropped or,
+        when its `stream` differs, that the stream restarted.
+        """
+        deadline = time.time() + wait
+        with self._cond:
+            # Another stream, or ahead of this one: tmpfs was cleared, start over
+            reset = (stream is not None and stream != self.stream) or seq > self.seq
+            if reset:
+                seq = 0
+            while True:
+                matched = [e for e in self.events if e["seq"] > seq
+                           and (not types or e["type"] in types)
+                           and (device is None or e.get("device") == device)]
+                remaining = deadline - time.time()
+                if matched or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            first = self.events[0]["seq"] if self.events else self.seq + 1
+            matched = matched[:limit]
+            # Resume after the last event looked at, even if filtered out
+            if len(matched) == limit:
+                cursor = matched[-1]["seq"]
+            else:
+                cursor = max(seq, self.seq)
+            return {"stream": self.stream, "events": matched, "next": cursor, "first": first,
+                    "gap": reset or seq + 1 < first}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-device health tracking for Huawei Manager.
+Circuit breaker with exponential backoff and a cheap reachability probe.
+"""
+import random
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def probe_host(url, timeout=1.0):
+    """
+    Check that the modem web server accepts TCP connections.
+    Much cheaper than a login, used to gate poll attempts.
+
+    Returns:
+        bool: True if the host:port is reachable
+    """
+    try:
+        if '://' not in url:
+            url = f"http://{url}"
+        parsed = urlparse(url)
+        host = parsed.hostname
+        if not host:
+            return False
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        # 192.168.7.1 is always upgraded to HTTPS by the scripts
+        if parsed.scheme == 'http' and not parsed.port and '192.168.7.1' in host:
+            port = 443
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except (socket.timeout, OSError, ValueError):
+        return False
+
+
+class CircuitBreaker:
+    """
+    Health state machine: healthy -> degraded -> open -> half-open.
+
+    Every failure schedules the next attempt with exponential backoff and
+    jitter. After `threshold` consecutive failures the breaker opens; once the
+    backoff expires a single half-open trial decides between healthy and open.
+    """
+
+    def __init__(self, threshold=3, base_delay=5, max_delay=300, jitter=0.2, history=20):
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.history = history
+        self.state = HEALTHY
+        self.failures = 0
+        self.next_attempt = 0
+        self.last_error = None
+        self.transitions = []
+        self._lock = threading.Lock()
+
+    def _transition(self, new_state, reason):
+        if new_state == self.state:
+            return False
+        self.transitions.append({
+            "from": self.state,
+            "to": new_state,
+            "at": int(time.time()),
+            "reason": reason
+        })
+        self.transitions = self.transitions[-self.history:]
+        self.state = new_state
+        return True
+
+    def backoff(self):
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, self.failures - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def allow(self):
+        """Return True if an attempt may be made now."""
+        with self._lock:
+            if time.time() < self.next_attempt:
+                return False
+            if self.state == OPEN:
+                self._transition(HALF_OPEN, "backoff expired")
+            return True
+
+    def retry_in(self):
+        return max(0.0, self.next_attempt - time.time())
+
+    def record_success(self):
+        """Returns True if the state changed."""
+        with self._lock:
+            self.failures = 0
+            self.next_attempt = 0
+            self.last_error = None
+            return self._transition(HEALTHY, "poll succeeded")
+
+    def record_failure(self, reason):
+        """Returns True if the state changed."""
+        with self._lock:
+            self.failures += 1
+            self.last_error = reason
+            self.next_attempt = time.time() + self.backoff()
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                return self._transition(OPEN, reason)
+            return self._transition(DEGRADED, reason)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": round(self.retry_in(), 1),
+                "last_error": self.last_error,
+                "transitions": list(self.transitions)
+            }
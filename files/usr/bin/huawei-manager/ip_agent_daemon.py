@@ -6,6 +6,7 @@ Multi-device IP monitoring and auto-reconnect service.
 import sys
 import os
 import time
+import re
 import json
 import subprocess
 import ipaddress
@@ -24,7 +25,9 @@ import threading
 import queue
 import signal
 import tempfile
+import shlex
 from logging.handlers import RotatingFileHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 # Import shared utility
 import sys
@@ -34,6 +37,40 @@ except ImportError:
     check_ip_prefix = None
     utils_send_telegram = None
 
+from utils import parse_modem_url
+from response_cache import ResponseCache, device_key
+from scheduler import PollScheduler, RequestBudget, SectionSchedule, parse_section_intervals
+from arbiter import ModemLease, DISRUPTIVE
+from traffic import TrafficAccumulator
+from cell_events import CellTracker, TRACKED as CELL_KINDS, CORRELATE_WINDOW
+
+try:
+    import openmetrics
+except ImportError:
+    openmetrics = None
+
+try:
+    import logpipe
+except ImportError:
+    logpipe = None
+
+try:
+    import jobs
+except ImportError:
+    jobs = None
+
+try:
+    import sms_rules
+except ImportError:
+    sms_rules = None
+
+try:
+    import events
+except ImportError:
+    events = None
+
+from health import CircuitBreaker, probe_host, HEALTHY
+
 # Configure logging
 logger = logging.getLogger("huawei-manager")
 logger.setLevel(logging.INFO)
@@ -74,28 +111,120 @@ logger.addHandler(console_handler)
 
 # Constants
 UCI_PACKAGE = "huawei-manager"
+SCRIPT_DIR = "/usr/bin/huawei-manager"
 STATUS_FILE = "/tmp/huawei-manager.status"
 STATUS_FILE_TMP = "/tmp/huawei-manager.status.tmp"
 METRICS_FILE = "/tmp/huawei-manager.metrics"
 METRICS_FILE_TMP = "/tmp/huawei-manager.metrics.tmp"
+TRAFFIC_FILE = "/tmp/huawei-manager.traffic"
+TRAFFIC_FILE_TMP = "/tmp/huawei-manager.traffic.tmp"
+# Traffic counters are persisted at most this often (seconds)
+TRAFFIC_SAVE_INTERVAL = 60
+# Unchanged device statuses are rewritten at most this often (keeps last_update moving)
+STATUS_REFRESH = 30
+CELLS_FILE = "/tmp/huawei-manager.cells"
+CELLS_FILE_TMP = "/tmp/huawei-manager.cells.tmp"
 STATUS_FILE_DIR = "/tmp"
+API_DEFAULT_BIND = "127.0.0.1"
+API_DEFAULT_PORT = 9778
+# Budget tokens daemon polls leave untouched for manual LuCI actions
+BUDGET_RESERVE = 3
+# Info sections fetched on every poll; month_stats only when traffic needs re-anchoring
+POLL_SECTIONS = ["device", "signal", "traffic", "status", "net_mode", "plmn", "dialup"]
+INFO_SECTIONS = POLL_SECTIONS + ["month_stats"]
+# Snapshots older than this are not served by the /info API
+INFO_MAX_AGE = 20
+# Older snapshots are still answered at once while one refresh runs (stale-while-revalidate)
+INFO_STALE_MAX = 120
+# Seconds a request waits for another request's refresh of the same device
+INFO_FLIGHT_WAIT = 35
+# Per-device fields of the /fleet summary, in output order
+FLEET_FIELDS = ["name", "status", "ip", "target", "up", "rsrp", "sinr", "band", "cell",
+                "rate_down", "rate_up", "month_total", "reconnects_today", "reconnects_total",
+                "health", "polled_at"]
+# Timeout in seconds per job kind
+JOB_TIMEOUTS = {"reconnect": 300, "reboot": 60, "sms_bulk": 300}
+# Band sweeps are sized from their mask count: per mask attach + window +
+# sampling slack (band_sweep.STEP_SLACK), plus lease wait and login before,
+# and applying the result after
+SWEEP_ATTACH_TIMEOUT = 90
+SWEEP_STEP_SLACK = 10
+SWEEP_SETUP_SECONDS = 90
+SWEEP_APPLY_SECONDS = 60
+# band_sweep.PROGRESS_DIR (band_sweep itself needs the modem client libraries)
+SWEEP_PROGRESS_DIR = "/tmp/huawei-manager-sweep"
+# Longest a /job request may wait for a change
+JOB_WAIT_MAX = 25
+# LuCI touches one file per device it shows (".all" for every device)
+VIEWER_DIR = "/tmp/huawei-manager-viewers"
+# Seconds a heartbeat keeps a device on its fast cadence
+VIEWER_TTL = 30
+# Poll interval factor while the 1-minute load average is above load_threshold
+LOAD_BACKOFF = 3
+SMS_STATE_FILE = "/tmp/huawei-manager.sms"
+# Messages listed per check; the inbox is read newest first
+SMS_LIST_COUNT = 50
+EVENTS_FILE = "/tmp/huawei-manager.events"
+# Longest an /events request may wait for a new event
+EVENTS_WAIT_MAX = 25
+# Trailing retry counter of a status text, e.g. "No IP (3)"
+STATE_COUNTER = re.compile(r" \(\d+\)$")
 
 # Global state
 status_lock = threading.Lock()
 metrics_lock = threading.Lock()
+runtime_lock = threading.Lock()
+traffic_lock = threading.Lock()
+cells_lock = threading.Lock()
 global_statuses = {}
 global_metrics = {}
+global_runtime = {}
+global_traffic = {}
+traffic_saved_at = 0
+# Bumped on every metrics save; part of the status fingerprint
+metrics_version = 0
+# Per device: what the last status write contained, and when
+status_fingerprints = {}
+status_written_at = 0
+# Per device: section -> (value, serialized value) of the last dashboard snapshot written
+snapshot_fragments = {}
+global_cells = {}
+health_registry = {}
+monitor_registry = {}
+job_queue = None
+# On-demand info refreshes: one in flight per device, results kept per section
+info_flights_lock = threading.Lock()
+info_flights = {}
+info_refreshed = {}
 notification_q = queue.Queue()
+# SMS rules: one inbox check queued per device at a time
+sms_lock = threading.Lock()
+sms_rule_list = []
+sms_state = None
+sms_outbox = queue.Queue()
+sms_pending = set()
+# Typed state transitions (status, reconnects, IP changes, notifications)
+event_log = None
 shutdown_event = threading.Event()
+poll_scheduler = PollScheduler()
 
-def get_dashboard_data(url, username, password):
-    """Get all dashboard information via eternal script (isolated process)."""
+def get_dashboard_data(url, username, password, session_cache=False, sections=None, daemon_poll=True):
+    """
+    Get dashboard information via eternal script (isolated process).
+    Daemon polls bypass the response cache and have drawn their budget already.
+    """
     try:
         cmd = [
-            "python3", "/usr/bin/huawei-manager/modem_api.py",
+            "python3", f"{SCRIPT_DIR}/modem_api.py",
             url, "--username", username, "--password", password,
             "--action", "info"
         ]
+        if daemon_poll:
+            cmd += ["--refresh", "--budget-drawn"]
+        if sections:
+            cmd += ["--sections", ",".join(sections)]
+        if session_cache:
+            cmd.append("--session-cache")
         
         # Timeout after 30s to prevent hangs
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
@@ -125,15 +254,36 @@ def get_dashboard_data(url, username, password):
         return None
 
 def save_dashboard_status(section_id, data):
-    """Save dashboard status to JSON file."""
+    """
+    Save dashboard status to JSON file. Sections equal to the last write reuse
+    their serialized form; if none changed only the file's mtime is refreshed,
+    which is all LuCI's freshness check looks at.
+    """
     try:
         filepath = f"{STATUS_FILE_DIR}/huawei-manager-status_{section_id}.json"
+        previous = snapshot_fragments.get(section_id) or {}
+        fragments = {}
+        changed = set(previous) != set(data)
+        for key, value in data.items():
+            old = previous.get(key)
+            if old is not None and old[0] == value:
+                fragments[key] = old
+            else:
+                fragments[key] = (value, json.dumps(value))
+                changed = True
+        snapshot_fragments[section_id] = fragments
+
+        if not changed and os.path.exists(filepath):
+            os.utime(filepath)
+            return
+        body = ", ".join(f"{json.dumps(key)}: {text}" for key, (_value, text) in fragments.items())
         # Create temp file then rename for atomic write
         tmp_path = f"{filepath}.tmp"
         with open(tmp_path, 'w') as f:
-            json.dump({"success": True, "data": data, "cached": True, "timestamp": time.time()}, f)
+            f.write(f'{{"success": true, "data": {{{body}}}, "cached": true, "timestamp": {time.time()}}}')
         os.replace(tmp_path, filepath)
     except Exception as e:
+        snapshot_fragments.pop(section_id, None)
         logger.error(f"Error saving dashboard status: {e}")
 
 def extract_wan_ip(data):
@@ -182,7 +332,9 @@ def load_metrics():
         global_metrics = {}
 
 def save_metrics():
+    global metrics_version
     with metrics_lock:
+        metrics_version += 1
         try:
             metrics_content = json.dumps({
                 "devices": global_metrics,
@@ -196,6 +348,86 @@ def save_metrics():
         except Exception as e:
             logger.error(f"Error saving metrics file: {e}")
 
+def load_traffic():
+    global global_traffic
+    try:
+        if os.path.exists(TRAFFIC_FILE):
+            with open(TRAFFIC_FILE, "r") as f:
+                data = json.load(f)
+            global_traffic = {k: TrafficAccumulator.from_dict(v) for k, v in data.get("devices", {}).items()}
+            logger.debug(f"Loaded traffic counters for {len(global_traffic)} devices")
+    except Exception as e:
+        logger.warning(f"Could not load traffic file: {e}")
+        global_traffic = {}
+
+def save_traffic():
+    """Persist traffic counters. Caller must hold traffic_lock."""
+    global traffic_saved_at
+    try:
+        content = json.dumps({
+            "devices": {k: v.to_dict() for k, v in global_traffic.items()},
+            "last_save": int(time.time())
+        })
+        with open(TRAFFIC_FILE_TMP, "w") as f:
+            f.write(content)
+        os.replace(TRAFFIC_FILE_TMP, TRAFFIC_FILE)
+        traffic_saved_at = time.time()
+    except Exception as e:
+        logger.error(f"Error saving traffic file: {e}")
+
+def traffic_needs_anchor(device_id):
+    with traffic_lock:
+        acc = global_traffic.get(device_id)
+        return acc is None or acc.needs_anchor()
+
+def record_traffic(device_id, data):
+    """Fold a poll into the device's traffic counters and return the usage summary."""
+    with traffic_lock:
+        acc = global_traffic.setdefault(device_id, TrafficAccumulator())
+        acc.update(data.get("traffic"), data.get("month_stats"))
+        if time.time() - traffic_saved_at >= TRAFFIC_SAVE_INTERVAL:
+            save_traffic()
+        return acc.snapshot()
+
+def load_cells():
+    global global_cells
+    try:
+        if os.path.exists(CELLS_FILE):
+            with open(CELLS_FILE, "r") as f:
+                data = json.load(f)
+            global_cells = {k: CellTracker.from_dict(v) for k, v in data.get("devices", {}).items()}
+    except Exception as e:
+        logger.warning(f"Could not load cell history: {e}")
+        global_cells = {}
+
+def save_cells():
+    """Persist cell trackers. Caller must hold cells_lock."""
+    try:
+        content = json.dumps({"devices": {k: v.to_dict() for k, v in global_cells.items()}})
+        with open(CELLS_FILE_TMP, "w") as f:
+            f.write(content)
+        os.replace(CELLS_FILE_TMP, CELLS_FILE)
+    except Exception as e:
+        logger.error(f"Error saving cell history: {e}")
+
+def emit_event(event_type, device_id=None, **fields):
+    """Append an event to the stream (no-op without the events module)."""
+    if event_log:
+        event_log.emit(event_type, device_id, **fields)
+
+def record_radio(device_id, device_name, data, ip):
+    """Diff a poll against the device's radio state; only changes are stored."""
+    with cells_lock:
+        tracker = global_cells.setdefault(device_id, CellTracker())
+        changes = tracker.observe(data, ip)
+        if changes:
+            save_cells()
+    for event in changes:
+        logger.info(f"[{device_name}] {event['kind']} changed: {event['from']} -> {event['to']} "
+                    f"(after {event['dwell']}s)")
+        if event["kind"] == "ip":
+            emit_event("ip_change", device_id, **{"from": event["from"], "to": event["to"], "dwell": event["dwell"]})
+
 def init_device_metrics(device_id, device_name):
     with metrics_lock:
         today = get_today_date()
@@ -225,9 +457,16 @@ def record_reconnect(device_id):
             global_metrics[device_id]["reconnects_today"] += 1
             global_metrics[device_id]["total_reconnects"] = global_metrics[device_id].get("total_reconnects", 0) + 1
             global_metrics[device_id]["target_found_at"] = None
+            # Start of a hunt, used for time-to-target
+            if not global_metrics[device_id].get("hunt_started_at"):
+                global_metrics[device_id]["hunt_started_at"] = int(time.time())
     save_metrics()
+    with cells_lock:
+        global_cells.setdefault(device_id, CellTracker()).note("reconnect", source="daemon")
+        save_cells()
 
 def record_target_found(device_id, ip):
+    changed = False
     with metrics_lock:
         if device_id in global_metrics:
             now = int(time.time())
@@ -235,9 +474,16 @@ def record_target_found(device_id, ip):
             
             if metrics.get("target_found_at") is None:
                 metrics["target_found_at"] = now
+                changed = True
+
+            if metrics.get("hunt_started_at"):
+                metrics["last_time_to_target"] = now - metrics["hunt_started_at"]
+                metrics["hunt_started_at"] = None
+                changed = True
             
             current_ip = metrics.get("current_ip")
             if current_ip != ip:
+                changed = True
                 if current_ip and metrics.get("current_ip_since"):
                     duration = now - metrics["current_ip_since"]
                     history_entry = {
@@ -253,26 +499,124 @@ def record_target_found(device_id, ip):
                 
                 metrics["current_ip"] = ip
                 metrics["current_ip_since"] = now
-    save_metrics()
+    # Called on every poll while on target: only write when something changed
+    if changed:
+        save_metrics()
+
+def write_status_file():
+    """Write global_statuses to disk. Caller must hold status_lock."""
+    global status_written_at
+    status_written_at = time.time()
+    try:
+        status_content = json.dumps({"devices": global_statuses}, indent=2)
+        with open(STATUS_FILE_TMP, "w") as f:
+            f.write(status_content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(STATUS_FILE_TMP, STATUS_FILE)
+    except Exception as e:
+        logger.error(f"Error writing status file: {e}")
 
 def update_status(device_id, status_data):
     with status_lock:
+        previous = (global_statuses.get(device_id) or {}).get("status")
         global_statuses[device_id] = status_data
+        # A transition is a change of state, not of a counter like "No IP (3)"
+        state = STATE_COUNTER.sub("", status_data.get("status") or "")
+        if previous is None or state != STATE_COUNTER.sub("", previous):
+            emit_event("status", device_id, **{"from": previous, "to": status_data.get("status"),
+                                                "ip": status_data.get("current_ip")})
         global_statuses[device_id]["last_update"] = int(time.time())
         
         # Include metrics
         if device_id in global_metrics:
             global_statuses[device_id]["metrics"] = global_metrics[device_id]
-        
+
+        # Include breaker state
+        if device_id in health_registry:
+            global_statuses[device_id]["health"] = health_registry[device_id].snapshot()
+
+        # Include scheduling info
+        if device_id in poll_scheduler.offsets:
+            with runtime_lock:
+                rt = global_runtime.get(device_id, {})
+                global_statuses[device_id]["schedule"] = {
+                    "interval": poll_scheduler.intervals.get(device_id),
+                    "offset": round(poll_scheduler.offsets[device_id], 2),
+                    "lag": round(rt.get("loop_lag", 0.0), 3),
+                    "deferred": rt.get("deferred_polls", 0),
+                    "cadence": rt.get("cadence"),
+                    "mode": rt.get("cadence_mode")
+                }
+
+        # Skip the rewrite if only the timestamp and loop lag moved
+        status = global_statuses[device_id]
+        fingerprint = (
+            {k: v for k, v in status.items() if k not in ("last_update", "metrics", "schedule")},
+            metrics_version,
+            {k: v for k, v in (status.get("schedule") or {}).items() if k != "lag"}
+        )
+        if status_fingerprints.get(device_id) == fingerprint and time.time() - status_written_at < STATUS_REFRESH:
+            return
+        status_fingerprints[device_id] = fingerprint
+        write_status_file()
+
+def publish_health(device_id):
+    """Refresh only the breaker state of a device in the status file."""
+    with status_lock:
+        if device_id not in global_statuses or device_id not in health_registry:
+            return
+        global_statuses[device_id]["health"] = health_registry[device_id].snapshot()
+        global_statuses[device_id]["last_update"] = int(time.time())
+        write_status_file()
+
+def has_viewer(device_id, now=None):
+    """True if a LuCI page showed this device within VIEWER_TTL seconds."""
+    now = time.time() if now is None else now
+    for name in (device_id, ".all"):
         try:
-            status_content = json.dumps({"devices": global_statuses}, indent=2)
-            with open(STATUS_FILE_TMP, "w") as f:
-                f.write(status_content)
-                f.flush()
-                os.fsync(f.fileno())
-            os.replace(STATUS_FILE_TMP, STATUS_FILE)
-        except Exception as e:
-            logger.error(f"Error writing status file: {e}")
+            if now - os.stat(os.path.join(VIEWER_DIR, name)).st_mtime < VIEWER_TTL:
+                return True
+        except OSError:
+            continue
+    return False
+
+def read_loadavg():
+    """1-minute load average, or None if unavailable."""
+    try:
+        with open("/proc/loadavg") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def update_runtime(device_id, **fields):
+    """Update in-memory runtime state (never written to disk)."""
+    with runtime_lock:
+        global_runtime.setdefault(device_id, {}).update(fields)
+
+def record_poll(device_id, duration, data):
+    """Record poll latency and keep the latest dashboard snapshot in memory."""
+    with runtime_lock:
+        rt = global_runtime.setdefault(device_id, {})
+        rt["poll_count"] = rt.get("poll_count", 0) + 1
+        rt["poll_seconds_sum"] = rt.get("poll_seconds_sum", 0.0) + duration
+        rt["last_poll_duration"] = duration
+        rt["last_poll"] = time.time()
+        rt["up"] = data is not None
+        if data is None:
+            rt["poll_failures"] = rt.get("poll_failures", 0) + 1
+        else:
+            rt["data"] = data
+            rt["data_at"] = rt["last_poll"]
+
+def merge_snapshot(device_id, data):
+    """Fill sections this poll did not fetch from the previous snapshot."""
+    with runtime_lock:
+        previous = (global_runtime.get(device_id) or {}).get("data") or {}
+    for key in INFO_SECTIONS:
+        if key not in data and previous.get(key):
+            data[key] = previous[key]
+    return data
 
 def uci_get(section, option, default=None):
     try:
@@ -297,9 +641,12 @@ def uci_get_list(section, option):
         if result.returncode == 0:
             for line in result.stdout.strip().split('\n'):
                 if '=' in line:
-                    # format: package.section.option='value'
-                    val = line.split('=', 1)[1].strip("'\"")
-                    if val: items.append(val)
+                    # format: package.section.option='value1' 'value2'
+                    try:
+                        values = shlex.split(line.split('=', 1)[1])
+                    except ValueError:
+                        values = [line.split('=', 1)[1].strip("'\"")]
+                    items.extend(val for val in values if val)
             return items
     except Exception as e:
         logger.error(f"UCI get list error: {e}")
@@ -307,22 +654,75 @@ def uci_get_list(section, option):
 
 def get_device_sections():
     sections = []
+    types = {}
     try:
         result = subprocess.run(
             ["uci", "show", UCI_PACKAGE],
             capture_output=True, text=True
         )
         if result.returncode == 0:
-            for line in result.stdout.split('\n'):
+            lines = result.stdout.split('\n')
+            # 'package.section=type' lines come before the section's options
+            for line in lines:
+                key, _, value = line.partition('=')
+                if key.count('.') == 1:
+                    types[key.split('.')[1]] = value.strip("'")
+            for line in lines:
                 if '.name=' in line or '=device' in line:
                     parts = line.split('=')[0]
                     section = parts.split('.')[1] if '.' in parts else None
+                    # Other named sections (SMS rules) are not devices
+                    if types.get(section, 'device') != 'device':
+                        continue
                     if section and section not in sections and section != 'globals':
                         sections.append(section)
     except Exception as e:
         logger.error(f"Error getting device sections: {e}")
     return sections
 
+def load_sms_rules():
+    """Enabled 'sms_rule' sections, in config order."""
+    if sms_rules is None:
+        return []
+    try:
+        result = subprocess.run(["uci", "-q", "show", UCI_PACKAGE], capture_output=True, text=True)
+    except Exception as e:
+        logger.error(f"Error reading SMS rules: {e}")
+        return []
+    order, options = [], {}
+    for line in result.stdout.split('\n'):
+        key, _, value = line.partition('=')
+        parts = key.split('.')
+        if len(parts) == 2 and value == 'sms_rule':
+            order.append(parts[1])
+            options[parts[1]] = {}
+        elif len(parts) == 3 and parts[1] in options:
+            try:
+                options[parts[1]][parts[2]] = shlex.split(value)
+            except ValueError:
+                options[parts[1]][parts[2]] = [value.strip("'\"")]
+
+    rules = []
+    for section in order:
+        opts = options[section]
+        first = lambda name, default="": (opts.get(name) or [default])[0]
+        if first('enabled', '1') in ('0', 'false', 'off', 'no'):
+            continue
+        # LuCI stores the actions as one space-separated option, the config example as a list
+        actions = [a for value in opts.get('action') or [] for a in value.split()]
+        try:
+            rule = sms_rules.SmsRule(first('name', section), first('sender'), first('match'),
+                                     actions, first('tag'), opts.get('device'),
+                                     stop=first('stop', '0') == '1')
+        except re.error as e:
+            logger.warning(f"SMS rule {section}: invalid match pattern: {e}")
+            continue
+        if not rule.actions:
+            logger.warning(f"SMS rule {rule.name} has no valid action, ignored")
+            continue
+        rules.append(rule)
+    return rules
+
 def check_prefix(ip, prefixes):
     """Check if IP matches target prefixes with verbose logging."""
     if not ip: return False
@@ -387,7 +787,7 @@ def check_prefix(ip, prefixes):
             logger.warning(f"Error checking prefix '{prefix}': {e}")
             continue
 
-    logger.info(f"MISMATCH: {ip} not found in {prefixes}")
+    logger.debug(f"MISMATCH: {ip} not found in {prefixes}")
     return False
 
 def send_telegram(bot_token, chat_id, message, initial_delay=0):
@@ -412,7 +812,8 @@ def send_telegram(bot_token, chat_id, message, initial_delay=0):
         if initial_delay > 0:
             time.sleep(initial_delay)
         
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        api = os.environ.get("HUAWEI_MANAGER_TELEGRAM_API") or "https://api.telegram.org"
+        url = f"{api}/bot{bot_token}/sendMessage"
         data = urllib.parse.urlencode({
             'chat_id': chat_id,
             'text': message,
@@ -432,6 +833,662 @@ def send_telegram(bot_token, chat_id, message, initial_delay=0):
         logger.error(f"Fallback Telegram send failed: {e}")
         return False
 
+def queue_notification(device_name, bot_token, chat_id, message, initial_delay=0, device_id=None, kind=None):
+    """Queue a Telegram notification so monitor threads never block on it."""
+    notification_q.put({
+        "name": device_name,
+        "bot_token": bot_token,
+        "chat_id": chat_id,
+        "message": message,
+        "initial_delay": initial_delay,
+        "device_id": device_id,
+        "kind": kind,
+        "queued_at": time.time()
+    })
+
+def notification_worker():
+    """Deliver queued Telegram notifications one at a time."""
+    while not shutdown_event.is_set():
+        try:
+            item = notification_q.get(timeout=1)
+        except queue.Empty:
+            continue
+        sent = False
+        try:
+            sent = send_telegram(item["bot_token"], item["chat_id"], item["message"],
+                                 initial_delay=item["initial_delay"])
+            if sent:
+                logger.info(f"[{item['name']}] Telegram notification sent")
+            else:
+                logger.warning(f"[{item['name']}] Failed to send Telegram notification")
+        except Exception as e:
+            logger.error(f"[{item['name']}] Notification error: {e}")
+        finally:
+            emit_event("notification", item.get("device_id"), kind=item.get("kind"), ok=bool(sent),
+                       seconds=round(time.time() - item.get("queued_at", time.time()), 1))
+            notification_q.task_done()
+
+# ===== SMS Rules =====
+
+def check_sms(monitor, sms_count):
+    """Queue an inbox check when the modem's message counts moved."""
+    with sms_lock:
+        # While a check is pending its listing may predate these counts:
+        # leave them unconsumed so the next poll queues another check
+        if monitor.section_id in sms_pending:
+            return
+        if not sms_state.counts_changed(monitor.section_id, sms_count):
+            return
+        sms_pending.add(monitor.section_id)
+    sms_outbox.put(monitor)
+
+def run_modem_api(monitor, args, timeout=60, source="sms_rules"):
+    """modem_api.py output for a monitor's modem, or None on failure."""
+    cmd = ["python3", f"{SCRIPT_DIR}/modem_api.py", monitor.url,
+           "--username", monitor.username, "--password", monitor.password,
+           "--source", source] + args
+    if monitor.config.get('session_cache') == '1':
+        cmd.append("--session-cache")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        logger.warning(f"[{monitor.name}] modem_api {args[:2]} failed: {e}")
+        return None
+
+def process_sms(monitor):
+    """List the inbox, apply the rules to new messages and run their actions."""
+    device_id = monitor.section_id
+    rules = [r for r in sms_rule_list if r.applies_to(device_id)]
+    listing = run_modem_api(monitor, ["--action", "sms_list", "--refresh",
+                                      "--data", json.dumps({"count": SMS_LIST_COUNT})])
+    if not listing or not listing.get("success"):
+        with sms_lock:
+            # Counts unchanged next time would hide these messages: check again
+            sms_state.device(device_id)["counts"] = None
+        logger.warning(f"[{monitor.name}] SMS list failed: {(listing or {}).get('error')}")
+        return
+
+    with sms_lock:
+        new = sms_state.new_messages(device_id, sms_rules.parse_messages(listing.get("data")))
+        planned = [(m, sms_rules.plan(m, rules, device_id)) for m in new]
+        planned = [(m, actions) for m, actions in planned if actions]
+        for message, actions in planned:
+            deleted = any(action == "delete" for action, _rule in actions)
+            for action, rule in actions:
+                if action == "tag" and not deleted:
+                    sms_state.add_tag(device_id, message["index"], rule.tag)
+        sms_state.save()
+    if not planned:
+        return
+
+    bot_token = monitor.config.get('telegram_bot_token', '')
+    chat_id = monitor.config.get('telegram_chat_id', '')
+    for message, actions in planned:
+        logger.info(f"[{monitor.name}] SMS {message['index']} from {message['phone']}: "
+                    f"{', '.join(sorted({f'{a}({r.name})' for a, r in actions}))}")
+        if any(action == "forward" for action, _rule in actions):
+            if bot_token and chat_id:
+                queue_notification(monitor.name, bot_token, chat_id,
+                                   sms_rules.format_forward(monitor.name, message),
+                                   device_id=device_id, kind="sms_forward")
+            else:
+                logger.warning(f"[{monitor.name}] SMS forward rule matched but Telegram is not configured")
+
+    # Reads and deletes in one login; each step is independent
+    steps = sms_rules.modem_steps(planned)
+    if steps:
+        result = run_modem_api(monitor, ["--batch", json.dumps(steps), "--keep-going"], timeout=120)
+        failed = [s for s in ((result or {}).get("data") or {}).get("steps", []) if not s.get("success")]
+        if not result or failed:
+            logger.warning(f"[{monitor.name}] {len(failed) or len(steps)} of {len(steps)} SMS actions failed")
+        with sms_lock:
+            for message, actions in planned:
+                if any(action == "delete" for action, _rule in actions):
+                    sms_state.forget(device_id, message["index"])
+            sms_state.save()
+
+def sms_worker():
+    """Run queued inbox checks one at a time, apart from the monitors."""
+    while not shutdown_event.is_set():
+        try:
+            monitor = sms_outbox.get(timeout=1)
+        except queue.Empty:
+            continue
+        try:
+            process_sms(monitor)
+        except Exception as e:
+            logger.error(f"[{monitor.name}] SMS rules error: {e}")
+        finally:
+            with sms_lock:
+                sms_pending.discard(monitor.section_id)
+            sms_outbox.task_done()
+
+def api_sms_rules(query):
+    """Configured SMS rules with hit counts, and per-device tags of processed messages."""
+    device_id = (query.get("device") or [""])[0]
+    with sms_lock:
+        devices = {d: {"tags": dict(state.get("tags") or {}), "counts": state.get("counts"),
+                       "pending": d in sms_pending}
+                   for d, state in (sms_state.devices if sms_state else {}).items()
+                   if not device_id or d == device_id}
+        rules = [r.to_dict() for r in sms_rule_list if not device_id or r.applies_to(device_id)]
+    return 200, "application/json", json.dumps({"success": True, "rules": rules, "devices": devices})
+
+# ===== OpenMetrics Exporter =====
+
+def render_openmetrics():
+    """Render OpenMetrics exposition from in-memory state only."""
+    with status_lock:
+        statuses = {k: dict(v) for k, v in global_statuses.items()}
+    with metrics_lock:
+        metrics = {k: dict(v) for k, v in global_metrics.items()}
+    with runtime_lock:
+        runtime = {k: dict(v) for k, v in global_runtime.items()}
+    health = {k: v.snapshot() for k, v in list(health_registry.items())}
+
+    exp = openmetrics.Exposition()
+    num = openmetrics.parse_number
+
+    for device_id in sorted(set(statuses) | set(runtime)):
+        st = statuses.get(device_id, {})
+        rt = runtime.get(device_id, {})
+        m = metrics.get(device_id, {})
+        labels = {"device": device_id, "name": st.get("name") or m.get("name") or device_id}
+        data = rt.get("data") or {}
+        signal_data = data.get("signal") or {}
+        traffic = data.get("traffic") or {}
+        month = data.get("month_stats") or {}
+        usage = data.get("usage") or {}
+
+        exp.gauge("huawei_up", "Last modem poll succeeded", 1 if rt.get("up") else 0, labels)
+        exp.gauge("huawei_target_connected", "Current IP matches a target prefix",
+                  1 if st.get("status") == "Connected (Target)" else 0, labels)
+
+        exp.gauge("huawei_signal_rsrp_dbm", "Reference signal received power", num(signal_data.get("rsrp")), labels)
+        exp.gauge("huawei_signal_rsrq_db", "Reference signal received quality", num(signal_data.get("rsrq")), labels)
+        exp.gauge("huawei_signal_sinr_db", "Signal to interference plus noise ratio", num(signal_data.get("sinr")), labels)
+        exp.gauge("huawei_signal_rssi_dbm", "Received signal strength indicator", num(signal_data.get("rssi")), labels)
+
+        exp.counter("huawei_download_bytes", "Downloaded bytes, monotonic across modem counter resets",
+                    usage.get("rx_bytes"), labels)
+        exp.counter("huawei_upload_bytes", "Uploaded bytes, monotonic across modem counter resets",
+                    usage.get("tx_bytes"), labels)
+        exp.counter("huawei_traffic_counter_resets", "Modem traffic counter resets seen",
+                    usage.get("counter_resets"), labels)
+        exp.gauge("huawei_session_download_bytes", "Download in current connection", num(traffic.get("CurrentDownload")), labels)
+        exp.gauge("huawei_session_upload_bytes", "Upload in current connection", num(traffic.get("CurrentUpload")), labels)
+        exp.gauge("huawei_download_rate_bytes_per_second", "Current download rate in bytes per second", num(traffic.get("CurrentDownloadRate")), labels)
+        exp.gauge("huawei_upload_rate_bytes_per_second", "Current upload rate in bytes per second", num(traffic.get("CurrentUploadRate")), labels)
+        exp.gauge("huawei_download_rate_smoothed_bytes_per_second", "Smoothed download rate in bytes per second", usage.get("rate_down"), labels)
+        exp.gauge("huawei_upload_rate_smoothed_bytes_per_second", "Smoothed upload rate in bytes per second", usage.get("rate_up"), labels)
+        exp.gauge("huawei_connect_time_seconds", "Duration of current connection", num(traffic.get("CurrentConnectTime")), labels)
+        exp.gauge("huawei_month_download_bytes", "Download in current month", num(month.get("CurrentMonthDownload")), labels)
+        exp.gauge("huawei_month_upload_bytes", "Upload in current month", num(month.get("CurrentMonthUpload")), labels)
+        exp.gauge("huawei_month_projected_bytes", "Projected total usage at the end of the month",
+                  usage.get("month_projected"), labels)
+
+        exp.counter("huawei_reconnects", "Reconnects triggered by the IP Agent", m.get("total_reconnects", 0), labels)
+        exp.gauge("huawei_reconnects_today", "Reconnects triggered today", m.get("reconnects_today", 0), labels)
+        exp.gauge("huawei_time_to_target_seconds", "Duration of the last hunt until a target IP was found",
+                  m.get("last_time_to_target"), labels)
+
+        exp.summary("huawei_poll_duration_seconds", "Modem poll latency",
+                    rt.get("poll_count", 0), rt.get("poll_seconds_sum", 0.0), labels)
+        exp.counter("huawei_poll_failures", "Failed modem polls", rt.get("poll_failures", 0), labels)
+
+        cache_stats = rt.get("cache_stats") or {}
+        for action, n in sorted((cache_stats.get("hits") or {}).items()):
+            exp.counter("huawei_response_cache_hits", "Modem responses served from the shared cache",
+                        n, dict(labels, action=action))
+        for action, n in sorted((cache_stats.get("misses") or {}).items()):
+            exp.counter("huawei_response_cache_misses", "Shared cache lookups that went to the modem",
+                        n, dict(labels, action=action))
+        exp.gauge("huawei_monitor_loop_lag_seconds", "Delay of the last monitor cycle behind its schedule",
+                  rt.get("loop_lag"), labels)
+        exp.counter("huawei_deferred_polls", "Polls postponed because the request budget was low",
+                    rt.get("deferred_polls", 0), labels)
+        exp.counter("huawei_deferred_reconnects", "Reconnects postponed because the request budget was low",
+                    rt.get("deferred_reconnects", 0), labels)
+
+        hs = health.get(device_id)
+        if hs:
+            for state in ("healthy", "degraded", "open", "half-open"):
+                exp.gauge("huawei_health_state", "Circuit breaker state of the device",
+                          1 if hs["state"] == state else 0, dict(labels, state=state))
+            exp.gauge("huawei_consecutive_failures", "Consecutive failed poll attempts", hs["failures"], labels)
+
+    exp.gauge("huawei_notification_queue_depth", "Notifications waiting to be sent", notification_q.qsize())
+    return exp.render()
+
+# ===== Daemon HTTP API =====
+
+def is_loopback(address):
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+def refresh_info(monitor, sections, background=False):
+    """
+    Fetch info sections of a device outside its poll. Concurrent callers
+    share one fetch; a background refresh is skipped if one is running.
+    """
+    device_id = monitor.section_id
+    wanted = set(sections)
+    while True:
+        with info_flights_lock:
+            flight = info_flights.get(device_id)
+            if flight is None:
+                flight = {"sections": wanted, "done": threading.Event(), "data": None}
+                info_flights[device_id] = flight
+                break
+        if background:
+            return None
+        flight["done"].wait(INFO_FLIGHT_WAIT)
+        if wanted <= flight["sections"]:
+            data = flight["data"]
+            return {k: v for k, v in data.items() if k in wanted} if data is not None else None
+        # That fetch did not cover our sections, lead the next one
+
+    try:
+        data = get_dashboard_data(monitor.url, monitor.username, monitor.password,
+                                  monitor.config.get("session_cache") == "1",
+                                  sections=sorted(wanted), daemon_poll=False)
+        if data:
+            now = time.time()
+            with info_flights_lock:
+                info_refreshed.setdefault(device_id, {}).update(
+                    (k, (now, v)) for k, v in data.items() if v)
+        flight["data"] = data
+        return data
+    finally:
+        with info_flights_lock:
+            info_flights.pop(device_id, None)
+        flight["done"].set()
+
+def api_info(query):
+    """
+    Requested info sections of a device. Served from the last poll when it is
+    fresh and no disruptive operation happened since; the rest is fetched
+    through modem_api.py and its shared response cache.
+    """
+    device_id = (query.get("device") or [""])[0]
+    monitor = monitor_registry.get(device_id)
+    if not monitor:
+        return 404, "application/json", json.dumps({"success": False, "error": "Unknown device"})
+
+    requested = [name for name in (query.get("sections") or [""])[0].split(",") if name]
+    unknown = [name for name in requested if name not in INFO_SECTIONS and name != "usage"]
+    if unknown:
+        return 400, "application/json", json.dumps({"success": False, "error": f"Unknown sections: {', '.join(unknown)}"})
+    requested = requested or INFO_SECTIONS + ["usage"]
+
+    with runtime_lock:
+        rt = global_runtime.get(device_id) or {}
+        snapshot = dict(rt.get("data") or {})
+        polled_at = rt.get("data_at") or 0
+    fresh = time.time() - polled_at < INFO_MAX_AGE and not monitor.lease.disrupted_since(polled_at)
+
+    data = {name: snapshot[name] for name in requested if fresh and snapshot.get(name)}
+
+    # Sections refreshed on demand since the last poll
+    now = time.time()
+    with info_flights_lock:
+        refreshed = dict(info_refreshed.get(device_id) or {})
+    for name in requested:
+        if name not in data and name in refreshed:
+            fetched_at, value = refreshed[name]
+            if now - fetched_at < INFO_MAX_AGE and not monitor.lease.disrupted_since(fetched_at):
+                data[name] = value
+
+    missing = [name for name in requested if name not in data and name in INFO_SECTIONS]
+    stale = False
+    if missing:
+        usable = now - polled_at < INFO_STALE_MAX and not monitor.lease.disrupted_since(polled_at)
+        if usable and all(snapshot.get(name) for name in missing):
+            # Answer from the older snapshot now; one refresh runs in the background
+            data.update((name, snapshot[name]) for name in missing)
+            stale = True
+            threading.Thread(target=refresh_info, args=(monitor, missing, True), daemon=True).start()
+        else:
+            fetched = refresh_info(monitor, missing)
+            if fetched is None:
+                return 502, "application/json", json.dumps({"success": False, "error": "Failed to get modem data"})
+            data.update(fetched)
+    if "usage" in requested and snapshot.get("usage"):
+        data["usage"] = snapshot["usage"]
+
+    return 200, "application/json", json.dumps({
+        "success": True,
+        "data": data,
+        "cached": not missing or stale,
+        "stale": stale,
+        "timestamp": polled_at
+    })
+
+def fleet_summary(device_ids=None, fields=None):
+    """One compact row per device from in-memory state; None values are left out."""
+    with status_lock:
+        statuses = {k: dict(v) for k, v in global_statuses.items()}
+    with metrics_lock:
+        metrics = {k: dict(v) for k, v in global_metrics.items()}
+    with runtime_lock:
+        runtime = {k: dict(v) for k, v in global_runtime.items()}
+    fields = [f for f in FLEET_FIELDS if f in fields] if fields else FLEET_FIELDS
+    num = openmetrics.parse_number if openmetrics else (lambda v: v)
+
+    rows = []
+    for device_id in sorted(set(statuses) | set(runtime)):
+        if device_ids and device_id not in device_ids:
+            continue
+        st = statuses.get(device_id, {})
+        rt = runtime.get(device_id, {})
+        m = metrics.get(device_id, {})
+        data = rt.get("data") or {}
+        signal_data = data.get("signal") or {}
+        usage = data.get("usage") or {}
+        health = health_registry.get(device_id)
+        values = {
+            "name": st.get("name") or m.get("name"),
+            "status": st.get("status"),
+            "ip": st.get("current_ip"),
+            "target": st.get("status") == "Connected (Target)",
+            "up": bool(rt.get("up")),
+            "rsrp": num(signal_data.get("rsrp")),
+            "sinr": num(signal_data.get("sinr")),
+            "band": signal_data.get("band"),
+            "cell": signal_data.get("cell_id"),
+            "rate_down": usage.get("rate_down"),
+            "rate_up": usage.get("rate_up"),
+            "month_total": usage.get("month_total"),
+            "reconnects_today": m.get("reconnects_today"),
+            "reconnects_total": m.get("total_reconnects"),
+            "health": health.snapshot()["state"] if health else None,
+            "polled_at": int(rt["data_at"]) if rt.get("data_at") else None
+        }
+        row = {"id": device_id}
+        row.update((f, values[f]) for f in fields if values[f] is not None)
+        rows.append(row)
+    return rows
+
+def api_fleet(query):
+    """All devices in one response; `fields` and `device` (comma-separated) narrow it."""
+    fields = [f for f in (query.get("fields") or [""])[0].split(",") if f]
+    unknown = [f for f in fields if f not in FLEET_FIELDS]
+    if unknown:
+        return 400, "application/json", json.dumps({"success": False, "error": f"Unknown fields: {', '.join(unknown)}"})
+    device_ids = set(d for d in (query.get("device") or [""])[0].split(",") if d)
+    return 200, "application/json", json.dumps({
+        "success": True,
+        "time": int(time.time()),
+        "devices": fleet_summary(device_ids, fields)
+    }, separators=(",", ":"))
+
+def api_cells(query):
+    """
+    Cell change history of a device. `since` (unix time), `kinds` and `limit`
+    narrow the events; `window` adds IP changes and reconnects with the radio
+    changes around them.
+    """
+    device_id = (query.get("device") or [""])[0]
+    try:
+        since = float(query["since"][0]) if query.get("since") else None
+        limit = int((query.get("limit") or ["100"])[0])
+        window = float(query["window"][0]) if query.get("window") else None
+    except ValueError:
+        return 400, "application/json", json.dumps({"success": False, "error": "Invalid number"})
+    kinds = [k for k in (query.get("kinds") or [""])[0].split(",") if k]
+    unknown = [k for k in kinds if k not in CELL_KINDS + ("reconnect",)]
+    if unknown:
+        return 400, "application/json", json.dumps({"success": False, "error": f"Unknown kinds: {', '.join(unknown)}"})
+    with cells_lock:
+        tracker = global_cells.get(device_id)
+        if tracker is None:
+            return 404, "application/json", json.dumps({"success": False, "error": "No cell history for device"})
+        reply = {
+            "success": True,
+            "current": tracker.snapshot(),
+            "events": tracker.query(since, kinds, max(0, min(limit, 1000)))
+        }
+        if window is not None:
+            reply["correlated"] = tracker.correlate(min(window, 3600) if window > 0 else CORRELATE_WINDOW, since)
+    return 200, "application/json", json.dumps(reply, separators=(",", ":"))
+
+def sweep_bands(band_list):
+    """LTE band numbers a sweep would try, from a bands_list reply."""
+    bands = ((band_list or {}).get("LTEBandList") or {}).get("Band") or []
+    if isinstance(bands, dict):
+        bands = [bands]
+    mask = 0
+    for band in bands:
+        try:
+            value = int(band.get("Value", "0"), 16)
+        except (AttributeError, TypeError, ValueError):
+            continue
+        # The "all bands" entry is not a band
+        if value != 0x7FFFFFFFFFFFFFFF:
+            mask |= value
+    return [bit + 1 for bit in range(64) if mask >> bit & 1]
+
+def build_job(monitor, kind, query):
+    """Command line, progress file and timeout for a job kind. Raises ValueError."""
+    def arg(name, default=""):
+        return (query.get(name) or [default])[0]
+
+    scripts = SCRIPT_DIR
+    modem = [monitor.url, "--username", monitor.username, "--password", monitor.password]
+    if kind == "reconnect":
+        method = monitor.config.get('reconnect_method') or "data"
+        if method not in ("data", "netmode", "reboot", "profile"):
+            method = "data"
+        return (["python3", f"{scripts}/reconnect_dialup.py"] + modem +
+                ["--method", method, "--prefixes", " ".join(monitor.config.get('target_prefixes') or []),
+                 "--source", "luci"]), None, JOB_TIMEOUTS[kind]
+    if kind == "reboot":
+        return (["python3", f"{scripts}/modem_api.py"] + modem + ["--action", "reboot", "--source", "luci"],
+                None, JOB_TIMEOUTS[kind])
+    if kind == "band_sweep":
+        try:
+            window = max(10, min(int(arg("window", "30")), 300))
+        except ValueError:
+            raise ValueError("Invalid window")
+        # Usually answered from the shared cache (bands_list is kept for hours)
+        listing = run_modem_api(monitor, ["--action", "bands_list"], timeout=30, source="luci")
+        bands = sweep_bands((listing or {}).get("data")) if (listing or {}).get("success") else []
+        if not bands:
+            raise ValueError("Could not read the modem's LTE bands")
+        pairs = arg("pairs") == "1"
+        steps = len(bands) + (len(bands) * (len(bands) - 1) // 2 if pairs else 0) + 1
+        max_seconds = steps * (SWEEP_ATTACH_TIMEOUT + window + SWEEP_STEP_SLACK) + SWEEP_SETUP_SECONDS
+        cmd = ["python3", f"{scripts}/band_sweep.py"] + modem + [
+            "--window", str(window), "--attach-timeout", str(SWEEP_ATTACH_TIMEOUT),
+            "--bands", ",".join(str(b) for b in bands), "--max-seconds", str(max_seconds),
+            "--source", "luci"]
+        if pairs:
+            cmd.append("--pairs")
+        if arg("apply") == "restore":
+            cmd += ["--apply", "restore"]
+        return (cmd, os.path.join(SWEEP_PROGRESS_DIR, f"{monitor.key}.json"),
+                max_seconds + SWEEP_APPLY_SECONDS)
+    if kind == "sms_bulk":
+        operation = arg("op")
+        ids = [i for i in arg("ids").split(",") if i]
+        if operation not in ("delete", "read") or not ids or not all(i.isdigit() for i in ids):
+            raise ValueError("sms_bulk needs op=delete|read and numeric ids")
+        steps = [{"action": f"sms_{operation}", "data": {"message_id": i}} for i in ids]
+        cmd = ["python3", f"{scripts}/modem_api.py"] + modem + ["--batch", json.dumps(steps), "--keep-going"]
+        if monitor.config.get("session_cache") == "1":
+            cmd.append("--session-cache")
+        return cmd, None, JOB_TIMEOUTS[kind]
+    raise ValueError(f"Unknown job kind: {kind}")
+
+def api_job_submit(query):
+    """Queue a long-running operation; an identical pending job is reused."""
+    if not job_queue:
+        return 503, "application/json", json.dumps({"success": False, "error": "Job queue not available"})
+    device_id = (query.get("device") or [""])[0]
+    kind = (query.get("kind") or [""])[0]
+    monitor = monitor_registry.get(device_id)
+    if not monitor:
+        return 404, "application/json", json.dumps({"success": False, "error": "Unknown device"})
+    # Reconnects, reboots and sweeps coalesce; every bulk SMS request is its own job
+    job = job_queue.active(device_id, kind) if kind != "sms_bulk" else None
+    if not job:
+        try:
+            cmd, progress_path, timeout = build_job(monitor, kind, query)
+        except ValueError as e:
+            return 400, "application/json", json.dumps({"success": False, "error": str(e)})
+        try:
+            job = job_queue.submit(kind, device_id, cmd, timeout, progress_path)
+        except jobs.QueueFull as e:
+            return 429, "application/json", json.dumps({"success": False, "error": str(e)})
+    return 200, "application/json", json.dumps({"success": True, "job": job.to_dict()})
+
+def api_job(query):
+    """
+    One job with its output after `offset`. With `wait`, blocks until the job
+    moves past `version` (long-poll).
+    """
+    if not job_queue:
+        return 503, "application/json", json.dumps({"success": False, "error": "Job queue not available"})
+    job = job_queue.get((query.get("id") or [""])[0])
+    if not job:
+        return 404, "application/json", json.dumps({"success": False, "error": "Unknown job"})
+    try:
+        wait = max(0, min(int((query.get("wait") or ["0"])[0]), JOB_WAIT_MAX))
+        version = int((query.get("version") or ["-1"])[0])
+        offset = max(0, int((query.get("offset") or ["0"])[0]))
+    except ValueError:
+        return 400, "application/json", json.dumps({"success": False, "error": "Invalid parameters"})
+    state = job_queue.wait(job, version, wait) if wait else job.to_dict()
+    state = dict(state, **{k: v for k, v in job.to_dict(offset).items() if k in ("output", "offset")})
+    return 200, "application/json", json.dumps({"success": True, "job": state})
+
+def api_jobs(query):
+    if not job_queue:
+        return 503, "application/json", json.dumps({"success": False, "error": "Job queue not available"})
+    device_id = (query.get("device") or [None])[0]
+    return 200, "application/json", json.dumps({"success": True, "jobs": job_queue.list(device_id)})
+
+def api_events(query):
+    """
+    Events with a sequence number above `since`, oldest first. `types` and
+    `device` filter, `limit` caps the reply; with `wait`, blocks until a
+    matching event arrives (long-poll). Resume with since=<next> and the
+    `stream` of the last reply.
+    """
+    if not event_log:
+        return 503, "application/json", json.dumps({"success": False, "error": "Event stream not available"})
+    try:
+        since = int((query.get("since") or ["0"])[0])
+        limit = max(1, min(int((query.get("limit") or ["100"])[0]), 1000))
+        wait = max(0, min(int((query.get("wait") or ["0"])[0]), EVENTS_WAIT_MAX))
+    except ValueError:
+        return 400, "application/json", json.dumps({"success": False, "error": "Invalid number"})
+    types = [t for t in (query.get("types") or [""])[0].split(",") if t]
+    unknown = [t for t in types if t not in events.EVENT_TYPES]
+    if unknown:
+        return 400, "application/json", json.dumps({"success": False, "error": f"Unknown types: {', '.join(unknown)}"})
+    device_id = (query.get("device") or [None])[0]
+    stream = (query.get("stream") or [None])[0]
+    reply = event_log.since(since, limit, types, device_id, wait, stream)
+    return 200, "application/json", json.dumps(dict(reply, success=True), separators=(",", ":"))
+
+def api_metrics(query):
+    if openmetrics is None:
+        return 503, "text/plain", "openmetrics module not available\n"
+    return 200, openmetrics.CONTENT_TYPE, render_openmetrics()
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """
+    Small API served from in-memory daemon state. GET routes only read;
+    routes that act on a modem (job submission) accept POST only.
+    """
+    server_version = "huawei-manager"
+    routes = {}
+    post_routes = {}
+    public_paths = {"/metrics"}
+    # Largest form body a POST route accepts
+    max_body = 64 * 1024
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        self._dispatch(self.routes, parsed.path, urllib.parse.parse_qs(parsed.query))
+
+    def do_POST(self):
+        parsed = urllib.parse.urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > self.max_body:
+            self._reply(400, "text/plain", "Bad Request\n")
+            return
+        form = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+        self._dispatch(self.post_routes, parsed.path, urllib.parse.parse_qs(form))
+
+    def _dispatch(self, routes, path, query):
+        path = path.rstrip("/") or "/"
+
+        # Only the exporter is reachable from other hosts
+        if path not in self.public_paths and not is_loopback(self.client_address[0]):
+            self._reply(403, "text/plain", "Forbidden\n")
+            return
+
+        handler = routes.get(path)
+        if not handler:
+            # Known path, other method
+            if path in self.routes or path in self.post_routes:
+                self._reply(405, "text/plain", "Method Not Allowed\n")
+            else:
+                self._reply(404, "text/plain", "Not Found\n")
+            return
+
+        try:
+            code, content_type, body = handler(query)
+        except Exception as e:
+            logger.error(f"API error on {path}: {e}")
+            code, content_type, body = 500, "text/plain", "Internal Error\n"
+        self._reply(code, content_type, body)
+
+    def _reply(self, code, content_type, body):
+        payload = body.encode() if isinstance(body, str) else body
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, fmt, *args):
+        logger.debug(f"API {self.client_address[0]} {fmt % args}")
+
+APIRequestHandler.routes = {
+    "/metrics": api_metrics,
+    "/info": api_info,
+    "/fleet": api_fleet,
+    "/cells": api_cells,
+    "/sms_rules": api_sms_rules,
+    "/events": api_events,
+    "/jobs": api_jobs,
+    "/job": api_job,
+}
+APIRequestHandler.post_routes = {
+    "/jobs/submit": api_job_submit,
+}
+
+def start_api_server(bind, port):
+    """Start the daemon HTTP API in a background thread."""
+    try:
+        server = ThreadingHTTPServer((bind, port), APIRequestHandler)
+    except Exception as e:
+        logger.error(f"Could not start API listener on {bind}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"API listening on {bind}:{port}")
+    return server
+
 class DeviceMonitor(threading.Thread):
     def __init__(self, section_id, config):
         super().__init__(daemon=True)
@@ -441,16 +1498,84 @@ class DeviceMonitor(threading.Thread):
         self.ipagent_enabled = config.get('ipagent_enabled', False)
         self.running = True
         self.stop_event = threading.Event()
-        
+        self.expected_start = None
+        self.health = CircuitBreaker()
+        health_registry[section_id] = self.health
+        self.url = config.get('modem_url', '')
+        self.username = config.get('modem_username', '')
+        self.password = config.get('modem_password', '')
+        cache_url, cache_user, _ = parse_modem_url(self.url, self.username, self.password)
+        self.key = device_key(cache_url, cache_user)
+        self.lease = ModemLease(self.key)
+        monitor_registry[section_id] = self
+
+    def wait(self, seconds):
+        """Sleep until the next cycle and remember when it should start."""
+        self.wait_until(time.time() + seconds)
+
+    def wait_until(self, when):
+        self.expected_start = when
+        self.stop_event.wait(max(0, when - time.time()))
+
+    def cadence(self, interval, idle_interval, load_threshold):
+        """
+        (seconds between polls, mode) right now. Monitoring-only devices slow
+        down to idle_interval while no LuCI page shows them; a hunting IP
+        Agent keeps its interval. A loaded router stretches every cadence.
+        """
+        seconds, mode = interval, "fast"
+        if not self.ipagent_enabled and idle_interval > interval and not has_viewer(self.section_id):
+            seconds, mode = idle_interval, "idle"
+        if load_threshold > 0:
+            load = read_loadavg()
+            if load is not None and load > load_threshold:
+                seconds, mode = seconds * LOAD_BACKOFF, "throttled"
+        return seconds, mode
+
+    def record_failure(self, reason):
+        """Feed a failure to the breaker, logging only state transitions."""
+        if self.health.record_failure(reason):
+            logger.warning(f"[{self.name}] Health {self.health.state}: {reason}, "
+                           f"retry in {self.health.retry_in():.0f}s")
+            publish_health(self.section_id)
+        else:
+            logger.debug(f"[{self.name}] {reason} ({self.health.failures} failures)")
+
     def run(self):
         logger.info(f"[{self.name}] Starting monitor (IP Agent: {self.ipagent_enabled})")
         init_device_metrics(self.section_id, self.name)
         
-        url = self.config.get('modem_url', '')
-        username = self.config.get('modem_username', '')
-        password = self.config.get('modem_password', '')
+        url = self.url
+        username = self.username
+        password = self.password
         interval = int(self.config.get('check_interval', '10') or '10')
+        try:
+            idle_interval = int(self.config.get('idle_interval') or 0)
+        except ValueError:
+            idle_interval = 0
+        try:
+            load_threshold = float(self.config.get('load_threshold') or 0)
+        except ValueError:
+            load_threshold = 0.0
+        last_poll_at = None
         method = self.config.get('reconnect_method', 'data')
+        session_cache = self.config.get('session_cache') == '1'
+        cache_url, cache_user, _ = parse_modem_url(url, username, password)
+        responses = ResponseCache(cache_url, cache_user)
+        budget = RequestBudget(device_key(cache_url, cache_user))
+        lease = self.lease
+        try:
+            budget.configure(int(self.config.get('request_budget') or 30))
+        except ValueError:
+            pass
+        section_intervals = self.config.get('section_intervals') or []
+        if isinstance(section_intervals, str):
+            section_intervals = [section_intervals]
+        # Devices with SMS rules also poll the (cheap) message counts
+        sms_watch = any(rule.applies_to(self.section_id) for rule in sms_rule_list)
+        schedule = SectionSchedule(POLL_SECTIONS + (["sms_count"] if sms_watch else []),
+                                   parse_section_intervals(section_intervals))
+        counter_resets = None
         prefixes = self.config.get('target_prefixes', [])
         
         if isinstance(prefixes, str):
@@ -474,18 +1599,97 @@ class DeviceMonitor(threading.Thread):
         client = None
         connection = None
         
+        # Staggered first poll
+        self.wait_until(poll_scheduler.next_due(self.section_id))
+
         while self.running and not shutdown_event.is_set():
             loop_start = time.time()
+            intended_start = self.expected_start or loop_start
             
             try:
+                # Slower cadence: skip scheduled slots until it is due again.
+                # Slots keep coming at the interval, so a viewer opening
+                # the dashboard speeds polling up within one interval.
+                cadence, mode = self.cadence(interval, idle_interval, load_threshold)
+                update_runtime(self.section_id, cadence=cadence, cadence_mode=mode)
+                if cadence > interval and last_poll_at and loop_start - last_poll_at + interval / 2 < cadence:
+                    self.wait_until(poll_scheduler.next_due(self.section_id, loop_start + interval / 2))
+                    continue
+
+                # Breaker open: no login attempts until the backoff expires
+                if not self.health.allow():
+                    self.wait(self.health.retry_in())
+                    continue
+
+                # After a failure, a TCP connect gates the expensive login
+                if self.health.state != HEALTHY and not probe_host(url):
+                    self.record_failure("modem unreachable")
+                    self.wait(self.health.retry_in())
+                    continue
+
+                # Modem is mid-reconnect (or similar): its state is in flux, don't poll
+                active = lease.current()
+                if active and active.get("operation") in DISRUPTIVE:
+                    update_status(self.section_id, {
+                        "name": self.name,
+                        "status": f"Paused ({active.get('operation')} by {active.get('source', 'unknown')})",
+                        "current_ip": last_ip,
+                        "config": {"target_prefixes": ", ".join(prefixes) if prefixes else "None"}
+                    })
+                    logger.debug(f"[{self.name}] {active.get('operation')} in progress, suspending poll")
+                    lease.wait_idle(timeout=interval)
+                    continue
+
+                # Leave headroom in the modem's budget for manual actions
+                budget_wait = budget.try_acquire(reserve=BUDGET_RESERVE)
+                if budget_wait:
+                    with runtime_lock:
+                        rt = global_runtime.setdefault(self.section_id, {})
+                        rt["deferred_polls"] = rt.get("deferred_polls", 0) + 1
+                    logger.debug(f"[{self.name}] Request budget low, deferring poll {budget_wait:.1f}s")
+                    self.wait(budget_wait)
+                    continue
+
                 # 1. Fetch Dashboard Data (via Subprocess)
-                data = get_dashboard_data(url, username, password)
+                with poll_scheduler.slot():
+                    poll_start = time.time()
+                    last_poll_at = poll_start
+                    update_runtime(self.section_id, loop_lag=max(0.0, poll_start - intended_start))
+                    # Static and slow sections come from the previous snapshot until due
+                    sections = schedule.due(poll_start, slack=interval / 2)
+                    if traffic_needs_anchor(self.section_id):
+                        sections.append("month_stats")
+                    data = get_dashboard_data(url, username, password, session_cache, sections)
+                if data:
+                    schedule.fetched(data, poll_start)
+                    # Not part of the dashboard snapshot
+                    sms_count = data.pop("sms_count", None)
+                    if sms_watch and sms_count:
+                        check_sms(self, sms_count)
+                    usage = record_traffic(self.section_id, data)
+                    # Traffic counters restart when the modem reboots: refetch static info
+                    if counter_resets is not None and usage.get("counter_resets", 0) > counter_resets:
+                        logger.debug(f"[{self.name}] Traffic counter reset, refreshing all sections")
+                        schedule.reset()
+                    counter_resets = usage.get("counter_resets", 0)
+                    data = merge_snapshot(self.section_id, data)
+                    data["usage"] = usage
+                    record_radio(self.section_id, self.name, data, extract_wan_ip(data))
+                record_poll(self.section_id, time.time() - poll_start, data)
+                
+                # Shared cache counters (LuCI and modem_api.py hits/misses)
+                update_runtime(self.section_id, cache_stats=responses.read_stats())
                 
                 if data:
+                    if self.health.record_success():
+                        logger.info(f"[{self.name}] Modem healthy again")
+                        publish_health(self.section_id)
+                        # Unreachable for a while: it may have rebooted or changed firmware
+                        schedule.reset()
                     save_dashboard_status(self.section_id, data)
                 else:
-                    logger.warning(f"[{self.name}] Failed to get dashboard data")
-                    time.sleep(5)
+                    self.record_failure("failed to get dashboard data")
+                    self.wait(self.health.retry_in())
                     continue
 
                 # 3. IP Agent Logic (Only if enabled)
@@ -495,6 +1699,8 @@ class DeviceMonitor(threading.Thread):
                     if current_ip:
                         consecutive_errors = 0
                         
+                        disruption = lease.disrupted_since(poll_start)
+                        
                         # Check if IP matches target
                         if prefixes and check_prefix(current_ip, prefixes):
                             update_status(self.section_id, {
@@ -513,14 +1719,28 @@ class DeviceMonitor(threading.Thread):
                                     if last_ip:
                                         msg += f"\nPrevious: <code>{last_ip}</code>"
                                     
-                                    if send_telegram(telegram_bot_token, telegram_chat_id, msg, initial_delay=5):
-                                        logger.info(f"[{self.name}] Telegram notification sent")
-                                    else:
-                                        logger.warning(f"[{self.name}] Failed to send Telegram notification")
+                                    queue_notification(self.name, telegram_bot_token, telegram_chat_id, msg, initial_delay=5,
+                                                       device_id=self.section_id, kind="target_found")
                             
                             last_ip = current_ip
+                        elif disruption:
+                            # Someone else reconnected after our poll: re-check instead of a second cycle
+                            logger.info(f"[{self.name}] {disruption.get('operation')} by {disruption.get('source')} "
+                                        f"finished, re-checking IP")
+                            self.expected_start = None
+                            continue
                         else:
-                            # Reconnect Logic
+                            # Reconnect Logic. Like polls, it leaves the reserve to
+                            # manual actions: with the budget low, re-check later
+                            budget_wait = budget.try_acquire(reserve=BUDGET_RESERVE)
+                            if budget_wait:
+                                with runtime_lock:
+                                    rt = global_runtime.setdefault(self.section_id, {})
+                                    rt["deferred_reconnects"] = rt.get("deferred_reconnects", 0) + 1
+                                logger.debug(f"[{self.name}] Request budget low, deferring reconnect {budget_wait:.1f}s")
+                                self.wait(budget_wait)
+                                continue
+
                             update_status(self.section_id, {
                                 "name": self.name,
                                 "status": "Reconnecting...",
@@ -534,13 +1754,21 @@ class DeviceMonitor(threading.Thread):
                             # Use subprocess for reconnect action
                             prefixes_str = " ".join(prefixes)
                             reconnect_cmd = [
-                                "python3", "/usr/bin/huawei-manager/reconnect_dialup.py",
+                                "python3", f"{SCRIPT_DIR}/reconnect_dialup.py",
                                 url, "--username", username, "--password", password,
-                                "--method", method, "--prefixes", prefixes_str
+                                "--method", method, "--prefixes", prefixes_str,
+                                "--source", "daemon"
                             ]
                             
                             logger.debug(f"[{self.name}] Executing reconnect: {' '.join(reconnect_cmd)}")
-                            result = subprocess.run(reconnect_cmd, capture_output=True, text=True, timeout=120)
+                            emit_event("reconnect_start", self.section_id, ip=current_ip, method=method)
+                            reconnect_start = time.time()
+                            try:
+                                result = subprocess.run(reconnect_cmd, capture_output=True, text=True, timeout=120)
+                            except subprocess.TimeoutExpired:
+                                emit_event("reconnect_end", self.section_id, result="timeout",
+                                           seconds=round(time.time() - reconnect_start, 1))
+                                raise
                             
                             # Log the output for debugging
                             if result.stdout:
@@ -552,12 +1780,21 @@ class DeviceMonitor(threading.Thread):
                                     
                             if result.returncode != 0:
                                  logger.warning(f"[{self.name}] Reconnect script failed with code {result.returncode}")
+
+                            outcome = lease.last_outcome("reconnect") or {}
+                            if outcome.get("source") not in (None, "daemon"):
+                                logger.info(f"[{self.name}] Reconnect by {outcome.get('source')} ran meanwhile, "
+                                            f"using its outcome")
+                            emit_event("reconnect_end", self.section_id,
+                                       result="ok" if result.returncode == 0 else "failed", code=result.returncode,
+                                       seconds=round(time.time() - reconnect_start, 1),
+                                       source=outcome.get("source") or "daemon")
                             
                             # Wait for modem to stabilize (20s) + interval
                             # This prevents rapid reconnect loops
                             wait_time = 20 + interval
                             logger.debug(f"[{self.name}] Reconnect triggered. Waiting {wait_time}s for stabilization...")
-                            self.stop_event.wait(wait_time)
+                            self.wait(wait_time)
                             continue
                     else:
                         consecutive_errors += 1
@@ -578,26 +1815,30 @@ class DeviceMonitor(threading.Thread):
 
             except Exception as e:
                 logger.error(f"[{self.name}] Unexpected error: {e}")
-                time.sleep(5)
+                self.wait(5)
 
-            # Wait for next interval
-            elapsed = time.time() - loop_start
-            wait_time = max(0, interval - elapsed)
-            time.sleep(wait_time)
+            # Wait for the next staggered slot
+            self.wait_until(poll_scheduler.next_due(self.section_id))
 
         
         logger.info(f"[{self.name}] Monitor stopped")
     
     def stop(self):
         self.running = False
+        self.stop_event.set()
 
 def main():
-    global global_log_level_set
+    global global_log_level_set, poll_scheduler, job_queue, sms_rule_list, sms_state, event_log
     
     logger.info("Huawei Manager daemon starting...")
     
     # Load saved metrics
     load_metrics()
+    load_traffic()
+    load_cells()
+    if events:
+        # Sequence numbers continue from the previous run
+        event_log = events.EventLog(EVENTS_FILE).load()
     
     # Get device sections
     sections = get_device_sections()
@@ -612,7 +1853,52 @@ def main():
         file_handler.setLevel(numeric_level)
     console_handler.setLevel(numeric_level)
     logger.info(f"Log level set to: {log_level}")
+
+    # Monitors only enqueue records; one writer thread dedups, rate-limits and writes
+    log_pipeline = None
+    if logpipe:
+        if file_handler and uci_get("globals", "log_format", "text") == "json":
+            file_handler.setFormatter(logpipe.JsonFormatter())
+        try:
+            log_rate = int(uci_get("globals", "log_rate_limit", "60"))
+        except (TypeError, ValueError):
+            log_rate = 60
+        log_pipeline = logpipe.LogPipeline([file_handler, console_handler], rate=log_rate)
+        log_pipeline.install(logger)
     
+    # Notification delivery runs apart from the monitors
+    threading.Thread(target=notification_worker, daemon=True).start()
+
+    # SMS rules: inbox checks run apart from the monitors too
+    sms_rule_list = load_sms_rules()
+    if sms_rule_list:
+        sms_state = sms_rules.SmsState(SMS_STATE_FILE).load()
+        threading.Thread(target=sms_worker, daemon=True).start()
+        logger.info(f"Loaded {len(sms_rule_list)} SMS rules")
+
+    # Long-running LuCI actions are executed here, not in uhttpd workers
+    if jobs:
+        job_queue = jobs.JobQueue(workers=2, logger=logger)
+        job_queue.start()
+
+    # HTTP API (OpenMetrics exporter)
+    api_bind = uci_get("globals", "api_bind", API_DEFAULT_BIND) or API_DEFAULT_BIND
+    try:
+        api_port = int(uci_get("globals", "api_port", str(API_DEFAULT_PORT)))
+    except (TypeError, ValueError):
+        api_port = API_DEFAULT_PORT
+    api_server = start_api_server(api_bind, api_port) if api_port > 0 else None
+
+    # Global cap on concurrent modem polls
+    try:
+        max_concurrent = int(uci_get("globals", "max_concurrent_polls", "2"))
+    except (TypeError, ValueError):
+        max_concurrent = 2
+    poll_scheduler = PollScheduler(max_concurrent)
+
+    # Above this 1-minute load average every device polls less often (0: never)
+    load_threshold = uci_get("globals", "load_threshold", "0")
+
     monitors = []
     
     for section_id in sections:
@@ -629,7 +1915,12 @@ def main():
             'modem_username': uci_get(section_id, "modem_username", ""),
             'modem_password': uci_get(section_id, "modem_password", ""),
             'check_interval': uci_get(section_id, "check_interval", "10"),
+            'idle_interval': uci_get(section_id, "idle_interval", "60"),
+            'load_threshold': load_threshold,
             'reconnect_method': uci_get(section_id, "reconnect_method", "data"),
+            'session_cache': uci_get(section_id, "session_cache", "0"),
+            'request_budget': uci_get(section_id, "request_budget", "30"),
+            'section_intervals': uci_get_list(section_id, "section_intervals"),
             'target_prefixes': uci_get_list(section_id, "target_prefixes"),
             'telegram_enabled': uci_get(section_id, "telegram_enabled", "0"),
             'telegram_bot_token': uci_get(section_id, "telegram_bot_token", ""),
@@ -653,9 +1944,19 @@ def main():
             logger.info(f"Starting IP Agent monitor for {config['name']} ({section_id})")
             
         monitor = DeviceMonitor(section_id, config)
-        monitor.start()
         monitors.append(monitor)
     
+    # Spread polls across each interval, then start
+    schedule = []
+    for m in monitors:
+        try:
+            schedule.append((m.section_id, int(m.config.get('check_interval') or 10)))
+        except ValueError:
+            schedule.append((m.section_id, 10))
+    poll_scheduler.register(schedule)
+    for m in monitors:
+        m.start()
+    
     if not monitors:
         logger.warning("No enabled devices found, daemon will idle")
     
@@ -680,10 +1981,19 @@ def main():
     # Wait for monitors to stop
     for m in monitors:
         m.join(timeout=5)
+
+    if api_server:
+        api_server.shutdown()
+    if job_queue:
+        job_queue.stop()
     
     # Save final metrics
     save_metrics()
+    with traffic_lock:
+        save_traffic()
     logger.info("Huawei Manager daemon stopped")
+    if log_pipeline:
+        log_pipeline.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Background job queue for Huawei Manager.
+Long-running operations (reconnect, reboot, band sweep, bulk SMS) run as
+subprocesses inside the daemon; LuCI submits them and polls their status
+instead of holding a uhttpd worker for the whole operation.
+"""
+import json
+import time
+import uuid
+import threading
+import subprocess
+from collections import deque
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+MAX_OUTPUT_LINES = 500
+# Seconds a job has after SIGTERM at its timeout to clean up (e.g. restore
+# the band mask) before it is killed
+KILL_GRACE = 30
+
+
+class QueueFull(Exception):
+    """Every kept job is still queued or running; nothing can be evicted."""
+
+
+class Job:
+    def __init__(self, kind, device, cmd, timeout=300, progress_path=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.device = device
+        self.cmd = cmd
+        self.timeout = timeout
+        self.progress_path = progress_path
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.returncode = None
+        self.result = None
+        self.output = []
+        # Number of output lines ever written; clients page with it
+        self.lines = 0
+        # Bumped on every change, long-polls wait for it to move
+        self.version = 0
+
+    def progress(self):
+        if not self.progress_path or self.state != RUNNING:
+            return None
+        try:
+            with open(self.progress_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def to_dict(self, offset=None):
+        """Job description; output lines after `offset` when given."""
+        job = {
+            "id": self.id,
+            "kind": self.kind,
+            "device": self.device,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "returncode": self.returncode,
+            "result": self.result,
+            "progress": self.progress(),
+            "version": self.version,
+            "lines": self.lines
+        }
+        if offset is not None:
+            first = self.lines - len(self.output)
+            job["output"] = self.output[max(0, offset - first):]
+            job["offset"] = max(offset, first)
+        return job
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a few worker threads. Jobs of the same device run
+    one after another; the modem lease inside each script still guards
+    against operations started elsewhere.
+    """
+
+    def __init__(self, workers=2, keep=50, logger=None):
+        self.workers = workers
+        self.logger = logger
+        self._jobs = {}
+        self._order = deque(maxlen=keep)
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._processes = {}
+
+    def start(self):
+        for n in range(self.workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{n}", daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            processes = list(self._processes.values())
+        for process in processes:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+    def submit(self, kind, device, cmd, timeout=300, progress_path=None):
+        """Queue a job. Raises QueueFull if no finished job can make room."""
+        job = Job(kind, device, cmd, timeout, progress_path)
+        with self._cond:
+            if len(self._order) == self._order.maxlen and not self._evict():
+                raise QueueFull(f"{len(self._order)} jobs pending, try again later")
+            self._jobs[job.id] = job
+            self._order.append(job.id)
+            self._cond.notify_all()
+        if self.logger:
+            self.logger.info(f"[{device}] Job {job.id} queued: {kind}")
+        return job
+
+    def _evict(self):
+        """Drop the oldest finished job to make room. False if none finished."""
+        for job_id in list(self._order):
+            if self._jobs[job_id].state in (DONE, FAILED):
+                self._order.remove(job_id)
+                del self._jobs[job_id]
+                return True
+        return False
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list(self, device=None):
+        with self._cond:
+            jobs = [self._jobs[i] for i in self._order]
+            return [j.to_dict() for j in reversed(jobs) if device is None or j.device == device]
+
+    def active(self, device, kind=None):
+        """Queued or running job of a device (and kind), or None."""
+        with self._cond:
+            for job_id in self._order:
+                job = self._jobs[job_id]
+                if job.device == device and job.state in (QUEUED, RUNNING) and kind in (None, job.kind):
+                    return job
+        return None
+
+    def wait(self, job, version, timeout):
+        """Block until the job changed past `version`, finished, or timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while job.version <= version and job.state not in (DONE, FAILED):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job.to_dict()
+
+    def _touch(self, job, **fields):
+        with self._cond:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._cond.notify_all()
+
+    def _next(self):
+        for job_id in self._order:
+            job = self._jobs[job_id]
+            if job.state == QUEUED and job.device not in self._busy:
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None and not self._stopping:
+                    self._cond.wait()
+                    job = self._next()
+                if self._stopping:
+                    return
+                self._busy.add(job.device)
+                job.state = RUNNING
+                job.started_at = time.time()
+                job.version += 1
+                self._cond.notify_all()
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._busy.discard(job.device)
+                    self._processes.pop(job.id, None)
+                    self._cond.notify_all()
+
+    def _append(self, job, line):
+        with self._cond:
+            job.output.append(line)
+            del job.output[:-MAX_OUTPUT_LINES]
+            job.lines += 1
+            job.version += 1
+            self._cond.notify_all()
+
+    def _expire(self, job, process):
+        if self.logger:
+            self.logger.warning(f"[{job.device}] Job {job.id} {job.kind} timed out after {job.timeout}s")
+        try:
+            process.terminate()
+            process.wait(KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        except OSError:
+            pass
+
+    def _run(self, job):
+        try:
+            process = subprocess.Popen(job.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, bufsize=1)
+        except OSError as e:
+            self._touch(job, state=FAILED, finished_at=time.time(), result={"error": str(e)})
+            return
+        with self._cond:
+            self._processes[job.id] = process
+
+        # The timer ends jobs that hang on an unreachable modem: SIGTERM
+        # first so scripts can undo their changes, SIGKILL after the grace
+        timer = threading.Timer(job.timeout, self._expire, (job, process))
+        timer.start()
+        last = None
+        try:
+            for line in process.stdout:
+                line = line.rstrip("\n")
+                self._append(job, line)
+                last = line
+            process.wait()
+        finally:
+            timer.cancel()
+
+        # Scripts that answer with a JSON envelope report it as the result
+        result = None
+        if last and last.startswith("{"):
+            try:
+                result = json.loads(last)
+            except ValueError:
+                pass
+        ok = process.returncode == 0 and not (isinstance(result, dict) and result.get("success") is False)
+        self._touch(job, state=DONE if ok else FAILED, finished_at=time.time(),
+                    returncode=process.returncode, result=result)
+        if self.logger:
+            self.logger.info(f"[{job.device}] Job {job.id} {job.kind} {job.state} (rc={process.returncode})")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Log query CLI for Huawei Manager.
+Searches the current and rotated log files by level, device, time range and
+substring, newest first, with cursor based paging. Returns JSON.
+
+A sidecar index keeps, per log file, the byte offset of every time bucket
+with its per-level counts and device tags, so queries only read buckets
+that can match. Files are identified by inode, which survives rotation.
+"""
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+from argparse import ArgumentParser
+
+LOG_FILES = ["/var/log/huawei-manager.log", "/tmp/huawei-manager.log"]
+BACKUP_COUNT = 3
+INDEX_FILE = "/tmp/huawei-manager-logindex.json"
+BUCKET_SECONDS = 300
+DEFAULT_LIMIT = 100
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+TEXT_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[,.](\d{3}) - (\w+) - (.*)$")
+DEVICE_TAG = re.compile(r"^\[([^\]]+)\]")
+
+
+def json_response(success, **fields):
+    """Output JSON response and exit."""
+    print(json.dumps(dict(fields, success=success)))
+    sys.exit(0 if success else 1)
+
+
+def parse_record(line):
+    """Return (time, level, message) for a record header line, or None."""
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            return float(entry["time"]), entry.get("level", "INFO"), entry.get("msg", "")
+        except (ValueError, KeyError, TypeError):
+            return None
+    match = TEXT_LINE.match(line)
+    if not match:
+        return None
+    stamp = time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"))
+    return stamp + int(match.group(2)) / 1000.0, match.group(3), match.group(4)
+
+
+def log_files(base=None):
+    """Current log file followed by its rotated backups, newest first."""
+    if not base:
+        base = next((p for p in LOG_FILES if os.path.exists(p)), LOG_FILES[0])
+    files = [base] + [f"{base}.{n}" for n in range(1, BACKUP_COUNT + 1)]
+    return [p for p in files if os.path.exists(p)]
+
+
+class LogIndex:
+    """Offsets of time buckets per log file inode, extended incrementally."""
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.entries = {}
+
+    def __enter__(self):
+        self._lock = open(f"{self.path}.lock", "w")
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+        self._lock.close()
+
+    def prune(self, inodes):
+        for key in list(self.entries):
+            if key not in inodes:
+                del self.entries[key]
+
+    def update(self, path):
+        """Index new data of a file and return its entry."""
+        st = os.stat(path)
+        key = str(st.st_ino)
+        entry = self.entries.get(key)
+        if not entry or st.st_size < entry["scanned"]:
+            # New file, or truncated by "Clear logs"
+            entry = {"scanned": 0, "buckets": []}
+        self.entries[key] = entry
+        if st.st_size == entry["scanned"]:
+            return key, entry
+
+        buckets = entry["buckets"]
+        with open(path, "rb") as f:
+            f.seek(entry["scanned"])
+            offset = entry["scanned"]
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Partial line being written, index it next time
+                record = parse_record(raw.decode("utf-8", "replace").rstrip("\n"))
+                if record:
+                    stamp, level, message = record
+                    start = int(stamp // BUCKET_SECONDS * BUCKET_SECONDS)
+                    if not buckets or buckets[-1]["t"] != start:
+                        buckets.append({"t": start, "offset": offset, "counts": {}})
+                    # Level counts per device tag ("" for untagged lines)
+                    tag = DEVICE_TAG.match(message)
+                    levels = buckets[-1]["counts"].setdefault(tag.group(1) if tag else "", {})
+                    levels[level] = levels.get(level, 0) + 1
+                offset += len(raw)
+            entry["scanned"] = offset
+        return key, entry
+
+
+def bucket_levels(bucket, min_level, device, since, until):
+    """Counts of matching levels in a bucket; empty if it cannot match."""
+    if until is not None and bucket["t"] > until:
+        return {}
+    if since is not None and bucket["t"] + BUCKET_SECONDS < since:
+        return {}
+    found = {}
+    for tag, levels in bucket["counts"].items():
+        if device and tag != device:
+            continue
+        for level, n in levels.items():
+            if LEVELS.get(level, 20) >= min_level:
+                found[level] = found.get(level, 0) + n
+    return found
+
+
+def read_records(path, start, end):
+    """Records in [start, end) of a file as (offset, time, level, message)."""
+    records = []
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    offset = start
+    for raw in data.splitlines(keepends=True):
+        line = raw.decode("utf-8", "replace").rstrip("\n")
+        record = parse_record(line)
+        if record:
+            records.append([offset] + list(record))
+        elif records and line:
+            # Continuation line (traceback) of the previous record
+            records[-1][3] += "\n" + line
+        offset += len(raw)
+    return records
+
+
+def query(min_level=0, device=None, since=None, until=None, text=None,
+          limit=DEFAULT_LIMIT, cursor=None, base=None):
+    """
+    Matching records, newest first. `cursor` ("<inode>:<offset>") continues
+    with records older than the last page.
+    """
+    files = log_files(base)
+    entries = []
+    counts = {}
+    cursor_inode, cursor_offset = (cursor.split(":", 1) + [None])[:2] if cursor else (None, None)
+    started = cursor_inode is None
+    needle = text.lower() if text else None
+
+    with LogIndex() as index:
+        indexed = [(path,) + index.update(path) for path in files]
+        index.prune({key for _path, key, _entry in indexed})
+
+    # Totals per level come from the index alone (time is bucket-granular)
+    for path, key, entry in indexed:
+        for bucket in entry["buckets"]:
+            for level, n in bucket_levels(bucket, min_level, device, since, until).items():
+                counts[level] = counts.get(level, 0) + n
+
+    for path, key, entry in indexed:
+        if not started:
+            if key != cursor_inode:
+                continue
+            started = True
+            end_limit = int(cursor_offset)
+        else:
+            end_limit = entry["scanned"]
+
+        buckets = entry["buckets"]
+        for i in range(len(buckets) - 1, -1, -1):
+            bucket = buckets[i]
+            if bucket["offset"] >= end_limit:
+                continue
+            if not bucket_levels(bucket, min_level, device, since, until):
+                continue
+            end = buckets[i + 1]["offset"] if i + 1 < len(buckets) else entry["scanned"]
+            for offset, stamp, level, message in reversed(read_records(path, bucket["offset"], min(end, end_limit))):
+                if LEVELS.get(level, 20) < min_level:
+                    continue
+                if since is not None and stamp < since or until is not None and stamp > until:
+                    continue
+                tag = DEVICE_TAG.match(message)
+                if device and (not tag or tag.group(1) != device):
+                    continue
+                if needle and needle not in message.lower():
+                    continue
+                entries.append({
+                    "time": stamp,
+                    "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stamp)),
+                    "level": level,
+                    "device": tag.group(1) if tag else None,
+                    "message": message
+                })
+                if len(entries) >= limit:
+                    return entries, f"{key}:{offset}", counts
+    return entries, None, counts
+
+
+def main():
+    parser = ArgumentParser(description="Query Huawei Manager logs")
+    parser.add_argument("--level", type=str, default="all",
+                        help="Minimum level: debug, info, warning, error (default: all)")
+    parser.add_argument("--device", type=str, default="", help="Device name as shown in [name] tags")
+    parser.add_argument("--since", type=float, default=None, help="Unix time, inclusive")
+    parser.add_argument("--until", type=float, default=None, help="Unix time, inclusive")
+    parser.add_argument("--text", type=str, default="", help="Case-insensitive substring")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--cursor", type=str, default="", help="Value of 'next' from the previous page")
+    parser.add_argument("--log-file", type=str, default="", help="Log file (default: auto-detect)")
+    args = parser.parse_args()
+
+    min_level = LEVELS.get(args.level.upper(), 0)
+    if args.cursor and not re.match(r"^\d+:\d+$", args.cursor):
+        json_response(False, error="Invalid cursor")
+    try:
+        entries, next_cursor, counts = query(min_level, args.device or None, args.since, args.until,
+                                             args.text or None, max(1, min(args.limit, 1000)),
+                                             args.cursor or None, args.log_file or None)
+    except OSError as e:
+        json_response(False, error=str(e))
+        return
+    json_response(True, entries=entries, next=next_cursor, counts=counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Asynchronous logging pipeline for Huawei Manager.
+Monitor threads only enqueue records; a single writer thread collapses
+repeated messages, rate-limits chatty sources and writes to the handlers.
+"""
+import re
+import json
+import time
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler
+
+DEVICE_TAG = re.compile(r"^\[([^\]]+)\]")
+
+# Records below this level may be rate-limited; warnings and errors never are
+RATE_LIMITED_BELOW = logging.WARNING
+
+
+def device_tag(message):
+    """Device name from a '[name] ...' message, or None."""
+    match = DEVICE_TAG.match(message or "")
+    return match.group(1) if match else None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, time, level, logger, device, msg."""
+
+    def format(self, record):
+        message = record.getMessage()
+        entry = {
+            "ts": self.formatTime(record),
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": message
+        }
+        tag = device_tag(message)
+        if tag:
+            entry["device"] = tag
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller; counts records lost to a full queue."""
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.pipeline.dropped += 1
+
+
+class LogPipeline:
+    """
+    Background writer for a logger.
+
+    Repeats of the same message are collapsed into one "last message
+    repeated N times" line. Each (logger, device tag) pair gets a token
+    bucket of `rate` records per minute; suppressed records are summarized
+    once the source is allowed to log again.
+    """
+
+    _STOP = object()
+
+    def __init__(self, handlers, rate=60, burst=None, flush_interval=30, maxsize=10000):
+        self.handlers = [h for h in handlers if h]
+        self.rate = rate
+        self.burst = burst or max(1, rate // 2)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._last = None
+        self._last_key = None
+        self._repeats = 0
+        self._repeat_since = 0
+        self._buckets = {}
+        self._suppressed = {}
+        self._templates = {}
+        self._thread = None
+        self._logger = None
+        self._queue_handler = None
+
+    def install(self, logger):
+        """Route the logger through the queue instead of its own handlers."""
+        for handler in self.handlers:
+            logger.removeHandler(handler)
+        self._queue_handler = _DroppingQueueHandler(self)
+        logger.addHandler(self._queue_handler)
+        self._logger = logger
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Flush pending summaries and restore synchronous logging."""
+        if not self._thread:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(timeout)
+        self._logger.removeHandler(self._queue_handler)
+        for handler in self.handlers:
+            self._logger.addHandler(handler)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                self._flush(time.time(), idle=True)
+                continue
+            if record is self._STOP:
+                self._flush(time.time())
+                return
+            self._process(record)
+
+    def _emit(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+
+    def _summary(self, template, text):
+        record = logging.makeLogRecord(template.__dict__)
+        record.msg = text
+        record.args = None
+        record.exc_info = None
+        record.created = time.time()
+        record.msecs = (record.created % 1) * 1000
+        return record
+
+    def _flush_repeats(self):
+        if self._repeats:
+            self._emit(self._summary(self._last, f"last message repeated {self._repeats} times"))
+            self._repeats = 0
+
+    def _flush(self, now, idle=False):
+        """Emit pending summaries; when idle only those older than flush_interval."""
+        if not idle or now - self._repeat_since >= self.flush_interval:
+            self._flush_repeats()
+        for source in list(self._suppressed):
+            if not idle or now - self._templates[source].created >= self.flush_interval:
+                self._report_suppressed(source)
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            record = logging.makeLogRecord({"name": "huawei-manager.log", "levelno": logging.WARNING,
+                                            "levelname": "WARNING"})
+            self._emit(self._summary(record, f"{dropped} log records dropped, queue full"))
+
+    def _report_suppressed(self, source):
+        count = self._suppressed.pop(source)
+        tag = source[1]
+        prefix = f"[{tag}] " if tag else ""
+        self._emit(self._summary(self._templates.pop(source), f"{prefix}{count} messages suppressed by rate limit"))
+
+    def _allow(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate / 60.0)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def _process(self, record):
+        message = record.getMessage()
+        key = (record.name, record.levelno, message)
+
+        # Collapse exact repeats
+        if key == self._last_key:
+            if not self._repeats:
+                self._repeat_since = record.created
+            self._repeats += 1
+            if record.created - self._repeat_since >= self.flush_interval:
+                self._flush_repeats()
+            return
+        self._flush_repeats()
+
+        # Per-source rate limit for chatty low-level messages
+        source = (record.name, device_tag(message))
+        if self.rate and record.levelno < RATE_LIMITED_BELOW and not self._allow(source, record.created):
+            self._suppressed[source] = self._suppressed.get(source, 0) + 1
+            self._templates[source] = record
+            return
+        if source in self._suppressed:
+            self._report_suppressed(source)
+        self._last, self._last_key = record, key
+        self._emit(record)
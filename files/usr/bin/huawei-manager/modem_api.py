@@ -4,92 +4,97 @@ Modem API CLI for Huawei Manager.
 This script is called by the LuCI controller to interact with the modem.
 Returns JSON responses.
 """
+import os
 import sys
 import json
+import time
+import threading
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from huawei_lte_api.Client import Client
 from huawei_lte_api.AuthorizedConnection import AuthorizedConnection
-import requests
 import urllib3
-from urllib.parse import urlparse
+from response_cache import ResponseCache, SingleFlight, is_read_action, entry_name, device_key
+from scheduler import RequestBudget
+from arbiter import ModemLease, ModemBusyError, DISRUPTIVE
+from utils import parse_modem_url
+from transport import new_session
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def json_response(success, data=None, error=None):
+# Seconds a write waits for a running reconnect or write on the same modem
+LEASE_WAIT = 30
+
+ACTIONS = ["info", "reboot", "toggle_data", "bands", "bands_list",
+           "apn_list", "apn_create", "apn_delete", "apn_default",
+           "sms_list", "sms_send", "sms_delete", "sms_read", "sms_count"]
+MAX_BATCH_STEPS = 20
+# Reads that are plain GETs; POST reads consume CSRF tokens and stay sequential
+PARALLEL_READS = ("info", "bands", "bands_list", "apn_list", "sms_count")
+PARALLEL_WORKERS = 3
+# Seconds to wait for another process' refresh of the same info
+FLIGHT_WAIT = 35
+# Oldest cached info served with --stale-ok while a refresh runs
+STALE_MAX_AGE = 300
+# Shortest --interval of the watch action
+WATCH_MIN_INTERVAL = 1
+
+def json_response(success, data=None, error=None, stale=False):
     """Output JSON response and exit."""
     result = {"success": success}
     if data is not None:
         result["data"] = data
     if error is not None:
         result["error"] = error
+    if stale:
+        result["stale"] = True
     print(json.dumps(result))
     sys.exit(0 if success else 1)
 
-def get_client(url, username, password):
+def get_client(url, username, password, session_cache=None):
     """Create and return a modem client connection."""
-    # HTTPS conversion for specific modems
-    if url.startswith('http://') and '192.168.7.1' in url:
-        url = url.replace('http://', 'https://')
-    
-    session = requests.Session()
-    session.verify = False
+    # Batches run up to PARALLEL_WORKERS reads at once over this session
+    session = new_session(pool_size=PARALLEL_WORKERS)
     
-    connection = AuthorizedConnection(url, username=username, password=password, requests_session=session)
+    if session_cache:
+        connection = session_cache.connect(password, session)
+    else:
+        connection = AuthorizedConnection(url, username=username, password=password, requests_session=session)
     return Client(connection), connection
 
-def action_info(client):
-    """Get all modem information."""
+# Sections of the info action: (key, fetch function, value on error)
+INFO_SECTIONS = [
+    ('device', lambda c: c.device.information(), None),
+    ('signal', lambda c: c.device.signal(), None),
+    ('traffic', lambda c: c.monitoring.traffic_statistics(), {}),
+    ('status', lambda c: c.monitoring.status(), None),
+    ('net_mode', lambda c: c.net.net_mode(), None),
+    ('plmn', lambda c: c.net.current_plmn(), None),
+    ('month_stats', lambda c: c.monitoring.month_statistics(), None),
+    ('dialup', lambda c: c.dial_up.connection(), None),
+    # Only on request: lets the daemon notice new SMS without listing them
+    ('sms_count', lambda c: c.sms.sms_count(), None),
+]
+INFO_SECTION_NAMES = [key for key, _fetch, _default in INFO_SECTIONS]
+DEFAULT_INFO_SECTIONS = [key for key in INFO_SECTION_NAMES if key != 'sms_count']
+
+def action_info(client, auth_errors=(), sections=None):
+    """
+    Get all modem information, or only the given sections.
+    Errors in `auth_errors` are re-raised so a cached session can be renewed.
+    """
     data = {}
-    
-    # Device info
-    try:
-        data['device'] = client.device.information()
-    except Exception as e:
-        data['device'] = None
-    
-    # Signal info
-    try:
-        data['signal'] = client.device.signal()
-    except Exception as e:
-        data['signal'] = None
-    
-    # Traffic statistics
-    try:
-        data['traffic'] = client.monitoring.traffic_statistics()
-    except Exception as e:
-        data['traffic'] = {}
-    
-    # Monitoring status
-    try:
-        data['status'] = client.monitoring.status()
-    except Exception as e:
-        data['status'] = None
-    
-    # Network mode
-    try:
-        data['net_mode'] = client.net.net_mode()
-    except:
-        data['net_mode'] = None
-    
-    # Current PLMN (operator)
-    try:
-        data['plmn'] = client.net.current_plmn()
-    except:
-        data['plmn'] = None
-    
-    # Month statistics
-    try:
-        data['month_stats'] = client.monitoring.month_statistics()
-    except:
-        data['month_stats'] = None
-    
-    # Dialup connection
-    try:
-        data['dialup'] = client.dial_up.connection()
-    except:
-        data['dialup'] = None
-    
+    sections = DEFAULT_INFO_SECTIONS if sections is None else sections
+    for key, fetch, default in INFO_SECTIONS:
+        if key not in sections:
+            continue
+        try:
+            data[key] = fetch(client)
+        except auth_errors:
+            raise
+        except Exception:
+            data[key] = default
     return data
 
 def action_reboot(client):
@@ -214,31 +219,76 @@ def action_sms_count(client):
     """Get SMS count info."""
     return client.sms.sms_count()
 
+def run_action(client, action, data, auth_errors=(), sections=None):
+    """Dispatch a single action and return its result."""
+    if action == "info":
+        return action_info(client, auth_errors, sections)
+    elif action == "reboot":
+        return action_reboot(client)
+    elif action == "toggle_data":
+        enable = data.get('enable', True)
+        return action_toggle_data(client, enable)
+    elif action == "bands":
+        return action_bands(client, data if data else None)
+    elif action == "bands_list":
+        return action_bands_list(client)
+    elif action == "apn_list":
+        return action_apn_list(client)
+    elif action == "apn_create":
+        return action_apn_create(client, data)
+    elif action == "apn_delete":
+        return action_apn_delete(client, data)
+    elif action == "apn_default":
+        return action_apn_default(client, data)
+    elif action == "sms_list":
+        return action_sms_list(client, data if data else None)
+    elif action == "sms_send":
+        return action_sms_send(client, data)
+    elif action == "sms_delete":
+        return action_sms_delete(client, data)
+    elif action == "sms_read":
+        return action_sms_read(client, data)
+    elif action == "sms_count":
+        return action_sms_count(client)
+    raise ValueError(f"Unknown action: {action}")
+
 def main():
     parser = ArgumentParser(description="Modem API CLI")
     parser.add_argument("url", type=str, help="Modem URL")
     parser.add_argument("--username", type=str, default="admin")
     parser.add_argument("--password", type=str, default="admin")
-    parser.add_argument("--action", type=str, required=True,
-                        choices=["info", "reboot", "toggle_data", "bands", "bands_list",
-                                 "apn_list", "apn_create", "apn_delete", "apn_default",
-                                 "sms_list", "sms_send", "sms_delete", "sms_read", "sms_count"])
+    parser.add_argument("--action", type=str, choices=ACTIONS + ["cache_stats", "watch"])
+    parser.add_argument("--batch", type=str, default="",
+                        help='JSON array of {"action", "data", "sections"} steps run over one login')
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run consecutive read steps of a batch concurrently")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="Continue a batch after a failed step")
     parser.add_argument("--data", type=str, default="{}", help="JSON data for action")
+    parser.add_argument("--sections", type=str, default="",
+                        help="Comma-separated info sections to return (default: all)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Bypass cached responses (fresh results are still cached)")
+    parser.add_argument("--stale-ok", action="store_true",
+                        help="Answer info from an expired cache entry at once and refresh it in the background")
+    parser.add_argument("--session-cache", action="store_true",
+                        help="Reuse the modem login session across invocations")
+    parser.add_argument("--budget-drawn", action="store_true",
+                        help="Caller already took a token from the modem request budget")
+    parser.add_argument("--source", type=str, default="luci",
+                        help="Who requested the action, shown to other waiters")
+    parser.add_argument("--interval", type=float, default=5,
+                        help="Watch: seconds between snapshots")
+    parser.add_argument("--deltas", action="store_true",
+                        help="Watch: after the first snapshot, print only the sections that changed")
+    parser.add_argument("--count", type=int, default=0,
+                        help="Watch: stop after this many polls (default: until killed)")
     args = parser.parse_args()
+    if not args.action and not args.batch:
+        parser.error("one of --action or --batch is required")
     
     # Parse URL for credentials
-    parsed_url = urlparse(args.url)
-    if parsed_url.username:
-        username = parsed_url.username
-        password = parsed_url.password or args.password
-        clean_url = f"{parsed_url.scheme}://{parsed_url.hostname}"
-        if parsed_url.port:
-            clean_url += f":{parsed_url.port}"
-        clean_url += parsed_url.path or "/"
-    else:
-        username = args.username
-        password = args.password
-        clean_url = args.url
+    clean_url, username, password = parse_modem_url(args.url, args.username, args.password)
     
     # Parse data
     try:
@@ -246,55 +296,413 @@ def main():
     except json.JSONDecodeError:
         json_response(False, error="Invalid JSON data")
         return
+
+    args.sections = [name for name in args.sections.split(",") if name] or None
+    unknown = [name for name in args.sections or [] if name not in INFO_SECTION_NAMES]
+    if unknown:
+        json_response(False, error=f"Unknown sections: {', '.join(unknown)}")
+        return
     
-    # Connect and execute action
+    responses = ResponseCache(clean_url, username)
     try:
-        client, connection = get_client(clean_url, username, password)
-        
+        if args.batch:
+            try:
+                steps = parse_batch(args.batch)
+            except ValueError as e:
+                json_response(False, error=str(e))
+                return
+            run_batch(args, clean_url, username, password, steps, responses)
+        elif args.action == "watch":
+            run_watch(args, clean_url, username, password, responses)
+        else:
+            run_cli(args, clean_url, username, password, data, responses)
+    finally:
+        responses.flush_stats()
+
+def cached_info(responses, sections=None):
+    """Return (cached sections, names of sections that must be fetched)."""
+    cached = {}
+    missing = []
+    for key in sections or DEFAULT_INFO_SECTIONS:
+        hit, value = responses.get(f"info.{key}")
+        if hit:
+            cached[key] = value
+        else:
+            missing.append(key)
+    return cached, missing
+
+def stale_info(responses, sections=None):
+    """Cached info up to STALE_MAX_AGE old, or None if any section is missing."""
+    stale = {}
+    for key in sections or DEFAULT_INFO_SECTIONS:
+        value = responses.get_stale(f"info.{key}", STALE_MAX_AGE)
+        if value is None:
+            return None
+        stale[key] = value
+    return stale
+
+def answer_and_detach(data):
+    """
+    Print a stale answer and exit, leaving a detached child to finish the
+    refresh, so the caller (reading until EOF) is not kept waiting.
+    """
+    sys.stdout.flush()
+    if os.fork() == 0:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        return
+    json_response(True, data=data, stale=True)
+
+def store_result(responses, action, data, result):
+    """Cache a read result, or drop entries a write has made stale."""
+    if action == "info":
+        for key, value in result.items():
+            # Failed sections come back empty, never cache those
+            if value:
+                responses.put(f"info.{key}", value)
+    elif is_read_action(action, data):
+        responses.put(entry_name(action, data), result)
+    else:
+        responses.invalidate(action)
+
+class ModemSession:
+    """
+    One connection to the modem, reused for every action of an invocation.
+    A cached login that turns out to be expired is renewed once.
+    """
+
+    def __init__(self, clean_url, username, password, session_cache=False):
+        self.password = password
+        self.cache = None
+        self.auth_errors = ()
+        if session_cache:
+            from session_cache import SessionCache, AUTH_ERRORS
+            self.cache = SessionCache(clean_url, username)
+            self.auth_errors = AUTH_ERRORS
+        self.client, self.connection = get_client(clean_url, username, password, self.cache)
+        self.renewed = False
+        # Writes rotate the CSRF tokens; only then is the cache entry saved again
+        self.wrote = False
+        self._relogin_lock = threading.Lock()
+
+    def run(self, action, data, sections=None):
+        if not is_read_action(action, data):
+            self.wrote = True
         try:
-            if args.action == "info":
-                result = action_info(client)
-            elif args.action == "reboot":
-                result = action_reboot(client)
-            elif args.action == "toggle_data":
-                enable = data.get('enable', True)
-                result = action_toggle_data(client, enable)
-            elif args.action == "bands":
-                result = action_bands(client, data if data else None)
-            elif args.action == "bands_list":
-                result = action_bands_list(client)
-            elif args.action == "apn_list":
-                result = action_apn_list(client)
-            elif args.action == "apn_create":
-                result = action_apn_create(client, data)
-            elif args.action == "apn_delete":
-                result = action_apn_delete(client, data)
-            elif args.action == "apn_default":
-                result = action_apn_default(client, data)
-            elif args.action == "sms_list":
-                result = action_sms_list(client, data if data else None)
-            elif args.action == "sms_send":
-                result = action_sms_send(client, data)
-            elif args.action == "sms_delete":
-                result = action_sms_delete(client, data)
-            elif args.action == "sms_read":
-                result = action_sms_read(client, data)
-            elif args.action == "sms_count":
-                result = action_sms_count(client)
+            return run_action(self.client, action, data, self.auth_errors, sections)
+        except self.auth_errors:
+            if not self.cache or not self.cache.reused:
+                raise
+            # Cached session expired: log in once (also for concurrent steps) and retry
+            with self._relogin_lock:
+                if not self.renewed:
+                    self.connection = self.cache.relogin(self.password, self.connection.requests_session)
+                    self.client = Client(self.connection)
+                    self.renewed = True
+            return run_action(self.client, action, data, sections=sections)
+
+    def close(self, ok=True):
+        if self.cache:
+            # Reads leave the tokens as loaded; saving them could undo a
+            # concurrent write's rotation
+            if ok and (self.wrote or not self.cache.reused):
+                self.cache.update(self.connection)
+            self.cache.release(self.connection)
+        else:
+            try:
+                self.connection.close()
+            except:
+                pass
+
+def run_cli(args, clean_url, username, password, data, responses):
+    if args.action == "cache_stats":
+        json_response(True, data=responses.read_stats())
+        return
+
+    # Serve read-only actions from the shared cache when possible
+    cached = {}
+    sections = args.sections
+    flight = None
+    if is_read_action(args.action, data) and not args.refresh:
+        if args.action == "info":
+            cached, sections = cached_info(responses, args.sections)
+            if not sections:
+                json_response(True, data=cached)
+                return
+            # Single flight: one process refreshes, concurrent callers reuse its result
+            flight = SingleFlight(responses, "info")
+            stale = stale_info(responses, args.sections) if args.stale_ok else None
+            if flight.acquire():
+                if stale:
+                    answer_and_detach(stale)
+                    # The answering parent already counted this lookup
+                    responses.hits, responses.misses = {}, {}
             else:
-                json_response(False, error=f"Unknown action: {args.action}")
+                if stale:
+                    json_response(True, data=stale, stale=True)
+                    return
+                flight.acquire(timeout=FLIGHT_WAIT)
+                cached, sections = cached_info(responses, args.sections)
+                if not sections:
+                    json_response(True, data=cached)
+                    return
+        else:
+            hit, value = responses.get(entry_name(args.action, data))
+            if hit:
+                json_response(True, data=value)
                 return
-            
+
+    # Every request that reaches the modem draws from its shared budget
+    if not args.budget_drawn:
+        if not RequestBudget(device_key(clean_url, username)).acquire(max_wait=5):
+            json_response(False, error="Modem request budget exhausted, try again shortly")
+            return
+
+    # Writes wait for reconnects and other writes on the same modem
+    lease = None
+    if not is_read_action(args.action, data):
+        lease = ModemLease(device_key(clean_url, username))
+        try:
+            lease.acquire(args.action, source=args.source, timeout=LEASE_WAIT)
+        except ModemBusyError as e:
+            json_response(False, error=str(e))
+            return
+    started_at = time.time()
+
+    # Connect and execute action
+    try:
+        session = ModemSession(clean_url, username, password, args.session_cache)
+        ok = False
+        try:
+            result = session.run(args.action, data, sections)
+            ok = True
+            store_result(responses, args.action, data, result)
+            if lease:
+                lease.record_outcome(args.action, args.source, True, started_at)
+            if cached:
+                result = dict(cached, **result)
             json_response(True, data=result)
-            
         finally:
-            try:
-                connection.close()
-            except:
-                pass
+            session.close(ok)
                 
     except Exception as e:
         json_response(False, error=str(e))
+    finally:
+        if lease:
+            lease.release()
+        if flight:
+            flight.release()
+
+def emit(line):
+    """Print one NDJSON line; False once the reader went away."""
+    try:
+        print(json.dumps(line, separators=(",", ":")), flush=True)
+        return True
+    except BrokenPipeError:
+        return False
+
+def run_watch(args, clean_url, username, password, responses):
+    """
+    Stream info snapshots as JSON lines over one login until killed.
+    Polls are skipped while a reconnect or similar holds the modem, or when
+    the request budget is empty; a failed poll logs in again once before
+    reporting an error line.
+    """
+    from session_cache import AUTH_ERRORS
+    key = device_key(clean_url, username)
+    lease = ModemLease(key)
+    budget = RequestBudget(key)
+    interval = max(WATCH_MIN_INTERVAL, args.interval)
+    session = None
+    last = {}
+    polls = 0
+    try:
+        while not args.count or polls < args.count:
+            started = time.time()
+            polls += 1
+            active = lease.current()
+            if active and active.get("operation") in DISRUPTIVE:
+                line = {"t": round(started, 3), "paused": active.get("operation")}
+            elif not args.budget_drawn and budget.try_acquire():
+                line = {"t": round(started, 3), "skipped": "budget"}
+            else:
+                line = None
+                for attempt in (1, 2):
+                    try:
+                        if session is None:
+                            session = ModemSession(clean_url, username, password, args.session_cache)
+                            # An expired login must fail the poll, not come back as empty sections
+                            session.auth_errors = AUTH_ERRORS
+                        result = session.run("info", {}, args.sections)
+                        break
+                    except Exception as e:
+                        # Expired login or dropped connection: start over with a new session
+                        if session:
+                            session.close(False)
+                        session = None
+                        if attempt == 2:
+                            line = {"t": round(started, 3), "error": str(e)}
+                if line is None:
+                    store_result(responses, "info", {}, result)
+                    line = {"t": round(started, 3)}
+                    if args.deltas and last:
+                        changed = {k: v for k, v in result.items() if last.get(k) != v}
+                        if changed:
+                            line["changed"] = changed
+                        else:
+                            line = None
+                    else:
+                        line["data"] = result
+                    last = result
+            if line is not None and not emit(line):
+                break
+            time.sleep(max(0, interval - (time.time() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if session:
+            session.close(True)
+
+def parse_batch(raw):
+    """Validate a --batch JSON array into a list of (action, data, sections)."""
+    try:
+        steps = json.loads(raw)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid batch JSON")
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("Batch must be a non-empty JSON array")
+    if len(steps) > MAX_BATCH_STEPS:
+        raise ValueError(f"Batch is limited to {MAX_BATCH_STEPS} steps")
+    parsed = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict) or step.get("action") not in ACTIONS:
+            raise ValueError(f"Step {index}: unknown or missing action")
+        data = step.get("data") or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"Step {index}: data must be an object")
+        sections = step.get("sections")
+        if isinstance(sections, str):
+            sections = [name for name in sections.split(",") if name]
+        if sections and any(name not in INFO_SECTION_NAMES for name in sections):
+            raise ValueError(f"Step {index}: unknown sections")
+        parsed.append((step["action"], data, sections or None))
+    return parsed
+
+def read_groups(steps, parallel):
+    """
+    Split step indexes into groups that run one after another. With
+    `parallel`, consecutive GET-only reads share a group and run together.
+    """
+    groups = []
+    for index, (action, data, _sections) in enumerate(steps):
+        concurrent = parallel and action in PARALLEL_READS and is_read_action(action, data)
+        if concurrent and groups and groups[-1][0]:
+            groups[-1][1].append(index)
+        else:
+            groups.append((concurrent, [index]))
+    return [indexes for _concurrent, indexes in groups]
+
+def run_batch(args, clean_url, username, password, steps, responses):
+    """Run several actions in order over one login; one envelope for all."""
+    key = device_key(clean_url, username)
+    batch_started = time.time()
+    results = [None] * len(steps)
+
+    # Reads the shared cache can answer never reach the modem
+    pending = []
+    partial = {}
+    for index, (action, data, sections) in enumerate(steps):
+        if is_read_action(action, data) and not args.refresh:
+            if action == "info":
+                cached, missing = cached_info(responses, sections)
+                if not missing:
+                    results[index] = {"action": action, "success": True, "data": cached,
+                                      "cached": True, "ms": 0}
+                    continue
+                # Fetch only the sections the cache lacks
+                steps[index] = (action, data, missing)
+                partial[index] = cached
+            else:
+                hit, value = responses.get(entry_name(action, data))
+                if hit:
+                    results[index] = {"action": action, "success": True, "data": value,
+                                      "cached": True, "ms": 0}
+                    continue
+        pending.append(index)
+
+    def envelope():
+        done = [r for r in results if r]
+        ok = len(done) == len(steps) and all(r["success"] for r in done)
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {"action": steps[index][0], "success": False, "skipped": True}
+        payload = {"steps": results, "elapsed_ms": int((time.time() - batch_started) * 1000)}
+        print(json.dumps({"success": ok, "data": payload}))
+        sys.exit(0 if ok else 1)
+
+    if not pending:
+        envelope()
+
+    if not args.budget_drawn:
+        if not RequestBudget(key).acquire(max_wait=5):
+            json_response(False, error="Modem request budget exhausted, try again shortly")
+
+    # One lease for the whole batch if any step writes
+    writes = [steps[i][0] for i in pending if not is_read_action(steps[i][0], steps[i][1])]
+    lease = None
+    if writes:
+        lease = ModemLease(key)
+        try:
+            lease.acquire(writes[0], source=args.source, timeout=LEASE_WAIT)
+        except ModemBusyError as e:
+            json_response(False, error=str(e))
+
+    def run_step(session, index):
+        action, data, sections = steps[index]
+        started = time.time()
+        try:
+            value = session.run(action, data, sections)
+            result = {"action": action, "success": True, "data": value}
+        except Exception as e:
+            result = {"action": action, "success": False, "error": str(e)}
+        result["ms"] = int((time.time() - started) * 1000)
+        return result
+
+    session = None
+    try:
+        session = ModemSession(clean_url, username, password, args.session_cache)
+        pending_set = set(pending)
+        for group in read_groups(steps, args.parallel):
+            group = [i for i in group if i in pending_set]
+            if len(group) > 1:
+                with ThreadPoolExecutor(max_workers=min(len(group), PARALLEL_WORKERS)) as pool:
+                    done = list(pool.map(lambda i: (i, run_step(session, i)), group))
+            else:
+                done = [(i, run_step(session, i)) for i in group]
+            failed = False
+            for index, result in done:
+                results[index] = result
+                action, data, _sections = steps[index]
+                if not result["success"]:
+                    failed = True
+                    continue
+                store_result(responses, action, data, result["data"])
+                if index in partial:
+                    result["data"] = dict(partial[index], **result["data"])
+                if lease and not is_read_action(action, data):
+                    lease.record_outcome(action, args.source, True, batch_started)
+            if failed and not args.keep_going:
+                break
+    except Exception as e:
+        json_response(False, error=str(e))
+    finally:
+        if session:
+            session.close(any(r and r["success"] and not r.get("cached") for r in results))
+        if lease:
+            lease.release()
+    envelope()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+OpenMetrics text exposition helpers for Huawei Manager.
+Renders metric families from in-memory values, no I/O involved.
+"""
+import math
+import re
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def parse_number(value):
+    """
+    Extract a float from modem values like '-95dBm', '&lt;=-113dBm' or '12.5dB'.
+    Returns None if no number is present.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    if not match:
+        return None
+    try:
+        return float(match.group(0))
+    except ValueError:
+        return None
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Exposition:
+    """
+    Collects metric families and renders them in OpenMetrics text format.
+    Families keep insertion order; samples with a None value are skipped.
+    """
+
+    def __init__(self):
+        self._families = {}
+
+    def family(self, name, metric_type, help_text, unit=None):
+        if name not in self._families:
+            self._families[name] = {
+                "type": metric_type,
+                "help": help_text,
+                "unit": unit,
+                "samples": []
+            }
+        return self._families[name]
+
+    def add(self, name, metric_type, help_text, value, labels=None, suffix="", unit=None):
+        """Add one sample. Counters get the '_total' suffix automatically."""
+        fam = self.family(name, metric_type, help_text, unit)
+        if value is None:
+            return
+        if metric_type == "counter" and not suffix:
+            suffix = "_total"
+        fam["samples"].append((suffix, labels or {}, value))
+
+    def gauge(self, name, help_text, value, labels=None, unit=None):
+        self.add(name, "gauge", help_text, value, labels, unit=unit)
+
+    def counter(self, name, help_text, value, labels=None, unit=None):
+        self.add(name, "counter", help_text, value, labels, unit=unit)
+
+    def summary(self, name, help_text, count, total, labels=None, unit=None):
+        self.add(name, "summary", help_text, count, labels, suffix="_count", unit=unit)
+        self.add(name, "summary", help_text, total, labels, suffix="_sum", unit=unit)
+
+    def render(self):
+        lines = []
+        for name, fam in self._families.items():
+            lines.append(f"# TYPE {name} {fam['type']}")
+            if fam["unit"]:
+                lines.append(f"# UNIT {name} {fam['unit']}")
+            lines.append(f"# HELP {name} {fam['help']}")
+            for suffix, labels, value in fam["samples"]:
+                formatted = _format_value(value)
+                if formatted is None:
+                    continue
+                if labels:
+                    label_str = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                    lines.append(f"{name}{suffix}{{{label_str}}} {formatted}")
+                else:
+                    lines.append(f"{name}{suffix} {formatted}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
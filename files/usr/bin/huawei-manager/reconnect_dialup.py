@@ -18,7 +18,21 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 import ipaddress
 
-# ... (existing imports)
+try:
+    from utils import parse_modem_url
+    from response_cache import ResponseCache, device_key
+    from arbiter import ModemLease, ModemBusyError
+except ImportError:
+    ResponseCache = None
+    ModemLease = None
+
+try:
+    from transport import new_session
+except ImportError:
+    new_session = None
+
+# Seconds to queue behind another operation on the same modem
+LEASE_WAIT = 60
 
 def check_prefix(ip, prefixes):
     if not ip: return False
@@ -54,8 +68,11 @@ def reconnect(url, username, password, method="data", prefixes=[]):
             print(f"Converted to HTTPS: {url}", file=sys.stderr)
         
         # Create a custom session with SSL verification disabled
-        session = requests.Session()
-        session.verify = False
+        if new_session:
+            session = new_session()
+        else:
+            session = requests.Session()
+            session.verify = False
         
         with AuthorizedConnection(url, username=username, password=password, requests_session=session) as connection:
             client = Client(connection)
@@ -160,6 +177,7 @@ def reconnect(url, username, password, method="data", prefixes=[]):
         print(f"Reconnect error: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc(file=sys.stderr)
+        return False
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -168,6 +186,7 @@ if __name__ == "__main__":
     parser.add_argument("--password", type=str, default="admin")
     parser.add_argument("--method", type=str, default="data", choices=["data", "netmode", "reboot", "profile"], help="Reconnection method: data (default), netmode, reboot, profile")
     parser.add_argument("--prefixes", type=str, default="", help="Target IP prefixes (space separated)")
+    parser.add_argument("--source", type=str, default="luci", help="Who requested the reconnect: luci, daemon, ...")
     args = parser.parse_args()
 
     # Parse URL to extract username and password if provided
@@ -190,4 +209,31 @@ if __name__ == "__main__":
     prefixes_list = args.prefixes.split(" ") if args.prefixes else []
     # Clean up prefixes (strip quotes and whitespace)
     prefixes_list = [p.strip().strip("'").strip('"') for p in prefixes_list if p.strip()]
-    reconnect(clean_url, username, password, args.method, prefixes_list)
+    if ModemLease is None:
+        reconnect(clean_url, username, password, args.method, prefixes_list)
+        sys.exit(0)
+
+    cache_url, cache_user, _ = parse_modem_url(args.url, args.username, args.password)
+    key = device_key(cache_url, cache_user)
+    lease = ModemLease(key)
+    requested_at = time.time()
+    try:
+        lease.acquire("reconnect", source=args.source, timeout=LEASE_WAIT)
+    except ModemBusyError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        # A reconnect that finished while we queued already did our job
+        last = lease.last_outcome("reconnect")
+        if last and last.get("finished_at", 0) >= requested_at:
+            print(f"Reconnect already performed by {last.get('source')}, skipping")
+            sys.exit(0)
+
+        ok = reconnect(clean_url, username, password, args.method, prefixes_list) is not False
+
+        # Cached modem responses (IP, status, ...) are stale now
+        ResponseCache(cache_url, cache_user).invalidate("reboot" if args.method == "reboot" else "reconnect")
+        lease.record_outcome("reconnect", args.source, ok, requested_at, method=args.method)
+    finally:
+        lease.release()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Shared response cache for Huawei Manager.
+Read-only modem actions are cached on tmpfs with a TTL per action, so the
+daemon and modem_api.py invocations can answer each other's requests.
+"""
+import os
+import json
+import time
+import fcntl
+import hashlib
+
+CACHE_DIR = "/tmp/huawei-manager-cache"
+
+# TTL in seconds per cache entry. Info is cached per section as 'info.<section>'.
+TTLS = {
+    "info.device": 60,
+    "info.signal": 5,
+    "info.traffic": 5,
+    "info.status": 5,
+    "info.net_mode": 60,
+    "info.plmn": 60,
+    "info.month_stats": 60,
+    "info.dialup": 10,
+    "info.sms_count": 15,
+    "bands": 60,
+    "bands_list": 6 * 3600,
+    "apn_list": 300,
+    "sms_list": 30,
+    "sms_count": 15,
+}
+
+# Entries dropped by each write action (prefix match, '*' drops everything)
+INVALIDATES = {
+    "reboot": ["*"],
+    "reconnect": ["info"],
+    "toggle_data": ["info"],
+    "bands": ["bands", "info"],
+    "apn_create": ["apn_list"],
+    "apn_delete": ["apn_list"],
+    "apn_default": ["apn_list", "info"],
+    "sms_send": ["sms_count", "info.sms_count"],
+    "sms_delete": ["sms_list", "sms_count", "info.sms_count"],
+    "sms_read": ["sms_list", "sms_count", "info.sms_count"],
+}
+
+
+def device_key(url, username):
+    """Stable key for a modem, shared by all caches."""
+    return hashlib.sha1(f"{url}|{username or ''}".encode()).hexdigest()[:16]
+
+
+def is_read_action(action, data=None):
+    """'bands' is a read without data and a write with it."""
+    if action == "bands":
+        return not data
+    return action == "info" or action in TTLS
+
+
+def entry_name(action, data=None):
+    """Cache entry name; parametrized actions get a hash of their data."""
+    if action in ("sms_list",) and data:
+        digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:8]
+        return f"{action}.{digest}"
+    return action
+
+
+def ttl_for(name):
+    return TTLS.get(name, TTLS.get(name.split(".", 1)[0], 0))
+
+
+class ResponseCache:
+    """One directory per modem, one JSON file per entry."""
+
+    def __init__(self, url, username, cache_dir=CACHE_DIR):
+        self.dir = os.path.join(cache_dir, device_key(url, username))
+        self.stats_path = os.path.join(self.dir, "stats.json")
+        self.hits = {}
+        self.misses = {}
+
+    def _path(self, name):
+        return os.path.join(self.dir, f"{name}.json")
+
+    @staticmethod
+    def _count(counter, name):
+        action = name.split(".", 1)[0]
+        counter[action] = counter.get(action, 0) + 1
+
+    def get(self, name):
+        """Return (hit, value). Expired or unreadable entries count as misses."""
+        try:
+            with open(self._path(name)) as f:
+                entry = json.load(f)
+            if time.time() - entry["stored_at"] < entry["ttl"]:
+                self._count(self.hits, name)
+                return True, entry["value"]
+        except (OSError, ValueError, KeyError):
+            pass
+        self._count(self.misses, name)
+        return False, None
+
+    def get_stale(self, name, max_age):
+        """Value of an entry up to max_age seconds old, even past its TTL, or None."""
+        try:
+            with open(self._path(name)) as f:
+                entry = json.load(f)
+            if time.time() - entry["stored_at"] < max_age:
+                return entry["value"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def age(self, name):
+        """Seconds since the entry was stored, or None."""
+        try:
+            with open(self._path(name)) as f:
+                return time.time() - json.load(f)["stored_at"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, name, value, ttl=None):
+        ttl = ttl_for(name) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        try:
+            os.makedirs(self.dir, mode=0o700, exist_ok=True)
+            tmp_path = f"{self._path(name)}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"stored_at": time.time(), "ttl": ttl, "value": value}, f)
+            os.replace(tmp_path, self._path(name))
+        except OSError:
+            pass
+
+    def invalidate(self, action):
+        """Drop the entries affected by a write action."""
+        prefixes = INVALIDATES.get(action, [])
+        if not prefixes:
+            return
+        try:
+            names = os.listdir(self.dir)
+        except OSError:
+            return
+        for fname in names:
+            if not fname.endswith(".json") or fname == "stats.json":
+                continue
+            name = fname[:-5]
+            if "*" in prefixes or any(name == p or name.startswith(p + ".") for p in prefixes):
+                try:
+                    os.remove(os.path.join(self.dir, fname))
+                except OSError:
+                    pass
+
+    def flush_stats(self):
+        """Add this process' hit/miss counters to the shared stats file."""
+        if not self.hits and not self.misses:
+            return
+        try:
+            os.makedirs(self.dir, mode=0o700, exist_ok=True)
+            with open(f"{self.stats_path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                stats = self.read_stats()
+                for key, counts in (("hits", self.hits), ("misses", self.misses)):
+                    for action, n in counts.items():
+                        stats[key][action] = stats[key].get(action, 0) + n
+                tmp_path = f"{self.stats_path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(stats, f)
+                os.replace(tmp_path, self.stats_path)
+            self.hits, self.misses = {}, {}
+        except OSError:
+            pass
+
+    def read_stats(self):
+        try:
+            with open(self.stats_path) as f:
+                stats = json.load(f)
+            stats.setdefault("hits", {})
+            stats.setdefault("misses", {})
+            return stats
+        except (OSError, ValueError):
+            return {"hits": {}, "misses": {}}
+
+
+class SingleFlight:
+    """
+    Cross-process lock so only one process refreshes a cache entry at a time.
+    Others wait for it and then read the entry it stored.
+    """
+
+    def __init__(self, cache, name):
+        self.dir = cache.dir
+        self.path = os.path.join(cache.dir, f"{name}.flight")
+        self._fd = None
+
+    def acquire(self, timeout=0):
+        """Wait up to timeout seconds to become the refreshing process."""
+        try:
+            os.makedirs(self.dir, mode=0o700, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            return True  # Never block modem access on tmpfs errors
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                return True
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(0.1)
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Poll scheduling for Huawei Manager.
+Phase-staggers device polls, caps concurrent modem requests in the daemon
+and keeps a per-modem request budget shared with modem_api.py.
+"""
+import os
+import json
+import math
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+
+BUDGET_DIR = "/tmp/huawei-manager-budget"
+DEFAULT_RATE = 30     # requests per minute
+DEFAULT_BURST = 10    # bucket capacity
+# Seconds between fetches of a dashboard section; 0 is every poll, None is
+# once (again only after a reset, e.g. when the modem rebooted)
+DEFAULT_SECTION_INTERVALS = {"device": None, "plmn": 60, "net_mode": 60}
+
+
+class PollScheduler:
+    """
+    Spreads device polls evenly across their interval instead of firing
+    them in lockstep, and limits how many modem requests run at once.
+    """
+
+    def __init__(self, max_concurrent=2):
+        self.anchor = time.time()
+        self.offsets = {}
+        self.intervals = {}
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._lock = threading.Lock()
+
+    def register(self, device_ids_intervals):
+        """Assign phase offsets. Takes a list of (device_id, interval)."""
+        with self._lock:
+            count = len(device_ids_intervals)
+            for index, (device_id, interval) in enumerate(device_ids_intervals):
+                interval = max(1, interval)
+                self.intervals[device_id] = interval
+                self.offsets[device_id] = interval * index / count if count else 0
+
+    def next_due(self, device_id, now=None):
+        """Next intended poll time of a device, not earlier than now."""
+        now = time.time() if now is None else now
+        interval = self.intervals.get(device_id, 10)
+        start = self.anchor + self.offsets.get(device_id, 0)
+        if now <= start:
+            return start
+        periods = math.ceil((now - start) / interval)
+        return start + periods * interval
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the global concurrent request slots."""
+        self._slots.acquire()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+def parse_section_intervals(entries):
+    """Section intervals from 'section=seconds' or 'section=once' entries, over the defaults."""
+    intervals = dict(DEFAULT_SECTION_INTERVALS)
+    for entry in entries or []:
+        name, _, value = entry.partition("=")
+        name, value = name.strip(), value.strip()
+        if not name:
+            continue
+        if value == "once":
+            intervals[name] = None
+            continue
+        try:
+            intervals[name] = max(0, int(value))
+        except ValueError:
+            pass
+    return intervals
+
+
+class SectionSchedule:
+    """
+    Which dashboard sections a poll fetches. Each section comes due on its
+    own interval; intervals shorter than the poll interval mean every poll.
+    """
+
+    def __init__(self, sections, intervals=None):
+        self.sections = list(sections)
+        self.intervals = DEFAULT_SECTION_INTERVALS if intervals is None else intervals
+        self.fetched_at = {}
+
+    def due(self, now=None, slack=0):
+        """
+        Sections to fetch now. `slack` (half a poll interval) lets a section
+        come due on the poll nearest its interval rather than the one after.
+        """
+        now = time.time() if now is None else now
+        due = []
+        for name in self.sections:
+            interval = self.intervals.get(name, 0)
+            last = self.fetched_at.get(name)
+            if last is None or interval is not None and now - last + slack >= interval:
+                due.append(name)
+        return due
+
+    def fetched(self, data, now=None):
+        """Mark the sections a poll returned; failed ones stay due."""
+        now = time.time() if now is None else now
+        for name in self.sections:
+            if data.get(name):
+                self.fetched_at[name] = now
+
+    def reset(self):
+        """Fetch everything again on the next poll."""
+        self.fetched_at.clear()
+
+
+class RequestBudget:
+    """
+    Token bucket per modem stored on tmpfs and shared across processes.
+    Daemon polls keep a reserve free so manual LuCI actions are not starved.
+    """
+
+    def __init__(self, key, budget_dir=BUDGET_DIR):
+        self.budget_dir = budget_dir
+        self.path = os.path.join(budget_dir, f"{key}.json")
+        self.lock_path = f"{self.path}.lock"
+
+    @contextmanager
+    def _locked_state(self):
+        os.makedirs(self.budget_dir, mode=0o700, exist_ok=True)
+        with open(self.lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {"rate": DEFAULT_RATE, "burst": DEFAULT_BURST,
+                         "tokens": DEFAULT_BURST, "updated": time.time()}
+            # Refill since last update
+            now = time.time()
+            state["tokens"] = min(state["burst"],
+                                  state["tokens"] + (now - state["updated"]) * state["rate"] / 60.0)
+            state["updated"] = now
+            yield state
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+
+    def configure(self, rate, burst=DEFAULT_BURST):
+        try:
+            with self._locked_state() as state:
+                state["rate"] = max(1, rate)
+                state["burst"] = max(1, burst)
+                state["tokens"] = min(state["tokens"], state["burst"])
+        except OSError:
+            pass
+
+    def try_acquire(self, reserve=0):
+        """
+        Take one token if more than `reserve` are left.
+
+        Returns:
+            float: 0 on success, otherwise seconds until a token is expected
+        """
+        try:
+            with self._locked_state() as state:
+                if state["tokens"] >= reserve + 1:
+                    state["tokens"] -= 1
+                    return 0.0
+                return (reserve + 1 - state["tokens"]) * 60.0 / state["rate"]
+        except OSError:
+            # Budget is advisory, never block modem access on tmpfs errors
+            return 0.0
+
+    def acquire(self, reserve=0, max_wait=5):
+        """Wait up to max_wait seconds for a token. Returns True on success."""
+        deadline = time.time() + max_wait
+        while True:
+            wait = self.try_acquire(reserve)
+            if wait == 0:
+                return True
+            if time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def tokens(self):
+        try:
+            with self._locked_state() as state:
+                return state["tokens"]
+        except OSError:
+            return None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Cross-process session cache for Huawei Manager.
+Keeps the modem session cookie and CSRF tokens on tmpfs so that
+separate modem_api.py invocations can skip the login handshake.
+"""
+import os
+import json
+import time
+import fcntl
+import hashlib
+from contextlib import contextmanager
+from huawei_lte_api.Connection import Connection
+from huawei_lte_api.exceptions import (
+    ResponseErrorLoginRequiredException,
+    ResponseErrorWrongSessionToken
+)
+
+CACHE_DIR = "/tmp/huawei-manager-sessions"
+# Entries older than this are not trusted, even if the modem would accept them
+MAX_AGE = 1800
+
+# Errors meaning the cached session is no longer logged in
+AUTH_ERRORS = (ResponseErrorLoginRequiredException, ResponseErrorWrongSessionToken)
+
+
+class CachedConnection(Connection):
+    """Connection that starts from cached cookies and tokens instead of logging in."""
+
+    def __init__(self, url, tokens, requests_session):
+        self._cached_tokens = list(tokens or [])
+        super().__init__(url, requests_session=requests_session)
+
+    def _initialize_csrf_tokens_and_session(self):
+        # First call uses the cached tokens, later reloads fetch fresh ones
+        if self._cached_tokens:
+            self.request_verification_tokens = self._cached_tokens
+            self._cached_tokens = []
+            return
+        super()._initialize_csrf_tokens_and_session()
+
+
+class SessionCache:
+    """
+    One cache entry per modem URL and username, stored root-only (0600)
+    in a root-only directory (0700). Access is serialized with flock so
+    concurrent invocations never log in at the same time.
+    """
+
+    def __init__(self, url, username, cache_dir=CACHE_DIR):
+        self.url = url
+        self.username = username or ""
+        key = hashlib.sha1(f"{url}|{self.username}".encode()).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"{key}.json")
+        self.lock_path = f"{self.path}.lock"
+        self.cache_dir = cache_dir
+        self.reused = False
+        self.login_at = 0
+        # saved_at of the entry this process loaded or wrote
+        self.saved_at = 0
+
+    def _ensure_dir(self):
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        os.chmod(self.cache_dir, 0o700)
+
+    @contextmanager
+    def lock(self):
+        self._ensure_dir()
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def load(self):
+        """Return the cached entry, or None if missing, unreadable or too old."""
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("saved_at", 0) > MAX_AGE:
+            return None
+        if not entry.get("cookies"):
+            return None
+        return entry
+
+    def save(self, connection):
+        """Persist cookies and CSRF tokens of a working connection. Caller holds lock()."""
+        try:
+            self._ensure_dir()
+            self.saved_at = time.time()
+            entry = {
+                "url": self.url,
+                "username": self.username,
+                "cookies": connection.requests_session.cookies.get_dict(),
+                "tokens": list(connection.request_verification_tokens),
+                "login_at": self.login_at,
+                "saved_at": self.saved_at
+            }
+            tmp_path = f"{self.path}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def update(self, connection):
+        """
+        Save the tokens a write rotated. Skipped if another process saved
+        after our entry was loaded: its tokens are newer, and ours may
+        already be consumed. Returns True if saved.
+        """
+        with self.lock():
+            try:
+                with open(self.path) as f:
+                    if json.load(f).get("saved_at", 0) > self.saved_at:
+                        return False
+            except (OSError, ValueError):
+                pass
+            self.save(connection)
+            return True
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def connect(self, password, requests_session):
+        """Reuse the cached session if there is one, otherwise log in."""
+        entry = self.load()
+        if entry:
+            return self._reuse(entry, requests_session)
+        return self.login(password, requests_session)
+
+    def relogin(self, password, requests_session):
+        """Replace a session the modem rejected."""
+        return self.login(password, requests_session, stale_before=self.login_at)
+
+    def _reuse(self, entry, requests_session):
+        requests_session.cookies.clear()
+        requests_session.cookies.update(entry["cookies"])
+        self.reused = True
+        self.login_at = entry.get("login_at", 0)
+        self.saved_at = entry.get("saved_at", 0)
+        return CachedConnection(self.url, entry.get("tokens"), requests_session)
+
+    def login(self, password, requests_session, stale_before=0):
+        """
+        Log in and cache the new session. If another process logged in after
+        `stale_before` while we waited for the lock, its session is reused.
+        """
+        with self.lock():
+            entry = self.load()
+            if entry and entry.get("login_at", 0) > stale_before:
+                return self._reuse(entry, requests_session)
+
+            requests_session.cookies.clear()
+            connection = Connection(self.url, username=self.username, password=password,
+                                    requests_session=requests_session)
+            self.reused = False
+            self.login_at = time.time()
+            self.save(connection)
+            return connection
+
+    @staticmethod
+    def release(connection):
+        """Close the HTTP session without logging out, so the session stays valid."""
+        connection.user_session = None
+        try:
+            connection.requests_session.close()
+        except Exception:
+            pass
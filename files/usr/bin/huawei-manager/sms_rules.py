@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+SMS rules for Huawei Manager.
+New inbox messages are matched against configured rules (sender patterns
+and a content regex) and turned into actions: forward to Telegram, mark
+read, delete or tag. The daemon only lists the inbox when the modem's
+cheap sms_count changed.
+"""
+import os
+import re
+import json
+import fnmatch
+
+RULE_ACTIONS = ("forward", "read", "delete", "tag")
+# Indexes remembered per device; the modem inbox holds far fewer
+SEEN_MAX = 500
+TAGS_MAX = 200
+
+
+class SmsRule:
+    def __init__(self, name, sender="", match="", actions=None, tag="", devices=None, stop=False):
+        self.name = name
+        # Comma-separated glob patterns on the sender, e.g. "TELKOMSEL,+62811*"
+        self.senders = [p.strip().lower() for p in (sender or "").split(",") if p.strip()]
+        self.pattern = re.compile(match, re.IGNORECASE) if match else None
+        self.actions = [a for a in (actions or []) if a in RULE_ACTIONS]
+        self.tag = tag or name
+        self.devices = [d for d in (devices or []) if d]
+        self.stop = stop
+        self.hits = 0
+
+    def applies_to(self, device_id):
+        return not self.devices or device_id in self.devices
+
+    def matches(self, message):
+        phone = (message.get("phone") or "").lower()
+        if self.senders and not any(fnmatch.fnmatchcase(phone, p) for p in self.senders):
+            return False
+        if self.pattern and not self.pattern.search(message.get("content") or ""):
+            return False
+        return True
+
+    def to_dict(self):
+        return {"name": self.name, "actions": self.actions, "tag": self.tag,
+                "devices": self.devices, "hits": self.hits}
+
+
+def parse_messages(sms_list):
+    """Messages of an sms_list response as plain dicts."""
+    messages = ((sms_list or {}).get("Messages") or {}).get("Message") or []
+    if isinstance(messages, dict):
+        messages = [messages]
+    parsed = []
+    for m in messages:
+        if not isinstance(m, dict) or not str(m.get("Index") or "").isdigit():
+            continue
+        parsed.append({
+            "index": str(m["Index"]),
+            "phone": m.get("Phone") or "",
+            "content": m.get("Content") or "",
+            "date": m.get("Date") or "",
+            "unread": str(m.get("Smstat")) == "0"
+        })
+    return parsed
+
+
+def plan(message, rules, device_id):
+    """Actions for a message: list of (action, rule). Delete wins over read."""
+    planned = []
+    for rule in rules:
+        if not rule.applies_to(device_id) or not rule.matches(message):
+            continue
+        rule.hits += 1
+        for action in rule.actions:
+            planned.append((action, rule))
+        if rule.stop:
+            break
+    if any(action == "delete" for action, _rule in planned):
+        planned = [(a, r) for a, r in planned if a != "read"]
+    return planned
+
+
+class SmsState:
+    """Per-device count fingerprint, processed message indexes and tags."""
+
+    def __init__(self, path):
+        self.path = path
+        self.devices = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.devices = json.load(f).get("devices", {})
+        except (OSError, ValueError):
+            self.devices = {}
+        return self
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"devices": self.devices}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def device(self, device_id):
+        return self.devices.setdefault(device_id, {"counts": None, "seen": None, "tags": {}})
+
+    def counts_changed(self, device_id, sms_count):
+        """True if unread or inbox count moved since the last check (or on the first)."""
+        counts = [str(sms_count.get("LocalUnread")), str(sms_count.get("LocalInbox"))]
+        state = self.device(device_id)
+        if state["counts"] == counts:
+            return False
+        state["counts"] = counts
+        return True
+
+    def new_messages(self, device_id, messages):
+        """
+        Messages not processed before. On the very first listing everything
+        already in the inbox is taken as processed, so old messages are not
+        forwarded when rules are enabled.
+        """
+        state = self.device(device_id)
+        first = state["seen"] is None
+        seen = set(state["seen"] or [])
+        unseen = [m for m in messages if m["index"] not in seen]
+        state["seen"] = ((state["seen"] or []) + [m["index"] for m in unseen])[-SEEN_MAX:]
+        return [] if first else unseen
+
+    def add_tag(self, device_id, index, tag):
+        tags = self.device(device_id)["tags"]
+        entry = tags.setdefault(index, [])
+        if tag not in entry:
+            entry.append(tag)
+        for old in list(tags)[:-TAGS_MAX]:
+            del tags[old]
+
+    def forget(self, device_id, index):
+        self.device(device_id)["tags"].pop(index, None)
+
+
+def format_forward(device_name, message):
+    """Telegram text of a forwarded message."""
+    def escape(text):
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return (f"✉️ <b>{escape(device_name)}</b>\nFrom: <code>{escape(message['phone'])}</code>"
+            f"  {escape(message['date'])}\n\n{escape(message['content'])}")
+
+
+def modem_steps(planned_by_message):
+    """Batch steps (sms_read / sms_delete) for the planned modem actions."""
+    steps = []
+    for message, planned in planned_by_message:
+        actions = {action for action, _rule in planned}
+        if "delete" in actions:
+            steps.append({"action": "sms_delete", "data": {"message_id": message["index"]}})
+        elif "read" in actions and message["unread"]:
+            steps.append({"action": "sms_read", "data": {"message_id": message["index"]}})
+    return steps
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Traffic accounting for Huawei Manager.
+Turns the modem's resettable traffic counters into monotonic per-device
+counters, smoothed rates, hourly/daily usage buckets and a month projection.
+"""
+import math
+import time
+import calendar
+from datetime import datetime
+
+# Seconds after which month_statistics is used again to correct the month total
+REANCHOR_INTERVAL = 900
+# Time constant of the rate smoothing, in seconds
+RATE_TAU = 30.0
+HOURLY_BUCKETS = 48
+DAILY_BUCKETS = 62
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _month_start(now):
+    local = datetime.fromtimestamp(now)
+    return datetime(local.year, local.month, 1).timestamp()
+
+
+class TrafficAccumulator:
+    """
+    Per-device traffic state, updated incrementally from each poll.
+
+    The modem's TotalDownload/TotalUpload counters restart from zero on
+    reboot (and on some firmware on reconnect); a drop is treated as a reset
+    and the new value is counted as traffic since the reset.
+    """
+
+    def __init__(self):
+        self.rx = 0
+        self.tx = 0
+        self.last_raw = None
+        self.last_at = None
+        self.rate_down = 0.0
+        self.rate_up = 0.0
+        self.resets = 0
+        self.hourly = {}
+        self.daily = {}
+        self.anchor = None
+
+    @classmethod
+    def from_dict(cls, state):
+        acc = cls()
+        for name in ("rx", "tx", "last_raw", "last_at", "rate_down", "rate_up",
+                     "resets", "hourly", "daily", "anchor"):
+            if name in (state or {}):
+                setattr(acc, name, state[name])
+        return acc
+
+    def to_dict(self):
+        return {
+            "rx": self.rx,
+            "tx": self.tx,
+            "last_raw": self.last_raw,
+            "last_at": self.last_at,
+            "rate_down": self.rate_down,
+            "rate_up": self.rate_up,
+            "resets": self.resets,
+            "hourly": self.hourly,
+            "daily": self.daily,
+            "anchor": self.anchor
+        }
+
+    def needs_anchor(self, now=None):
+        """True if month_statistics should be fetched on this poll."""
+        now = time.time() if now is None else now
+        if not self.anchor:
+            return True
+        if self.anchor["month"] != datetime.fromtimestamp(now).strftime("%Y-%m"):
+            return True
+        return now - self.anchor["at"] >= REANCHOR_INTERVAL
+
+    def update(self, traffic, month_stats=None, now=None):
+        """Fold one traffic_statistics (and optional month_statistics) sample in."""
+        now = time.time() if now is None else now
+        traffic = traffic or {}
+        down = _int(traffic.get("TotalDownload"))
+        up = _int(traffic.get("TotalUpload"))
+        if down is None or up is None:
+            return
+
+        reset = False
+        if self.last_raw is None:
+            delta_down = delta_up = 0
+        else:
+            delta_down = down - self.last_raw[0]
+            delta_up = up - self.last_raw[1]
+            if delta_down < 0 or delta_up < 0:
+                # Counter reset: everything counted since restarted from zero
+                self.resets += 1
+                reset = True
+                delta_down, delta_up = down, up
+
+        self.rx += delta_down
+        self.tx += delta_up
+        self._update_rates(delta_down, delta_up, traffic, now, reset)
+        self._add_to_buckets(delta_down, delta_up, now)
+        self.last_raw = [down, up]
+        self.last_at = now
+        self._update_month(month_stats, now)
+
+    def _update_rates(self, delta_down, delta_up, traffic, now, reset):
+        dt = now - self.last_at if self.last_at else 0
+        if dt > 0 and not reset:
+            sample_down, sample_up = delta_down / dt, delta_up / dt
+        else:
+            # First sample or a reset: trust the modem's instantaneous rate
+            sample_down = _int(traffic.get("CurrentDownloadRate")) or 0
+            sample_up = _int(traffic.get("CurrentUploadRate")) or 0
+        # Time-aware EWMA so irregular poll intervals weigh correctly
+        alpha = 1 - math.exp(-dt / RATE_TAU) if dt > 0 else 1.0
+        self.rate_down += alpha * (sample_down - self.rate_down)
+        self.rate_up += alpha * (sample_up - self.rate_up)
+
+    def _add_to_buckets(self, delta_down, delta_up, now):
+        local = datetime.fromtimestamp(now)
+        for buckets, key, keep in ((self.hourly, local.strftime("%Y-%m-%d %H"), HOURLY_BUCKETS),
+                                   (self.daily, local.strftime("%Y-%m-%d"), DAILY_BUCKETS)):
+            bucket = buckets.setdefault(key, [0, 0])
+            bucket[0] += delta_down
+            bucket[1] += delta_up
+            for old in sorted(buckets)[:-keep]:
+                del buckets[old]
+
+    def _update_month(self, month_stats, now):
+        month = datetime.fromtimestamp(now).strftime("%Y-%m")
+        month_down = _int((month_stats or {}).get("CurrentMonthDownload"))
+        month_up = _int((month_stats or {}).get("CurrentMonthUpload"))
+        if month_down is not None and month_up is not None and self.needs_anchor(now):
+            self.anchor = {"month": month, "at": now, "down": month_down, "up": month_up,
+                           "rx": self.rx, "tx": self.tx}
+        elif self.anchor and self.anchor["month"] != month:
+            # New month without fresh modem statistics: start from zero
+            self.anchor = {"month": month, "at": now, "down": 0, "up": 0,
+                           "rx": self.rx, "tx": self.tx}
+
+    def month_usage(self):
+        if not self.anchor:
+            return None, None
+        return (self.anchor["down"] + self.rx - self.anchor["rx"],
+                self.anchor["up"] + self.tx - self.anchor["tx"])
+
+    def projection(self, now=None):
+        """Linear month-end projection of total usage, once an hour of data exists."""
+        now = time.time() if now is None else now
+        down, up = self.month_usage()
+        if down is None:
+            return None
+        start = _month_start(now)
+        elapsed = now - start
+        if elapsed < 3600:
+            return None
+        local = datetime.fromtimestamp(now)
+        month_seconds = calendar.monthrange(local.year, local.month)[1] * 86400
+        return int((down + up) * month_seconds / elapsed)
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        today = self.daily.get(datetime.fromtimestamp(now).strftime("%Y-%m-%d"), [0, 0])
+        month_down, month_up = self.month_usage()
+        return {
+            "rx_bytes": self.rx,
+            "tx_bytes": self.tx,
+            "rate_down": round(self.rate_down, 1),
+            "rate_up": round(self.rate_up, 1),
+            "today_down": today[0],
+            "today_up": today[1],
+            "month_down": month_down,
+            "month_up": month_up,
+            "month_total": None if month_down is None else month_down + month_up,
+            "month_projected": self.projection(now),
+            "anchored_at": self.anchor["at"] if self.anchor else None,
+            "counter_resets": self.resets,
+            "hourly": [[k] + v for k, v in sorted(self.hourly.items())[-24:]],
+            "daily": [[k] + v for k, v in sorted(self.daily.items())[-31:]]
+        }
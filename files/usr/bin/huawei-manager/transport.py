@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+HTTP transport for Huawei Manager.
+One place that builds the requests session every script hands to
+huawei_lte_api: pooled keep-alive connections, connect/read timeouts per
+kind of endpoint, and retries for idempotent GETs only.
+
+With HUAWEI_MANAGER_TRACE set to a file path, every modem request and its
+response are appended to that file as JSON lines (credentials and device
+identifiers redacted), for replay with tools/modem_replay.py.
+"""
+import os
+import re
+import json
+import time
+import fcntl
+import requests
+import urllib3
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Modems use self-signed certificates, verification is off for every session
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# A modem on the LAN answers a TCP connect within milliseconds
+CONNECT_TIMEOUT = 1.0
+# Read timeouts by endpoint class
+READ_TIMEOUT = 8
+WRITE_TIMEOUT = 15
+# Endpoints that are slow by nature (seconds to read): the operator scan,
+# and writes the modem answers only once it re-attached or acted
+SLOW_READS = {
+    "/api/net/plmn-list": 90,
+}
+SLOW_WRITES = {
+    "/api/net/net-mode": 30,
+    "/api/dialup/mobile-dataswitch": 30,
+    "/api/dialup/dial": 30,
+    "/api/sms/send-sms": 30,
+}
+
+TRACE_ENV = "HUAWEI_MANAGER_TRACE"
+# Element values that never reach a trace
+REDACTED_ELEMENTS = ("Username", "Password", "SesInfo", "TokInfo", "Imei", "Imsi",
+                     "Iccid", "SerialNumber", "Msisdn")
+REDACTED_XML = re.compile(r"<(%s)>[^<]*</\1>" % "|".join(REDACTED_ELEMENTS))
+CSRF_META = re.compile(r'(name="csrf_token" content=")[^"]*(")')
+# Response headers the client needs back on replay
+TRACE_HEADERS = ("content-type", "set-cookie", "__requestverificationtoken",
+                 "__requestverificationtokenone", "__requestverificationtokentwo")
+
+
+def redact(text):
+    text = REDACTED_XML.sub(lambda m: f"<{m.group(1)}>redacted</{m.group(1)}>", text)
+    return CSRF_META.sub(r"\1redacted\2", text)
+
+
+class TraceRecorder:
+    """Appends request/response pairs to a JSON lines file shared by all processes."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _header(self, name, value):
+        if name.lower() == "set-cookie":
+            # Keep the cookie name so replay hands the client a session
+            return re.sub(r"=[^;]*", "=redacted", value, count=1)
+        if name.lower().startswith("__requestverificationtoken"):
+            return "redacted"
+        return value
+
+    def record(self, method, url, body, started, response=None, error=None):
+        parsed = urlparse(url)
+        entry = {
+            "t": round(started, 3),
+            "ms": round((time.time() - started) * 1000, 1),
+            "pid": os.getpid(),
+            "method": method.upper(),
+            "path": parsed.path,
+        }
+        if parsed.query:
+            entry["query"] = parsed.query
+        if body:
+            entry["req"] = redact(body.decode("utf-8", "replace") if isinstance(body, bytes) else str(body))
+        if response is not None:
+            entry["status"] = response.status_code
+            entry["headers"] = {k: self._header(k, v) for k, v in response.headers.items()
+                                if k.lower() in TRACE_HEADERS}
+            entry["body"] = redact(response.text)
+        else:
+            entry["error"] = error
+        try:
+            with open(self.path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass  # Tracing must never break modem access
+
+
+def endpoint_timeout(method, url):
+    """(connect, read) timeout for a request."""
+    path = urlparse(url).path.rstrip("/")
+    if method.upper() == "GET":
+        return CONNECT_TIMEOUT, SLOW_READS.get(path, READ_TIMEOUT)
+    return CONNECT_TIMEOUT, SLOW_WRITES.get(path, WRITE_TIMEOUT)
+
+
+class ModemTransport(requests.Session):
+    """
+    requests session for the modem. huawei_lte_api passes its own timeout
+    (None unless configured); a missing one is filled in per endpoint.
+    """
+
+    def __init__(self):
+        super().__init__()
+        trace_path = os.environ.get(TRACE_ENV)
+        self.recorder = TraceRecorder(trace_path) if trace_path else None
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = endpoint_timeout(method, url)
+        if not self.recorder:
+            return super().request(method, url, *args, **kwargs)
+
+        started = time.time()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(method, url, kwargs.get("data"), started, error=str(e))
+            raise
+        self.recorder.record(method, url, kwargs.get("data"), started, response)
+        return response
+
+
+def new_session(pool_size=1):
+    """
+    Session for one modem. `pool_size` is the number of requests the caller
+    may run at once; more would open throwaway connections.
+    """
+    # Reads are retried on dropped connections and gateway errors, never
+    # POSTs: they consume CSRF tokens and may already have taken effect.
+    # A refused or timed-out connect is not retried, so a dead modem fails
+    # after CONNECT_TIMEOUT.
+    retry = Retry(total=2, connect=0, read=1, status=2, backoff_factor=0.3,
+                  status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET"]),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = ModemTransport()
+    session.verify = False
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
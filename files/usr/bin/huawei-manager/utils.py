@@ -2,6 +2,7 @@
 """
 Utility functions for Huawei Manager.
 """
+import os
 import subprocess
 import urllib.request
 import urllib.parse
@@ -13,6 +14,9 @@ import json
 import ssl
 
 UCI_PACKAGE = "huawei-manager"
+# Overrides the Telegram Bot API base URL, e.g. a local stand-in for testing
+TELEGRAM_API_ENV = "HUAWEI_MANAGER_TELEGRAM_API"
+TELEGRAM_API = "https://api.telegram.org"
 
 def uci_get(section, option, default=None):
     """Get a UCI option value."""
@@ -40,6 +44,27 @@ def uci_get_list(section, option):
         pass
     return []
 
+def parse_modem_url(url, username, password):
+    """
+    Split credentials embedded in a modem URL and apply the HTTPS
+    conversion some modems need.
+
+    Returns:
+        tuple: (clean_url, username, password)
+    """
+    parsed_url = urllib.parse.urlparse(url)
+    if parsed_url.username:
+        username = parsed_url.username
+        password = parsed_url.password or password
+        url = f"{parsed_url.scheme}://{parsed_url.hostname}"
+        if parsed_url.port:
+            url += f":{parsed_url.port}"
+        url += parsed_url.path or "/"
+
+    if url.startswith('http://') and '192.168.7.1' in url:
+        url = url.replace('http://', 'https://')
+    return url, username, password
+
 def check_internet_connectivity(timeout=5, logger=None):
     """
     Check if internet is available before attempting Telegram send.
@@ -128,8 +153,10 @@ def send_telegram(bot_token, chat_id, message, max_retries=8, logger=None,
         log_debug(f"Waiting {initial_delay}s before sending Telegram notification")
         time.sleep(initial_delay)
     
-    # Pre-connection check
-    if check_connection:
+    api = os.environ.get(TELEGRAM_API_ENV) or TELEGRAM_API
+
+    # Pre-connection check (a local stand-in API needs no internet)
+    if check_connection and api == TELEGRAM_API:
         connectivity_retries = 3
         for i in range(connectivity_retries):
             if check_internet_connectivity(timeout=3, logger=logger):
@@ -141,7 +168,7 @@ def send_telegram(bot_token, chat_id, message, max_retries=8, logger=None,
             log_error("Internet connectivity not available after retries")
             # Continue anyway, the main retry loop will handle it
     
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    url = f"{api}/bot{bot_token}/sendMessage"
     data = urllib.parse.urlencode({
         'chat_id': chat_id,
         'text': message,
@@ -36,6 +36,11 @@ function index()
     entry({"admin", "modem", "huawei-manager", "api", "clear_logs"}, call("action_clear_logs")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "reconnect"}, call("action_reconnect")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "devices"}, call("action_devices")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "openmetrics"}, call("action_openmetrics")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "jobs"}, call("action_jobs")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "fleet"}, call("action_fleet")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "cells"}, call("action_cells")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "events"}, call("action_events")).leaf = true
     
     -- Modem API endpoints
     entry({"admin", "modem", "huawei-manager", "api", "modem", "info"}, call("action_modem_info")).leaf = true
@@ -43,10 +48,12 @@ function index()
     entry({"admin", "modem", "huawei-manager", "api", "modem", "toggle_data"}, call("action_modem_toggle_data")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "modem", "bands"}, call("action_modem_bands")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "modem", "bands_list"}, call("action_modem_bands_list")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "modem", "band_sweep"}, call("action_modem_band_sweep")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "modem", "apn"}, call("action_modem_apn")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "modem", "apn_create"}, call("action_modem_apn_create")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "modem", "apn_delete"}, call("action_modem_apn_delete")).leaf = true
     entry({"admin", "modem", "huawei-manager", "api", "modem", "apn_default"}, call("action_modem_apn_default")).leaf = true
+    entry({"admin", "modem", "huawei-manager", "api", "modem", "cache_stats"}, call("action_modem_cache_stats")).leaf = true
     
     -- SMS API endpoints
     entry({"admin", "modem", "huawei-manager", "api", "modem", "sms_list"}, call("action_modem_sms_list")).leaf = true
@@ -69,7 +76,7 @@ local function get_device_config(section_id)
     return uci:get_all("huawei-manager", section_id)
 end
 
-local function exec_modem_api(section_id, action, data_json)
+local function run_modem_api(section_id, args)
     local config = get_device_config(section_id)
     if not config then
         return {success = false, error = "Device not found"}
@@ -79,15 +86,19 @@ local function exec_modem_api(section_id, action, data_json)
     local username = config.modem_username or "admin"
     local password = config.modem_password or "admin"
     
-    data_json = data_json or "{}"
+    -- Modem traffic recording (globals.trace_file), same file as the daemon
+    local uci = require "luci.model.uci".cursor()
+    local trace_file = uci:get("huawei-manager", "globals", "trace_file")
+    local env = (trace_file and trace_file ~= "") and ("HUAWEI_MANAGER_TRACE=" .. escape_shell(trace_file) .. " ") or ""
     
     local cmd = string.format(
-        "python3 /usr/bin/huawei-manager/modem_api.py %s --username %s --password %s --action %s --data %s 2>&1",
+        "%spython3 /usr/bin/huawei-manager/modem_api.py %s --username %s --password %s %s%s 2>&1",
+        env,
         escape_shell(url),
         escape_shell(username),
         escape_shell(password),
-        escape_shell(action),
-        escape_shell(data_json)
+        args,
+        config.session_cache == "1" and " --session-cache" or ""
     )
     
     local output = luci.util.exec(cmd)
@@ -103,9 +114,104 @@ local function exec_modem_api(section_id, action, data_json)
     end
 end
 
+local function exec_modem_api(section_id, action, data_json, sections)
+    return run_modem_api(section_id, string.format("--action %s --data %s%s",
+        escape_shell(action),
+        escape_shell(data_json or "{}"),
+        (sections and sections ~= "") and (" --sections " .. escape_shell(sections)) or ""
+    ))
+end
+
+-- Run several actions over one modem login. Returns the step results, in order.
+local function exec_modem_batch(section_id, steps)
+    local json = require "luci.jsonc"
+    local result = run_modem_api(section_id, "--batch " .. escape_shell(json.stringify(steps)))
+    if result.data and result.data.steps then
+        return result.data.steps
+    end
+    return {{success = false, error = result.error or "Batch failed"}}
+end
+
+-- Run an APN write; with refresh=1 the updated profile list comes back in the same login
+local function exec_apn_write(section_id, action, data)
+    local json = require "luci.jsonc"
+    if luci.http.formvalue("refresh") ~= "1" then
+        return exec_modem_api(section_id, action, json.stringify(data))
+    end
+    local steps = exec_modem_batch(section_id, {
+        {action = action, data = data},
+        {action = "apn_list"}
+    })
+    local write, list = steps[1], steps[2]
+    return {
+        success = write.success,
+        data = write.data,
+        error = write.error,
+        profiles = list and list.success and list.data or nil
+    }
+end
+
+-- Query the daemon's local HTTP API. With a form body the request is a POST.
+-- Returns status code and body, or nil.
+local function daemon_request(path, timeout, form)
+    local uci = require "luci.model.uci".cursor()
+    local port = tonumber(uci:get("huawei-manager", "globals", "api_port") or "9778") or 9778
+    if port <= 0 then
+        return nil
+    end
+
+    local sock = nixio.socket("inet", "stream")
+    if not sock then
+        return nil
+    end
+    sock:setopt("socket", "rcvtimeo", timeout or 5)
+    sock:setopt("socket", "sndtimeo", 5)
+
+    if not sock:connect("127.0.0.1", port) then
+        sock:close()
+        return nil
+    end
+
+    if form then
+        sock:writeall("POST " .. path .. " HTTP/1.0\r\nHost: 127.0.0.1\r\n" ..
+            "Content-Type: application/x-www-form-urlencoded\r\n" ..
+            "Content-Length: " .. #form .. "\r\n\r\n" .. form)
+    else
+        sock:writeall("GET " .. path .. " HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n")
+    end
+
+    local chunks = {}
+    while true do
+        local chunk = sock:recv(8192)
+        if not chunk or #chunk == 0 then
+            break
+        end
+        table.insert(chunks, chunk)
+    end
+    sock:close()
+
+    local raw = table.concat(chunks)
+    local code, body = raw:match("^HTTP/%d%.%d (%d+).-\r\n\r\n(.*)$")
+    if not code then
+        return nil
+    end
+    return tonumber(code), body
+end
+
+-- Viewer heartbeat: the daemon keeps polling a device at full speed while
+-- a page showed it recently (".all" stands for every device)
+local function note_viewer(section_id)
+    nixio.fs.mkdir("/tmp/huawei-manager-viewers")
+    local file = io.open("/tmp/huawei-manager-viewers/" .. section_id, "w")
+    if file then
+        file:close()
+    end
+end
+
 -- ===== Status API =====
 
 function action_status()
+    note_viewer(".all")
     local file = io.open("/tmp/huawei-manager.status", "r")
     local status = "{}"
     if file then
@@ -129,7 +235,56 @@ function action_metrics()
     luci.http.write(metrics)
 end
 
+function action_openmetrics()
+    local code, body = daemon_request("/metrics")
+    if not code then
+        luci.http.status(503, "Service Unavailable")
+        luci.http.prepare_content("text/plain")
+        luci.http.write("Daemon API not reachable\n")
+        return
+    end
+
+    luci.http.status(code, code == 200 and "OK" or "Error")
+    luci.http.prepare_content("application/openmetrics-text; version=1.0.0; charset=utf-8")
+    luci.http.write(body)
+end
+
 function action_logs()
+    -- Server-side query across current and rotated log files
+    local args = {}
+    local level = luci.http.formvalue("level") or "all"
+    if level:match("^%a+$") then
+        table.insert(args, "--level " .. escape_shell(level))
+    end
+    local device = luci.http.formvalue("device")
+    if device and device ~= "" then
+        table.insert(args, "--device " .. escape_shell(device))
+    end
+    local text = luci.http.formvalue("q")
+    if text and text ~= "" then
+        table.insert(args, "--text " .. escape_shell(text))
+    end
+    for _, name in ipairs({"since", "until", "limit"}) do
+        local value = tonumber(luci.http.formvalue(name) or "")
+        if value then
+            table.insert(args, "--" .. name .. " " .. string.format("%d", value))
+        end
+    end
+    local cursor = luci.http.formvalue("cursor")
+    if cursor and cursor:match("^%d+:%d+$") then
+        table.insert(args, "--cursor " .. cursor)
+    end
+
+    local output = luci.util.exec("python3 /usr/bin/huawei-manager/log_query.py " .. table.concat(args, " ") .. " 2>/dev/null")
+    local json = require "luci.jsonc"
+    local result = json.parse(output or "")
+    if result then
+        luci.http.prepare_content("application/json")
+        luci.http.write(output)
+        return
+    end
+
+    -- Fallback: last raw lines of the current file
     local logs = {}
     local file = io.open("/var/log/huawei-manager.log", "r")
     
@@ -232,6 +387,173 @@ function action_reconnect()
     })
 end
 
+-- Summary of every device in one response, built by the daemon from memory.
+-- Optional: fields=ip,rsrp,... and device=id1,id2
+function action_fleet()
+    local fields = luci.http.formvalue("fields") or ""
+    local devices = luci.http.formvalue("device") or ""
+    luci.http.prepare_content("application/json")
+    if not fields:match("^[%w_,]*$") or not devices:match("^[%w_@%[%],]*$") then
+        luci.http.status(400, "Bad Request")
+        luci.http.write_json({error = "Invalid parameters"})
+        return
+    end
+
+    note_viewer(".all")
+    local code, body = daemon_request("/fleet?fields=" .. fields .. "&device=" .. devices, 5)
+    if not code then
+        luci.http.status(503, "Service Unavailable")
+        luci.http.write_json({success = false, error = "Daemon not running"})
+        return
+    end
+    if code ~= 200 then
+        luci.http.status(code, "Error")
+    end
+    luci.http.write(body)
+end
+
+-- Cell, band, CA, mode, PLMN and IP changes of a device, kept by the daemon.
+-- Optional: since=<unix time>, kinds=cell,ip,... limit=<n>, window=<seconds> (correlation)
+function action_cells()
+    local section_id = luci.http.formvalue("device") or ""
+    local since = luci.http.formvalue("since") or ""
+    local kinds = luci.http.formvalue("kinds") or ""
+    local limit = luci.http.formvalue("limit") or ""
+    local window = luci.http.formvalue("window") or ""
+    luci.http.prepare_content("application/json")
+    if not section_id:match("^[%w_@%[%]]+$") or not kinds:match("^[%a,]*$")
+        or not since:match("^[%d.]*$") or not limit:match("^%d*$") or not window:match("^%d*$") then
+        luci.http.status(400, "Bad Request")
+        luci.http.write_json({error = "Invalid parameters"})
+        return
+    end
+
+    local code, body = daemon_request(string.format("/cells?device=%s&since=%s&kinds=%s&limit=%s&window=%s",
+        section_id, since, kinds, limit, window), 5)
+    if not code then
+        luci.http.status(503, "Service Unavailable")
+        luci.http.write_json({success = false, error = "Daemon not running"})
+        return
+    end
+    if code ~= 200 then
+        luci.http.status(code, "Error")
+    end
+    luci.http.write(body)
+end
+
+-- Typed daemon events after a sequence number. Never long-polls: that would
+-- hold a uhttpd worker, so pages poll on a timer (direct clients may use wait=)
+function action_events()
+    local since = luci.http.formvalue("since") or ""
+    local types = luci.http.formvalue("types") or ""
+    local section_id = luci.http.formvalue("device") or ""
+    local limit = luci.http.formvalue("limit") or ""
+    local stream = luci.http.formvalue("stream") or ""
+    luci.http.prepare_content("application/json")
+    if not since:match("^%d*$") or not types:match("^[%a_,]*$") or not section_id:match("^[%w_@%[%]]*$")
+        or not limit:match("^%d*$") or not stream:match("^%x*$") then
+        luci.http.status(400, "Bad Request")
+        luci.http.write_json({error = "Invalid parameters"})
+        return
+    end
+
+    local path = string.format("/events?since=%s&types=%s&limit=%s&stream=%s", since, types, limit, stream)
+    if section_id ~= "" then
+        path = path .. "&device=" .. section_id
+    end
+    local code, body = daemon_request(path, 5)
+    if not code then
+        luci.http.status(503, "Service Unavailable")
+        luci.http.write_json({success = false, error = "Daemon not running"})
+        return
+    end
+    if code ~= 200 then
+        luci.http.status(code, "Error")
+    end
+    luci.http.write(body)
+end
+
+-- ===== Jobs =====
+
+-- Submit a daemon job. Returns the decoded daemon reply and its status code
+-- (429 when the job queue is full), or nil if the daemon is unreachable.
+local function submit_job(section_id, kind, params)
+    local form = "device=" .. section_id .. "&kind=" .. kind
+    for name, value in pairs(params or {}) do
+        form = form .. "&" .. name .. "=" .. value
+    end
+    -- A band sweep reads the modem's band list first to size its timeout
+    local code, body = daemon_request("/jobs/submit", kind == "band_sweep" and 35 or 5, form)
+    if not code then
+        return nil
+    end
+    local json = require "luci.jsonc"
+    return json.parse(body) or {success = false, error = "Invalid daemon response"}, code
+end
+
+-- Long operations run as daemon jobs: submit=1 queues one, id=... reports it,
+-- otherwise recent jobs are listed. Replies never wait: a long-poll would hold a
+-- uhttpd worker for the whole job, so pages poll on a timer (only direct daemon
+-- clients use /job?wait=).
+function action_jobs()
+    local section_id = luci.http.formvalue("device") or ""
+    local job_id = luci.http.formvalue("id") or ""
+    if not section_id:match("^[%w_@%[%]]*$") or not job_id:match("^%x*$") then
+        luci.http.status(400, "Bad Request")
+        luci.http.prepare_content("application/json")
+        luci.http.write_json({error = "Invalid parameters"})
+        return
+    end
+
+    luci.http.prepare_content("application/json")
+    if luci.http.formvalue("submit") == "1" then
+        local kind = luci.http.formvalue("kind") or ""
+        local params = {}
+        for _, name in ipairs({"window", "pairs", "apply", "op", "ids"}) do
+            local value = luci.http.formvalue(name)
+            if value then
+                if not value:match("^[%w_,]*$") then
+                    luci.http.status(400, "Bad Request")
+                    luci.http.write_json({error = "Invalid parameters"})
+                    return
+                end
+                params[name] = value
+            end
+        end
+        if section_id == "" or not kind:match("^[%w_]+$") then
+            luci.http.status(400, "Bad Request")
+            luci.http.write_json({error = "Missing device or kind"})
+            return
+        end
+        local result, code = submit_job(section_id, kind, params)
+        if not result then
+            luci.http.status(503, "Service Unavailable")
+            luci.http.write_json({success = false, error = "Daemon not running"})
+            return
+        end
+        if code ~= 200 then
+            luci.http.status(code, "Error")
+        end
+        luci.http.write_json(result)
+        return
+    end
+
+    local path
+    if job_id ~= "" then
+        path = string.format("/job?id=%s&offset=%d", job_id,
+            tonumber(luci.http.formvalue("offset") or "0") or 0)
+    else
+        path = "/jobs" .. (section_id ~= "" and ("?device=" .. section_id) or "")
+    end
+    local code, body = daemon_request(path, 5)
+    if not code then
+        luci.http.status(503, "Service Unavailable")
+        luci.http.write_json({success = false, error = "Daemon not running"})
+        return
+    end
+    luci.http.write(body)
+end
+
 -- ===== Modem API =====
 
 function action_modem_info()
@@ -242,13 +564,32 @@ function action_modem_info()
         luci.http.write_json({error = "Missing device parameter"})
         return
     end
+
+    -- Comma-separated info sections the page renders (empty: all)
+    local sections = luci.http.formvalue("sections") or ""
+    if not section_id:match("^[%w_@%[%]]+$") or not sections:match("^[%w_,]*$") then
+        luci.http.status(400, "Bad Request")
+        luci.http.prepare_content("application/json")
+        luci.http.write_json({error = "Invalid parameters"})
+        return
+    end
+
+    note_viewer(section_id)
+
+    -- The daemon answers from its last poll and fetches only what it lacks
+    local code, body = daemon_request("/info?device=" .. section_id .. "&sections=" .. sections, 35)
+    if code == 200 then
+        luci.http.prepare_content("application/json")
+        luci.http.write(body)
+        return
+    end
     
     -- Optimization: Try to read from daemon cache first
     local cache_file = "/tmp/huawei-manager-status_" .. section_id .. ".json"
     local stat = nixio.fs.stat(cache_file)
     
     -- If cache exists and is fresh (< 20 seconds)
-    if stat and (os.time() - stat.mtime < 20) then
+    if sections == "" and stat and (os.time() - stat.mtime < 20) then
         local file = io.open(cache_file, "r")
         if file then
             local cached_json = file:read("*all")
@@ -261,8 +602,12 @@ function action_modem_info()
         end
     end
     
-    -- Fallback/Slow Path: Execute python script
-    local result = exec_modem_api(section_id, "info", nil)
+    -- Fallback/Slow Path: Execute python script ("usage" only exists in the daemon)
+    local modem_sections = sections:gsub("usage", ""):gsub(",+", ","):gsub("^,", ""):gsub(",$", "")
+    -- A recent cached answer is served at once while one refresh runs behind it
+    local result = run_modem_api(section_id, string.format("--action info --stale-ok%s",
+        (modem_sections ~= "") and (" --sections " .. escape_shell(modem_sections)) or ""
+    ))
     luci.http.prepare_content("application/json")
     luci.http.write_json(result)
 end
@@ -342,6 +687,62 @@ function action_modem_bands_list()
     luci.http.write_json(result)
 end
 
+-- Start a band sweep in the background (start=1), or report its progress and stored results
+function action_modem_band_sweep()
+    local section_id = luci.http.formvalue("device")
+    if not section_id or not section_id:match("^[%w_@%[%]]+$") then
+        luci.http.status(400, "Bad Request")
+        luci.http.prepare_content("application/json")
+        luci.http.write_json({error = "Missing or invalid device parameter"})
+        return
+    end
+
+    local config = get_device_config(section_id)
+    if not config then
+        luci.http.status(404, "Not Found")
+        luci.http.prepare_content("application/json")
+        luci.http.write_json({error = "Device not found"})
+        return
+    end
+
+    local cmd = string.format(
+        "python3 /usr/bin/huawei-manager/band_sweep.py %s --username %s --password %s",
+        escape_shell(config.modem_url or "http://192.168.8.1/"),
+        escape_shell(config.modem_username or "admin"),
+        escape_shell(config.modem_password or "admin")
+    )
+
+    luci.http.prepare_content("application/json")
+    if luci.http.formvalue("start") == "1" then
+        local window = tonumber(luci.http.formvalue("window") or "30") or 30
+        window = math.max(10, math.min(window, 300))
+        local pairs_flag = luci.http.formvalue("pairs") == "1"
+        local restore = luci.http.formvalue("apply") == "restore"
+        local job, code = submit_job(section_id, "band_sweep", {
+            window = tostring(window),
+            pairs = pairs_flag and "1" or "0",
+            apply = restore and "restore" or "best"
+        })
+        if job then
+            if code ~= 200 then
+                luci.http.status(code, "Error")
+            end
+            luci.http.write_json({success = job.success, started = job.success, job = job.job, error = job.error})
+            return
+        end
+        -- No daemon: run detached. Sweeps take minutes; the lease keeps a second one from overlapping
+        local extra = string.format(" --window %d%s%s --source luci", window,
+            pairs_flag and " --pairs" or "", restore and " --apply restore" or "")
+        os.execute("(" .. cmd .. extra .. " >/dev/null 2>&1 &)")
+        luci.http.write_json({success = true, started = true})
+        return
+    end
+
+    local json = require "luci.jsonc"
+    local output = luci.util.exec(cmd .. " --show 2>&1")
+    luci.http.write_json(json.parse(output) or {success = false, error = "Failed to parse response", raw = output})
+end
+
 function action_modem_apn()
     local section_id = luci.http.formvalue("device")
     if not section_id then
@@ -371,14 +772,13 @@ function action_modem_apn_create()
         return
     end
     
-    local json = require "luci.jsonc"
-    local result = exec_modem_api(section_id, "apn_create", json.stringify({
+    local result = exec_apn_write(section_id, "apn_create", {
         name = name,
         apn = apn,
         username = username,
         password = password,
         auth_type = auth_type
-    }))
+    })
     luci.http.prepare_content("application/json")
     luci.http.write_json(result)
 end
@@ -394,8 +794,7 @@ function action_modem_apn_delete()
         return
     end
     
-    local json = require "luci.jsonc"
-    local result = exec_modem_api(section_id, "apn_delete", json.stringify({profile_id = profile_id}))
+    local result = exec_apn_write(section_id, "apn_delete", {profile_id = profile_id})
     luci.http.prepare_content("application/json")
     luci.http.write_json(result)
 end
@@ -411,8 +810,21 @@ function action_modem_apn_default()
         return
     end
     
-    local json = require "luci.jsonc"
-    local result = exec_modem_api(section_id, "apn_default", json.stringify({profile_id = profile_id}))
+    local result = exec_apn_write(section_id, "apn_default", {profile_id = profile_id})
+    luci.http.prepare_content("application/json")
+    luci.http.write_json(result)
+end
+
+function action_modem_cache_stats()
+    local section_id = luci.http.formvalue("device")
+    if not section_id then
+        luci.http.status(400, "Bad Request")
+        luci.http.prepare_content("application/json")
+        luci.http.write_json({error = "Missing device parameter"})
+        return
+    end
+    
+    local result = exec_modem_api(section_id, "cache_stats", nil)
     luci.http.prepare_content("application/json")
     luci.http.write_json(result)
 end
@@ -43,6 +43,24 @@ o = s:taboption("general", Value, "modem_password", "Modem Password")
 o.password = true
 o.rmempty = true
 
+-- Request Budget
+o = s:taboption("general", Value, "request_budget", "Request Budget (per minute)", "Maximum modem requests per minute, shared by monitoring and manual actions")
+o.datatype = "uinteger"
+o.default = "30"
+o.placeholder = "30"
+o.rmempty = true
+
+-- Section Intervals
+o = s:taboption("general", DynamicList, "section_intervals", "Section Intervals",
+    "Refresh cadence of slow-changing dashboard data as section=seconds, or section=once (e.g. plmn=60, net_mode=60, device=once). Other sections are fetched on every check.")
+o.placeholder = "plmn=60"
+o.rmempty = true
+
+-- Session Cache
+o = s:taboption("general", Flag, "session_cache", "Reuse Login Session", "Keep the modem login session between requests instead of logging in every time. Recommended for firmware that limits logins.")
+o.default = "0"
+o.rmempty = false
+
 -- ============ IP Agent Tab ============
 
 -- Enable IP Agent
@@ -63,6 +81,14 @@ o.default = "10"
 o.placeholder = "10"
 o.rmempty = true
 
+-- Idle Interval
+o = s:taboption("ipagent", Value, "idle_interval", "Idle Interval (seconds)",
+    "With IP Agent disabled, poll this often while no dashboard or IP Agent page is open. 0 always uses the check interval.")
+o.datatype = "uinteger"
+o.default = "60"
+o.placeholder = "60"
+o.rmempty = true
+
 
 -- Reconnect Method
 o = s:taboption("ipagent", ListValue, "reconnect_method", "Reconnection Method", "Try 'Network Mode Switch' if Data Toggle fails to change IP")
@@ -105,6 +131,47 @@ o.default = "1"
 o = s:taboption("telegram", Flag, "telegram_notify_error", "Notify on Errors")
 o.default = "0"
 
+-- ============ SMS Rules ============
+s = m:section(TypedSection, "sms_rule", "SMS Rules",
+    "Applied by the daemon to new inbox messages, in order. Messages already in the inbox when rules are enabled are left alone.")
+s.anonymous = true
+s.addremove = true
+s.novaluetext = "No SMS rules configured."
+
+o = s:option(Flag, "enabled", "Enabled")
+o.default = "1"
+o.rmempty = false
+
+o = s:option(Value, "name", "Rule Name")
+o.placeholder = "Bank alerts"
+o.rmempty = false
+
+o = s:option(Value, "sender", "Sender", "Comma-separated sender patterns, * as wildcard (e.g. BANK*,+62811*). Empty matches any sender.")
+o.rmempty = true
+
+o = s:option(Value, "match", "Content Match", "Regular expression searched in the message text, case-insensitive. Empty matches any text.")
+o.rmempty = true
+
+o = s:option(MultiValue, "action", "Actions")
+o:value("forward", "Forward to Telegram")
+o:value("read", "Mark as read")
+o:value("delete", "Delete")
+o:value("tag", "Tag")
+o.widget = "checkbox"
+o.rmempty = false
+
+o = s:option(Value, "tag", "Tag", "Label recorded for matching messages (default: rule name)")
+o.rmempty = true
+o:depends({action = "tag"})
+
+o = s:option(DynamicList, "device", "Devices", "Limit the rule to these devices (empty: all)")
+m.uci:foreach("huawei-manager", "device", function(dev)
+    o:value(dev[".name"], dev.name or dev[".name"])
+end)
+
+o = s:option(Flag, "stop", "Stop Here", "Do not apply later rules to a message this rule matched")
+o.default = "0"
+
 function m.on_after_commit(map)
     luci.sys.call("/etc/init.d/huawei-manager restart >/dev/null 2>&1")
 end
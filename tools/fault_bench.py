@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Fault-injection benchmark for Huawei Manager.
+Runs the daemon's DeviceMonitor (IP Agent on) in-process against
+tools/fault_modem.py and a fake Telegram endpoint, one fault profile at a
+time, and reports how poll throughput, time-to-target-IP and notification
+delay hold up. After each target IP the stand-in drops to a non-target IP
+again, so every run collects several hunts.
+
+Each profile runs in its own process, with its own modem port and state
+directory. Development tool, not installed on the router.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+from fault_modem import PROFILES, FaultSchedule, start_modem, start_telegram
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files", "usr", "bin", "huawei-manager")
+DEVICE = "bench"
+# Seconds a target IP is held before the stand-in drops it again
+HOLD = 10
+
+
+def summary(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {"n": len(values), "median": round(statistics.median(values), 1),
+            "max": round(ordered[-1], 1)}
+
+
+def faulty_subprocess(schedule):
+    """subprocess stand-in for the daemon that truncates some modem_api.py output."""
+    def run(cmd, *args, **kwargs):
+        result = subprocess.run(cmd, *args, **kwargs)
+        if any(str(part).endswith("modem_api.py") for part in cmd[:2]) and result.stdout:
+            kind, magnitude = schedule.draw("output", ("truncated",))
+            if kind:
+                result.stdout = result.stdout[:int(len(result.stdout) * magnitude)]
+        return result
+    return SimpleNamespace(run=run, TimeoutExpired=subprocess.TimeoutExpired, PIPE=subprocess.PIPE)
+
+
+def isolate(daemon, state_dir):
+    """Keep the daemon's files and log output away from a real installation."""
+    for name in ("STATUS_FILE", "METRICS_FILE", "TRAFFIC_FILE", "CELLS_FILE"):
+        path = os.path.join(state_dir, os.path.basename(getattr(daemon, name)))
+        setattr(daemon, name, path)
+        setattr(daemon, f"{name}_TMP", f"{path}.tmp")
+    daemon.STATUS_FILE_DIR = state_dir
+    daemon.VIEWER_DIR = os.path.join(state_dir, "viewers")
+    daemon.SMS_STATE_FILE = os.path.join(state_dir, "sms")
+    daemon.EVENTS_FILE = os.path.join(state_dir, "events")
+    daemon.SCRIPT_DIR = SCRIPTS
+    if daemon.file_handler:
+        daemon.logger.removeHandler(daemon.file_handler)
+    daemon.logger.setLevel("WARNING")
+
+
+def run_profile(profile, seed, duration, interval, p_target):
+    sys.path.insert(0, SCRIPTS)
+    import ip_agent_daemon as daemon
+    from scheduler import PollScheduler
+
+    schedule = FaultSchedule(profile, seed)
+    modem_server, modem = start_modem(schedule, seed, p_target)
+    telegram_server, telegram = start_telegram(schedule)
+    # Scripts run as 'python3' from PATH: make that this interpreter
+    os.environ["PATH"] = os.path.dirname(sys.executable) + os.pathsep + os.environ.get("PATH", "")
+    os.environ["HUAWEI_MANAGER_TELEGRAM_API"] = f"http://127.0.0.1:{telegram_server.server_address[1]}"
+    os.environ.pop("HUAWEI_MANAGER_TRACE", None)
+
+    isolate(daemon, tempfile.mkdtemp(prefix="hm-fault-"))
+    if "truncated" in schedule.rates:
+        daemon.subprocess = faulty_subprocess(schedule)
+
+    queued = []
+    queue_notification = daemon.queue_notification
+
+    def record_queued(name, bot_token, chat_id, message, initial_delay=0, **kwargs):
+        queued.append((time.time(), message, initial_delay))
+        queue_notification(name, bot_token, chat_id, message, initial_delay, **kwargs)
+    daemon.queue_notification = record_queued
+
+    daemon.poll_scheduler = PollScheduler(2)
+    daemon.poll_scheduler.register([(DEVICE, interval)])
+    daemon.threading.Thread(target=daemon.notification_worker, daemon=True).start()
+    monitor = daemon.DeviceMonitor(DEVICE, {
+        "name": "Bench",
+        "ipagent_enabled": True,
+        "modem_url": f"http://127.0.0.1:{modem_server.server_address[1]}/",
+        "modem_username": "admin",
+        "modem_password": "bench",
+        "check_interval": str(interval),
+        "idle_interval": "0",
+        "reconnect_method": "data",
+        "session_cache": "1",
+        "request_budget": "600",
+        "target_prefixes": ["10.1"],
+        "telegram_enabled": "1",
+        "telegram_bot_token": "0:bench",
+        "telegram_chat_id": "1",
+    })
+
+    started = time.time()
+    monitor.start()
+    hunt_started, held_since, hunts = started, None, []
+    while time.time() - started < duration:
+        time.sleep(0.2)
+        with daemon.status_lock:
+            status = dict(daemon.global_statuses.get(DEVICE) or {})
+        on_target = status.get("status") == "Connected (Target)" and status.get("current_ip") == modem.ip
+        if hunt_started is not None and on_target:
+            hunts.append(time.time() - hunt_started)
+            hunt_started, held_since = None, time.time()
+        elif held_since is not None and time.time() - held_since >= HOLD:
+            modem.kick()
+            hunt_started, held_since = time.time(), None
+    elapsed = time.time() - started
+    monitor.stop()
+    daemon.shutdown_event.set()
+
+    with daemon.runtime_lock:
+        runtime = dict(daemon.global_runtime.get(DEVICE) or {})
+    polls = runtime.get("poll_count", 0)
+    failures = runtime.get("poll_failures", 0)
+    delivered = {text: at for at, text in telegram.delivered}
+    delays = [delivered[message] - at - initial_delay for at, message, initial_delay in queued
+              if message in delivered]
+    return {
+        "profile": profile,
+        "seed": seed,
+        "seconds": round(elapsed),
+        "polls_per_min": round(polls * 60 / elapsed, 1),
+        "poll_success": round((polls - failures) / polls, 3) if polls else None,
+        "poll_seconds": round(runtime.get("poll_seconds_sum", 0.0) / polls, 2) if polls else None,
+        "hunts": len(hunts),
+        "time_to_target_s": summary(hunts),
+        "reconnects": modem.reconnects,
+        "logins": modem.logins,
+        "notifications": len(queued),
+        "notifications_lost": len(queued) - len(delays),
+        # Delivery time after the daemon's deliberate initial delay
+        "notification_delay_s": summary(delays),
+        "telegram_attempts": telegram.attempts,
+        "injected": dict(schedule.injected),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the daemon under injected modem and Telegram faults")
+    parser.add_argument("--profile", choices=sorted(PROFILES) + ["all"], default="all")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--duration", type=int, default=300, help="Seconds per profile")
+    parser.add_argument("--interval", type=int, default=5, help="Daemon check interval")
+    parser.add_argument("--p-target", type=float, default=0.4,
+                        help="Chance that a reconnect yields a target IP")
+    args = parser.parse_args()
+
+    if args.profile != "all":
+        print(json.dumps(run_profile(args.profile, args.seed, args.duration, args.interval, args.p_target)))
+        return
+    # One process per profile: the daemon keeps its state in module globals
+    for profile in PROFILES:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--profile", profile,
+                        "--seed", str(args.seed), "--duration", str(args.duration),
+                        "--interval", str(args.interval), "--p-target", str(args.p_target)])
+
+
+if __name__ == "__main__":
+    main()
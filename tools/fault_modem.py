@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Stand-in modem and Telegram endpoint with fault injection for Huawei Manager.
+The modem speaks enough of the Huawei API for the daemon, modem_api.py and
+reconnect_dialup.py: login, dashboard sections and the mobile data switch,
+which hands out a new WAN IP (seeded) on every reconnect. Faults are drawn
+per request from a seeded schedule: latency spikes, hangs, dropped
+connections, session expiry, malformed XML, and Telegram 429/5xx answers.
+
+Point the daemon's Telegram traffic here with
+HUAWEI_MANAGER_TELEGRAM_API=http://127.0.0.1:<telegram port>.
+
+Development tool, not installed on the router.
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import threading
+from argparse import ArgumentParser
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Fault rates per request, by profile. 'truncated' cuts the output of
+# modem_api.py short and only applies inside tools/fault_bench.py.
+PROFILES = {
+    "clean": {},
+    "latency": {"latency": 0.15, "hang": 0.02},
+    "drops": {"drop": 0.10},
+    "auth": {"auth_expiry": 0.05},
+    "malformed": {"malformed": 0.08},
+    "truncated": {"truncated": 0.10},
+    "telegram": {"telegram_429": 0.30, "telegram_5xx": 0.20},
+    "storm": {"latency": 0.05, "hang": 0.01, "drop": 0.04, "auth_expiry": 0.02,
+              "malformed": 0.03, "truncated": 0.03, "telegram_429": 0.10, "telegram_5xx": 0.10},
+}
+MODEM_FAULTS = ("latency", "hang", "drop", "auth_expiry", "malformed")
+TELEGRAM_FAULTS = ("telegram_429", "telegram_5xx")
+# Seconds: a spike is slow but within the read timeout, a hang outlasts
+# the daemon's 30 s script timeout
+LATENCY_SPIKE = (2, 8)
+HANG = 40
+RETRY_AFTER = 3
+
+XML = '<?xml version="1.0" encoding="UTF-8"?>'
+TARGET_PREFIX = "10.1."
+
+
+class FaultSchedule:
+    """
+    Seeded fault decisions. Each channel ('modem', 'telegram', 'output') has
+    its own random stream, so the n-th request on a channel meets the same
+    fault in every run with the same seed.
+    """
+
+    def __init__(self, profile, seed=1):
+        self.profile = profile
+        self.rates = PROFILES[profile]
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.injected = Counter()
+
+    def draw(self, channel, kinds):
+        """(fault kind or None, magnitude in [0, 1)) for the next request on a channel."""
+        with self.lock:
+            rng = self.streams.setdefault(channel, random.Random(f"{self.seed}:{channel}"))
+            roll, magnitude = rng.random(), rng.random()
+            edge = 0.0
+            for kind in kinds:
+                edge += self.rates.get(kind, 0.0)
+                if roll < edge:
+                    self.injected[kind] += 1
+                    return kind, magnitude
+        return None, magnitude
+
+
+class StandInModem:
+    """Modem state: sessions, data switch and the WAN IP handed out on reconnect."""
+
+    def __init__(self, schedule, seed=1, p_target=0.4):
+        self.schedule = schedule
+        self.p_target = p_target
+        self.rng = random.Random(f"{seed}:ip")
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.data_on = True
+        self.ip = self._address(False)
+        self.requests = 0
+        self.logins = 0
+        self.reconnects = 0
+
+    def _address(self, target):
+        if target:
+            return f"{TARGET_PREFIX}{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+        return f"100.{self.rng.randint(64, 127)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+
+    def redial(self):
+        with self.lock:
+            self.reconnects += 1
+            self.ip = self._address(self.rng.random() < self.p_target)
+
+    def kick(self):
+        """Drop to a non-target IP, as after a carrier-side reconnect."""
+        with self.lock:
+            self.ip = self._address(False)
+            return self.ip
+
+    def sections(self):
+        ip = self.ip if self.data_on else ""
+        return {
+            "/api/device/information": {"DeviceName": "Stand-in", "Imei": "0", "SoftwareVersion": "1.0",
+                                        "WanIPAddress": ip},
+            "/api/device/signal": {"rsrp": "-95dBm", "rsrq": "-10dB", "sinr": "12dB", "rssi": "-65dBm",
+                                   "cell_id": "1234", "pci": "11", "band": "3", "enodeb_id": "5"},
+            "/api/monitoring/traffic-statistics": {"CurrentDownloadRate": "1000", "CurrentUploadRate": "10",
+                                                   "TotalDownload": str(int(time.time()) * 1000),
+                                                   "TotalUpload": "100", "CurrentConnectTime": "100",
+                                                   "CurrentDownload": "5", "CurrentUpload": "5",
+                                                   "TotalConnectTime": "100"},
+            "/api/monitoring/status": {"WanIPAddress": ip, "ConnectionStatus": "901" if ip else "902",
+                                       "CurrentNetworkTypeEx": "101"},
+            "/api/net/net-mode": {"NetworkMode": "00", "NetworkBand": "3FFFFFFF", "LTEBand": "7FFFFFFFFFFFFFFF"},
+            "/api/net/current-plmn": {"FullName": "Stand-in", "Numeric": "00101"},
+            "/api/monitoring/month_statistics": {"CurrentMonthDownload": "1000", "CurrentMonthUpload": "10"},
+            "/api/dialup/connection": {"IPv4IPAddress": ip},
+            "/api/dialup/mobile-dataswitch": {"dataswitch": "1" if self.data_on else "0"},
+            "/api/sms/sms-count": {"LocalUnread": "0", "LocalInbox": "0"},
+        }
+
+
+def response(data):
+    return f"{XML}<response>{''.join(f'<{k}>{v}</{k}>' for k, v in data.items())}</response>"
+
+
+def error(code):
+    return f"{XML}<error><code>{code}</code><message></message></error>"
+
+
+class ModemHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    modem = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out during a latency fault
+
+    def _session(self):
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "SessionID":
+                return value
+        return None
+
+    def _send(self, body, cookie=None, content_type="text/xml"):
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        if cookie:
+            self.send_header("Set-Cookie", f"SessionID={cookie}; path=/")
+        self.send_header("__RequestVerificationToken", uuid.uuid4().hex[:32])
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _fault(self):
+        """Apply the scheduled fault. True if the request was answered or dropped."""
+        kind, magnitude = self.modem.schedule.draw("modem", MODEM_FAULTS)
+        if kind == "latency":
+            low, high = LATENCY_SPIKE
+            time.sleep(low + (high - low) * magnitude)
+        elif kind == "hang":
+            time.sleep(HANG)
+        elif kind == "drop":
+            self.close_connection = True
+            return True
+        elif kind == "auth_expiry":
+            with self.modem.lock:
+                self.modem.sessions.clear()
+        elif kind == "malformed":
+            self._send(response({"WanIPAddress": self.modem.ip})[:40 + int(20 * magnitude)])
+            return True
+        return False
+
+    def _serve(self, method):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+        modem = self.modem
+        with modem.lock:
+            modem.requests += 1
+        if self._fault():
+            return
+
+        session = self._session()
+        if path == "/":
+            page = '<html><head><meta name="csrf_token" content="standin"/></head></html>'
+            return self._send(page, cookie=None if session else uuid.uuid4().hex, content_type="text/html")
+        if path == "/api/user/state-login":
+            return self._send(response({"State": 0 if session in modem.sessions else -1, "password_type": 4}))
+        if path == "/api/webserver/SesTokInfo":
+            return self._send(response({"SesInfo": "standin", "TokInfo": uuid.uuid4().hex[:32]}))
+        if method == "POST" and path == "/api/user/login":
+            new = uuid.uuid4().hex
+            with modem.lock:
+                modem.logins += 1
+                # Single-session firmware: a login ends every other session
+                modem.sessions = {new}
+            return self._send(f"{XML}<response>OK</response>", cookie=new)
+        if method == "POST" and path == "/api/user/logout":
+            with modem.lock:
+                modem.sessions.discard(session)
+            return self._send(f"{XML}<response>OK</response>")
+        if session not in modem.sessions:
+            return self._send(error(100003))
+
+        if method == "POST":
+            if path == "/api/dialup/mobile-dataswitch":
+                switch_on = "<dataswitch>1</dataswitch>" in body
+                if switch_on and not modem.data_on:
+                    modem.redial()
+                modem.data_on = switch_on
+            return self._send(f"{XML}<response>OK</response>")
+        data = modem.sections().get(path)
+        self._send(response(data) if data is not None else error(100002))
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+
+class FakeTelegram:
+    """Records delivered messages; faults answer 429 or 5xx instead."""
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.lock = threading.Lock()
+        self.delivered = []
+        self.attempts = 0
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    telegram = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, code, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode()) if length else {}
+        telegram = self.telegram
+        with telegram.lock:
+            telegram.attempts += 1
+        kind, _magnitude = telegram.schedule.draw("telegram", TELEGRAM_FAULTS)
+        if kind == "telegram_429":
+            return self._reply(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": RETRY_AFTER}},
+                               {"Retry-After": str(RETRY_AFTER)})
+        if kind == "telegram_5xx":
+            return self._reply(502, {"ok": False, "error_code": 502})
+        with telegram.lock:
+            telegram.delivered.append((time.time(), (form.get("text") or [""])[0]))
+        self._reply(200, {"ok": True, "result": {}})
+
+
+def serve(handler, attributes, port=0, bind="127.0.0.1"):
+    server = ThreadingHTTPServer((bind, port), type("Handler", (handler,), attributes))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_modem(schedule, seed=1, p_target=0.4, port=0, bind="127.0.0.1"):
+    """Serve a stand-in modem in a background thread. Returns (server, modem)."""
+    modem = StandInModem(schedule, seed, p_target)
+    return serve(ModemHandler, {"modem": modem}, port, bind), modem
+
+
+def start_telegram(schedule, port=0, bind="127.0.0.1"):
+    """Serve a fake Telegram Bot API in a background thread. Returns (server, telegram)."""
+    telegram = FakeTelegram(schedule)
+    return serve(TelegramHandler, {"telegram": telegram}, port, bind), telegram
+
+
+def main():
+    parser = ArgumentParser(description="Serve a stand-in modem and Telegram API with injected faults")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="clean")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--telegram-port", type=int, default=18088)
+    parser.add_argument("--p-target", type=float, default=0.4,
+                        help="Chance that a reconnect yields a target IP (10.1.x.x)")
+    parser.add_argument("--bind", type=str, default="127.0.0.1")
+    args = parser.parse_args()
+
+    schedule = FaultSchedule(args.profile, args.seed)
+    modem_server, modem = start_modem(schedule, args.seed, args.p_target, args.port, args.bind)
+    telegram_server, telegram = start_telegram(schedule, args.telegram_port, args.bind)
+    print(f"Modem on http://{args.bind}:{modem_server.server_address[1]}/, Telegram on "
+          f"http://{args.bind}:{telegram_server.server_address[1]} (profile {args.profile}, "
+          f"seed {args.seed})", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps({"requests": modem.requests, "logins": modem.logins,
+                              "reconnects": modem.reconnects, "ip": modem.ip,
+                              "telegram": len(telegram.delivered),
+                              "injected": dict(schedule.injected)}), file=sys.stderr)
+    except KeyboardInterrupt:
+        modem_server.shutdown()
+        telegram_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
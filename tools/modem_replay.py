@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Modem replay server for Huawei Manager.
+Serves a trace recorded with HUAWEI_MANAGER_TRACE back over HTTP, so the
+scripts can run against it instead of a modem. Each (method, path) answers
+its recorded responses in order and starts over when they run out; timing
+is reproduced at --speed (1 = as recorded, 0 = no delay).
+
+Development tool, not installed on the router.
+"""
+import sys
+import json
+import time
+import threading
+from argparse import ArgumentParser
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+NOT_FOUND = ('<?xml version="1.0" encoding="UTF-8"?>'
+             '<error><code>100002</code><message>not in trace</message></error>')
+
+
+def load_trace(path):
+    """Trace entries grouped by (method, path), in recorded order."""
+    responses = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Partially written last line
+            responses[(entry["method"], entry["path"])].append(entry)
+    return responses
+
+
+class Replay:
+    def __init__(self, responses, speed=1.0):
+        self.responses = responses
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.cursors = {}
+        self.served = 0
+        self.missing = 0
+
+    def reset(self):
+        with self.lock:
+            self.cursors = {}
+            self.served = 0
+            self.missing = 0
+
+    def next(self, method, path):
+        with self.lock:
+            entries = self.responses.get((method, path))
+            if not entries:
+                self.missing += 1
+                return None
+            index = self.cursors.get((method, path), 0)
+            self.cursors[(method, path)] = (index + 1) % len(entries)
+            self.served += 1
+            return entries[index]
+
+    def stats(self):
+        with self.lock:
+            return {"served": self.served, "missing": self.missing}
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    replay = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _control(self, path):
+        if path == "/__replay/reset":
+            self.replay.reset()
+        body = json.dumps(self.replay.stats()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve(self, method):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if path.startswith("/__replay/"):
+            self._control(path)
+            return
+
+        entry = self.replay.next(method, path)
+        if entry and self.replay.speed > 0:
+            time.sleep(entry.get("ms", 0) / 1000.0 / self.replay.speed)
+        if entry and "error" in entry:
+            # Recorded as a failed request: drop the connection without answering
+            self.close_connection = True
+            return
+
+        body = (entry["body"] if entry else NOT_FOUND).encode()
+        self.send_response(entry.get("status", 200) if entry else 200)
+        for name, value in (entry.get("headers") or {}).items() if entry else []:
+            if name.lower() != "content-length":
+                self.send_header(name, value)
+        if not entry:
+            self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+
+def start_server(trace_path, port=0, speed=1.0, bind="127.0.0.1"):
+    """Serve a trace in a background thread. Returns (server, replay)."""
+    replay = Replay(load_trace(trace_path), speed)
+    handler = type("Handler", (ReplayHandler,), {"replay": replay})
+    server = ThreadingHTTPServer((bind, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, replay
+
+
+def main():
+    parser = ArgumentParser(description="Serve a recorded modem trace")
+    parser.add_argument("trace", type=str, help="Trace file (JSON lines)")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--bind", type=str, default="127.0.0.1")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Timing scale: 1 as recorded, 2 twice as fast, 0 no delay")
+    args = parser.parse_args()
+
+    server, replay = start_server(args.trace, args.port, args.speed, args.bind)
+    endpoints = sum(len(v) for v in replay.responses.values())
+    print(f"Replaying {endpoints} responses on http://{args.bind}:{server.server_address[1]}/ "
+          f"(speed {args.speed})", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
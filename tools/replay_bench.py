@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Trace-driven benchmark for Huawei Manager.
+Runs a script scenario repeatedly against tools/modem_replay.py and reports
+wall time per run. The replay restarts from the beginning of the trace
+before each run, so results only depend on the trace and the code.
+
+Development tool, not installed on the router.
+"""
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+from argparse import ArgumentParser
+
+from modem_replay import start_server
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files", "usr", "bin", "huawei-manager")
+
+# Scenario name -> script arguments after the modem URL
+SCENARIOS = {
+    # Dashboard page load (LuCI fallback path)
+    "info": ["modem_api.py", "--action", "info", "--refresh", "--budget-drawn"],
+    # One hunt-loop poll of the daemon
+    "hunt": ["modem_api.py", "--action", "info", "--refresh", "--budget-drawn",
+             "--sections", "signal,traffic,status,dialup"],
+    # SMS page load
+    "sms": ["modem_api.py", "--batch", json.dumps([{"action": "sms_count"}, {"action": "sms_list"}]),
+            "--refresh", "--budget-drawn"],
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(url, scenario, runs, replay, python):
+    script, *args = SCENARIOS[scenario]
+    cmd = [python, os.path.join(SCRIPTS, script), url] + args
+    env = dict(os.environ)
+    env.pop("HUAWEI_MANAGER_TRACE", None)  # Never record the replay itself
+    times, failures = [], 0
+    for _ in range(runs):
+        replay.reset()
+        started = time.time()
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=SCRIPTS)
+        times.append(time.time() - started)
+        try:
+            ok = json.loads(result.stdout.strip().splitlines()[-1]).get("success")
+        except (ValueError, IndexError):
+            ok = False
+        failures += 0 if ok else 1
+    stats = replay.stats()
+    return {
+        "scenario": scenario,
+        "runs": runs,
+        "failures": failures,
+        "requests_per_run": stats["served"],
+        "unmatched_per_run": stats["missing"],
+        "min_ms": round(min(times) * 1000, 1),
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "p95_ms": round(percentile(times, 0.95) * 1000, 1),
+        "max_ms": round(max(times) * 1000, 1)
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark scripts against a recorded modem trace")
+    parser.add_argument("trace", type=str, help="Trace file recorded with HUAWEI_MANAGER_TRACE")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay timing scale: 1 as recorded, 0 no modem delay")
+    parser.add_argument("--python", type=str, default=sys.executable)
+    args = parser.parse_args()
+
+    server, replay = start_server(args.trace, 0, args.speed)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    scenarios = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    try:
+        for scenario in scenarios:
+            print(json.dumps(run_scenario(url, scenario, max(1, args.runs), replay, args.python)))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()